@@ -1,77 +1,145 @@
 """Analytics API endpoints - computes financial summaries and metrics."""
 
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import hashlib
+from collections import OrderedDict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from middleware import get_current_user
 from db import get_authenticated_client
-from services.analytics_service import (
-    compute_summary,
-    compute_health_score,
-    compute_forecast,
-    detect_recurring,
-    detect_anomalies,
-    detect_duplicates,
-)
+from db.queries import run
+from config import FORECAST_CONFIDENCE, LLM_CACHE_MAX_ENTRIES, LLM_INSIGHTS_BUDGET
+from services.analytics_service import compute_summary
+from services.forecasting import forecast
 from services.ai_service import generate_insights_ai, generate_executive_summary
+from services import data_version, llm_cache, llm_orchestrator, payloads, response_cache, snapshot
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
+SUMMARY_SECTIONS = (
+    "summary", "health", "forecasts", "recurring", "anomalies", "duplicates", "duplicate_groups", "transactions",
+)
+DASHBOARD_SECTIONS = SUMMARY_SECTIONS[:-1] + ("insights", "executive_summary", "transactions")
+
+# business_id -> content key of the insights last written to its insights rows
+_stored_insights: OrderedDict[str, str] = OrderedDict()
+
+
+def _etag(version: str, variant: str) -> str:
+    return f'W/"{version}-{variant}"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (t.strip() for t in header.split(","))
+
+
+def _selection_variant(variant: str, sections: str | None, fields: str | None) -> str:
+    """ETag variant for one projection of a payload; the full payload keeps the bare name."""
+    if not sections and not fields:
+        return variant
+    digest = hashlib.sha1(f"{sections or ''}|{fields or ''}".encode()).hexdigest()[:10]
+    return f"{variant}.{digest}"
+
+
+async def _conditional(
+    request: Request,
+    client,
+    user: dict,
+    business_id: str,
+    variant: str,
+    compute,
+    available: tuple[str, ...],
+    sections: str | None = None,
+    fields: str | None = None,
+) -> Response:
+    """Serve an analytics payload with ETag/304 handling and the SWR response cache.
 
-async def _fetch_transactions(client, business_id: str) -> list[dict]:
-    """Fetch all transactions for a business with joined category/entity data."""
-    result = (
-        client.table("transactions")
-        .select("*, categories(name), entities(name, entity_type)")
-        .eq("business_id", business_id)
-        .order("date", desc=False)
-        .execute()
+    The ETag is derived from the business's data version, so a client
+    holding the current one gets a 304 without anything being fetched or
+    computed. ``Cache-Control: no-cache`` on the request refuses stale
+    payloads. The full payload is cached; ``sections``/``fields`` are
+    applied per request before encoding. ``compute`` builds the payload
+    from the business's current snapshot.
+    """
+    selected, projection = payloads.parse_selection(sections, fields, available)
+    if not await snapshot.get(client, user["id"], business_id).owned():
+        raise HTTPException(status_code=404, detail="Business not found")
+
+    cache_key = (variant, business_id)
+    variant = _selection_variant(variant, sections, fields)
+    headers = {"Cache-Control": "private, no-cache"}
+    etag = _etag(data_version.current(business_id), variant)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    fresh_only = "no-cache" in request.headers.get("cache-control", "").lower()
+    # Resolve the snapshot when computing: a background refresh after a
+    # write must not reuse the one from this request
+    payload, version = await response_cache.get(
+        cache_key, business_id,
+        lambda: compute(snapshot.get(client, user["id"], business_id)),
+        allow_stale=not fresh_only,
     )
+    etag = _etag(version, variant)
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+    if selected is not None or projection:
+        payload = payloads.project(payload, selected, projection)
+    return payloads.render(payload, request.headers.get("accept-encoding", ""), {**headers, "ETag": etag})
 
-    transactions = []
-    for tx in result.data:
-        transactions.append({
-            "id": tx["id"],
-            "date": tx["date"],
-            "description": tx["description"],
-            "amount": float(tx["amount"]),
-            "type": tx["type"],
-            "category_name": tx.get("categories", {}).get("name", "") if tx.get("categories") else "",
-            "entity_name": tx.get("entities", {}).get("name", "") if tx.get("entities") else "",
-            "entity_type": tx.get("entities", {}).get("entity_type", "") if tx.get("entities") else "",
-            "category_id": tx.get("category_id"),
-            "entity_id": tx.get("entity_id"),
-            "payment_method": tx.get("payment_method", ""),
-            "created_at": tx.get("created_at"),
-        })
-    return transactions
+
+async def _summary_payload(snap: snapshot.FinancialSnapshot) -> dict:
+    return {
+        "summary": await snap.summary(),
+        "health": await snap.health(),
+        "forecasts": await snap.forecasts(),
+        "recurring": await snap.recurring(),
+        "anomalies": await snap.anomalies(),
+        "duplicates": await snap.duplicates(),
+        "duplicate_groups": await snap.duplicate_groups(),
+        "transactions": await snap.transactions(),
+    }
 
 
 @router.get("/summary/{business_id}")
-async def get_summary(business_id: str, user: dict = Depends(get_current_user)):
+async def get_summary(
+    business_id: str,
+    request: Request,
+    sections: str | None = Query(None, description="Comma-separated top-level sections to return"),
+    fields: str | None = Query(None, description="Comma-separated section.key fields to keep, e.g. transactions.id"),
+    user: dict = Depends(get_current_user),
+):
     """Get complete financial summary for a business."""
     client = get_authenticated_client(user["access_token"])
+    return await _conditional(
+        request, client, user, business_id, "summary",
+        _summary_payload,
+        SUMMARY_SECTIONS, sections, fields,
+    )
+
 
-    # Verify business ownership
-    biz = client.table("businesses").select("id").eq("id", business_id).eq("user_id", user["id"]).execute()
-    if not biz.data:
+@router.get("/forecast/{business_id}")
+async def get_forecast(
+    business_id: str,
+    horizons: str = Query("7,30,90", description="Comma-separated horizons in days"),
+    confidence: float = Query(FORECAST_CONFIDENCE, gt=0, lt=1),
+    user: dict = Depends(get_current_user),
+):
+    """Cashflow forecast for arbitrary horizons, with confidence intervals."""
+    client = get_authenticated_client(user["access_token"])
+    snap = snapshot.get(client, user["id"], business_id)
+    owned, transactions = await asyncio.gather(snap.owned(), snap.transactions())
+    if not owned:
         raise HTTPException(status_code=404, detail="Business not found")
 
-    transactions = await _fetch_transactions(client, business_id)
-    summary = compute_summary(transactions)
-    health = compute_health_score(summary)
-    forecasts = compute_forecast(summary)
-    recurring = detect_recurring([t for t in transactions if t["type"] == "expense"])
-    anomalies = detect_anomalies(transactions)
-    duplicates = detect_duplicates(transactions)
-
-    return {
-        "summary": summary,
-        "health": health,
-        "forecasts": forecasts,
-        "recurring": recurring,
-        "anomalies": anomalies,
-        "duplicates": duplicates,
-        "transactions": transactions,
-    }
+    try:
+        days = tuple(int(h) for h in horizons.split(",") if h.strip())
+        forecasts = forecast(transactions, days, confidence)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"forecasts": forecasts}
 
 
 @router.get("/insights/{business_id}")
@@ -79,14 +147,11 @@ async def get_insights(business_id: str, user: dict = Depends(get_current_user))
     """Generate AI-powered insights for a business."""
     client = get_authenticated_client(user["access_token"])
 
-    biz = client.table("businesses").select("id").eq("id", business_id).eq("user_id", user["id"]).execute()
-    if not biz.data:
+    snap = snapshot.get(client, user["id"], business_id)
+    owned, summary, recurring = await asyncio.gather(snap.owned(), snap.summary(), snap.recurring())
+    if not owned:
         raise HTTPException(status_code=404, detail="Business not found")
 
-    transactions = await _fetch_transactions(client, business_id)
-    summary = compute_summary(transactions)
-    recurring = detect_recurring([t for t in transactions if t["type"] == "expense"])
-
     # Prepare data for AI
     financial_data = {
         "total_income": summary["total_income"],
@@ -100,11 +165,22 @@ async def get_insights(business_id: str, user: dict = Depends(get_current_user))
         "recurring": [{"desc": r["description"], "amount": r["avg_amount"]} for r in recurring[:5]],
     }
 
-    insights = await generate_insights_ai(financial_data)
-    exec_summary = await generate_executive_summary(financial_data)
+    # Independent generations, run side by side under one deadline
+    with llm_orchestrator.budget(LLM_INSIGHTS_BUDGET):
+        insights, exec_summary = await asyncio.gather(
+            generate_insights_ai(financial_data),
+            generate_executive_summary(financial_data),
+        )
 
-    # Also save insights to DB
-    if insights:
+    # Also save insights to DB, unless these are already the stored ones
+    # (a cached answer for unchanged data)
+    digest = llm_cache.content_key(insights)
+    if insights and _stored_insights.get(business_id) != digest:
+        # Claimed before the write so a concurrent identical request skips it
+        _stored_insights[business_id] = digest
+        _stored_insights.move_to_end(business_id)
+        while len(_stored_insights) > LLM_CACHE_MAX_ENTRIES:
+            _stored_insights.popitem(last=False)
         insight_records = []
         for ins in insights:
             severity_map = {"low": "low", "medium": "medium", "high": "high"}
@@ -118,9 +194,15 @@ async def get_insights(business_id: str, user: dict = Depends(get_current_user))
             })
 
         # Clear old insights and insert new
-        client.table("insights").delete().eq("business_id", business_id).execute()
-        if insight_records:
-            client.table("insights").insert(insight_records).execute()
+        try:
+            await run(client.table("insights").delete().eq("business_id", business_id))
+            if insight_records:
+                await run(client.table("insights").insert(insight_records))
+        except Exception:
+            _stored_insights.pop(business_id, None)
+            raise
+        finally:
+            data_version.bump(business_id)
 
     return {
         "insights": insights,
@@ -128,17 +210,10 @@ async def get_insights(business_id: str, user: dict = Depends(get_current_user))
     }
 
 
-@router.get("/dashboard/{business_id}")
-async def get_dashboard(business_id: str, user: dict = Depends(get_current_user)):
-    """Get all dashboard data in a single request for efficiency."""
-    client = get_authenticated_client(user["access_token"])
+async def _dashboard_payload(snap: snapshot.FinancialSnapshot) -> dict:
+    # Transaction fetch and cached insights are independent
+    transactions, insights = await asyncio.gather(snap.transactions(), snap.insights())
 
-    biz = client.table("businesses").select("id").eq("id", business_id).eq("user_id", user["id"]).execute()
-    if not biz.data:
-        raise HTTPException(status_code=404, detail="Business not found")
-
-    transactions = await _fetch_transactions(client, business_id)
-    
     if not transactions:
         return {
             "summary": compute_summary([]),
@@ -147,29 +222,50 @@ async def get_dashboard(business_id: str, user: dict = Depends(get_current_user)
             "recurring": [],
             "anomalies": [],
             "duplicates": [],
+            "duplicate_groups": [],
             "insights": [],
             "executive_summary": "Upload transactions to see your AI-generated business summary.",
             "transactions": [],
         }
 
-    summary = compute_summary(transactions)
-    health = compute_health_score(summary)
-    forecasts = compute_forecast(summary)
-    recurring = detect_recurring([t for t in transactions if t["type"] == "expense"])
-    anomalies = detect_anomalies(transactions)
-    duplicates = detect_duplicates(transactions)
-
-    # Load cached insights from DB
-    cached_insights = client.table("insights").select("*").eq("business_id", business_id).execute()
-
     return {
-        "summary": summary,
-        "health": health,
-        "forecasts": forecasts,
-        "recurring": recurring,
-        "anomalies": anomalies,
-        "duplicates": duplicates,
-        "insights": cached_insights.data if cached_insights.data else [],
+        "summary": await snap.summary(),
+        "health": await snap.health(),
+        "forecasts": await snap.forecasts(),
+        "recurring": await snap.recurring(),
+        "anomalies": await snap.anomalies(),
+        "duplicates": await snap.duplicates(),
+        "duplicate_groups": await snap.duplicate_groups(),
+        "insights": insights,
         "executive_summary": "",
         "transactions": transactions,
     }
+
+
+@router.get("/dashboard/{business_id}")
+async def get_dashboard(
+    business_id: str,
+    request: Request,
+    sections: str | None = Query(None, description="Comma-separated top-level sections to return"),
+    fields: str | None = Query(None, description="Comma-separated section.key fields to keep, e.g. transactions.id"),
+    user: dict = Depends(get_current_user),
+):
+    """Get all dashboard data in a single request for efficiency."""
+    client = get_authenticated_client(user["access_token"])
+    return await _conditional(
+        request, client, user, business_id, "dashboard",
+        _dashboard_payload,
+        DASHBOARD_SECTIONS, sections, fields,
+    )
+
+
+@router.get("/cache")
+async def response_cache_stats(user: dict = Depends(get_current_user)):
+    """Hit/miss counters for the analytics response cache, snapshots and LLM cache, encoded payload sizes/times and LLM call stats."""
+    return {
+        "response_cache": response_cache.stats(),
+        "snapshots": snapshot.stats(),
+        "payloads": payloads.stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_calls": llm_orchestrator.stats(),
+    }
@@ -1,9 +1,8 @@
 """Auth API endpoints."""
 
-import httpx
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from db import get_supabase
+from db import get_http_client
 from config import SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, SUPABASE_ANON_KEY
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
@@ -45,25 +44,27 @@ async def register_user(req: RegisterRequest):
     if not SUPABASE_SERVICE_ROLE_KEY:
         raise HTTPException(status_code=500, detail="Service role key not configured")
 
+    # Both Auth calls share the process-wide connection pool
+    client = get_http_client()
+
     # Create user via Supabase Admin API with auto-confirm
-    async with httpx.AsyncClient() as client:
-        payload = {
-            "email": req.email,
-            "password": req.password,
-            "email_confirm": True,  # Auto-confirm, no email sent
-        }
-        if req.full_name:
-            payload["user_metadata"] = {"full_name": req.full_name}
-
-        resp = await client.post(
-            f"{SUPABASE_URL}/auth/v1/admin/users",
-            json=payload,
-            headers={
-                "apikey": SUPABASE_SERVICE_ROLE_KEY,
-                "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
-                "Content-Type": "application/json",
-            },
-        )
+    payload = {
+        "email": req.email,
+        "password": req.password,
+        "email_confirm": True,  # Auto-confirm, no email sent
+    }
+    if req.full_name:
+        payload["user_metadata"] = {"full_name": req.full_name}
+
+    resp = await client.post(
+        f"{SUPABASE_URL}/auth/v1/admin/users",
+        json=payload,
+        headers={
+            "apikey": SUPABASE_SERVICE_ROLE_KEY,
+            "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+            "Content-Type": "application/json",
+        },
+    )
 
     if resp.status_code == 422:
         raise HTTPException(status_code=400, detail="User already exists")
@@ -75,15 +76,14 @@ async def register_user(req: RegisterRequest):
     user_data = resp.json()
 
     # Now sign the user in to get a session token
-    async with httpx.AsyncClient() as client:
-        login_resp = await client.post(
-            f"{SUPABASE_URL}/auth/v1/token?grant_type=password",
-            json={"email": req.email, "password": req.password},
-            headers={
-                "apikey": SUPABASE_ANON_KEY,
-                "Content-Type": "application/json",
-            },
-        )
+    login_resp = await client.post(
+        f"{SUPABASE_URL}/auth/v1/token?grant_type=password",
+        json={"email": req.email, "password": req.password},
+        headers={
+            "apikey": SUPABASE_ANON_KEY,
+            "Content-Type": "application/json",
+        },
+    )
 
     if login_resp.status_code != 200:
         # User created but auto-login failed; they can log in manually
@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from middleware import get_current_user
 from db import get_authenticated_client
+from db.queries import run
 
 router = APIRouter(prefix="/api/businesses", tags=["businesses"])
 
@@ -23,7 +24,7 @@ class BusinessResponse(BaseModel):
 async def list_businesses(user: dict = Depends(get_current_user)):
     """List all businesses for the current user."""
     client = get_authenticated_client(user["access_token"])
-    result = client.table("businesses").select("*").eq("user_id", user["id"]).execute()
+    result = await run(client.table("businesses").select("*").eq("user_id", user["id"]))
     return {"businesses": result.data}
 
 
@@ -31,10 +32,10 @@ async def list_businesses(user: dict = Depends(get_current_user)):
 async def create_business(body: BusinessCreate, user: dict = Depends(get_current_user)):
     """Create a new business."""
     client = get_authenticated_client(user["access_token"])
-    result = client.table("businesses").insert({
+    result = await run(client.table("businesses").insert({
         "user_id": user["id"],
         "name": body.name,
-    }).execute()
+    }))
 
     if not result.data:
         raise HTTPException(status_code=400, detail="Failed to create business")
@@ -46,7 +47,7 @@ async def create_business(body: BusinessCreate, user: dict = Depends(get_current
 async def get_business(business_id: str, user: dict = Depends(get_current_user)):
     """Get a specific business."""
     client = get_authenticated_client(user["access_token"])
-    result = client.table("businesses").select("*").eq("id", business_id).eq("user_id", user["id"]).execute()
+    result = await run(client.table("businesses").select("*").eq("id", business_id).eq("user_id", user["id"]))
 
     if not result.data:
         raise HTTPException(status_code=404, detail="Business not found")
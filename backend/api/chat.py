@@ -1,11 +1,13 @@
 """AI Chat API endpoint."""
 
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from middleware import get_current_user
 from db import get_authenticated_client
-from services.analytics_service import compute_summary, compute_health_score
-from services.ai_service import chat_response
+from services.ai_service import CHAT_UNAVAILABLE, chat_response, chat_response_stream, summarize_conversation
+from services import chat_sessions, snapshot
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -13,44 +15,23 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 class ChatRequest(BaseModel):
     business_id: str
     message: str
+    # Only read when starting a session (none given, or it expired)
     history: list[dict] | None = None
+    session_id: str | None = None
 
 
-@router.post("")
-async def chat(body: ChatRequest, user: dict = Depends(get_current_user)):
-    """Send a message to the AI CFO chat."""
-    client = get_authenticated_client(user["access_token"])
-
-    # Verify business
-    biz = client.table("businesses").select("id").eq("id", body.business_id).eq("user_id", user["id"]).execute()
-    if not biz.data:
+async def _financial_context(client, user: dict, business_id: str) -> dict:
+    """Summary figures the model answers from; 404 if the business isn't the user's."""
+    # The snapshot answers from the running aggregates when loaded; a cold
+    # business is aggregated alongside the ownership check
+    snap = snapshot.get(client, user["id"], business_id)
+    summary = await snap.summary()
+    if not await snap.owned():
         raise HTTPException(status_code=404, detail="Business not found")
-
-    # Fetch transactions to build context
-    result = (
-        client.table("transactions")
-        .select("*, categories(name), entities(name, entity_type)")
-        .eq("business_id", body.business_id)
-        .order("date", desc=False)
-        .execute()
-    )
-
-    transactions = []
-    for tx in result.data:
-        transactions.append({
-            "date": tx["date"],
-            "description": tx["description"],
-            "amount": float(tx["amount"]),
-            "type": tx["type"],
-            "category_name": tx.get("categories", {}).get("name", "") if tx.get("categories") else "",
-            "entity_name": tx.get("entities", {}).get("name", "") if tx.get("entities") else "",
-        })
-
-    summary = compute_summary(transactions)
-    health = compute_health_score(summary)
+    health = await snap.health()
 
     # Build financial context for AI
-    financial_context = {
+    return {
         "total_income": summary["total_income"],
         "total_expenses": summary["total_expenses"],
         "net_profit": summary["net_profit"],
@@ -66,10 +47,110 @@ async def chat(body: ChatRequest, user: dict = Depends(get_current_user)):
         "monthly_trends": summary["monthly_trends"][-3:],
     }
 
+
+def _event(name: str, data: dict) -> str:
+    """One Server-Sent Events message; data is JSON so newlines stay inside it."""
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _open_session(client, user: dict, body: ChatRequest) -> tuple[chat_sessions.ChatSession, dict]:
+    """The session for this message and its financial context (404 if not the user's business)."""
+    history = body.history or []
+    # Older clients include the message being sent as the last history entry
+    if history and history[-1].get("role") != "ai" and history[-1].get("text") == body.message:
+        history = history[:-1]
+    session = chat_sessions.get_or_create(body.session_id, user["id"], body.business_id, history)
+    try:
+        context = await session.context(lambda: _financial_context(client, user, body.business_id))
+    except HTTPException:
+        chat_sessions.end(session.id, user["id"])
+        raise
+    return session, context
+
+
+@router.post("")
+async def chat(body: ChatRequest, user: dict = Depends(get_current_user)):
+    """Send a message to the AI CFO chat.
+
+    Conversation state is kept server-side: pass back the returned
+    ``session_id`` and the earlier turns need not be resent.
+    """
+    client = get_authenticated_client(user["access_token"])
+    session, financial_context = await _open_session(client, user, body)
+    turns, summary = await session.prompt_history()
+
     response = await chat_response(
         query=body.message,
         financial_context=financial_context,
-        chat_history=body.history,
+        chat_history=turns,
+        summary=summary,
+        max_history=None,
+    )
+    if response != CHAT_UNAVAILABLE:
+        session.record(body.message, response, summarize_conversation)
+
+    return {"response": response, "session_id": session.id}
+
+
+@router.post("/stream")
+async def chat_stream(body: ChatRequest, request: Request, user: dict = Depends(get_current_user)):
+    """Send a message to the AI CFO chat and stream the reply as Server-Sent Events.
+
+    ``token`` events carry text fragments as the model produces them, then
+    a ``done`` event carries the full response and the ``session_id`` (or
+    an ``error`` event if the model failed mid-answer). When the client
+    disconnects the upstream completion is cancelled and the turn is not
+    recorded.
+    """
+    client = get_authenticated_client(user["access_token"])
+    session, financial_context = await _open_session(client, user, body)
+    turns, summary = await session.prompt_history()
+
+    async def events():
+        parts = []
+        replies = chat_response_stream(
+            query=body.message,
+            financial_context=financial_context,
+            chat_history=turns,
+            summary=summary,
+            max_history=None,
+        )
+        try:
+            async for delta in replies:
+                if await request.is_disconnected():
+                    return
+                parts.append(delta)
+                yield _event("token", {"text": delta})
+            response = "".join(parts).strip()
+            if response != CHAT_UNAVAILABLE:
+                session.record(body.message, response, summarize_conversation)
+            yield _event("done", {"response": response, "session_id": session.id})
+        except Exception:
+            yield _event("error", {"detail": "The reply was interrupted. Please try again."})
+        finally:
+            # Closes the upstream stream, whether we finished or were cancelled
+            await replies.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must not buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    return {"response": response}
+
+@router.get("/sessions/{session_id}")
+async def get_session(session_id: str, user: dict = Depends(get_current_user)):
+    """Size of a chat session's history and summary, and how often its context was reused."""
+    session = chat_sessions.lookup(session_id, user["id"])
+    if session is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return session.describe()
+
+
+@router.delete("/sessions/{session_id}")
+async def end_session(session_id: str, user: dict = Depends(get_current_user)):
+    """Forget a chat session (for example when the user clears the conversation)."""
+    if not chat_sessions.end(session_id, user["id"]):
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return {"message": "Chat session ended"}
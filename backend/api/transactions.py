@@ -1,12 +1,18 @@
 """Transaction management API endpoints with AI classification."""
 
-import csv
-import io
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from config import TRANSACTIONS_PAGE_MAX, TRANSACTIONS_EXPORT_PAGE_SIZE
 from middleware import get_current_user
 from db import get_authenticated_client
+from db.queries import run, business_exists, encode_cursor, iter_transaction_pages, transactions_page_query
+from db.corrections import correction_matcher
 from services.ai_service import classify_transactions_batch
+from services import aggregate_store, anomalies, classification_cache, recurring
+from services import import_jobs
 
 router = APIRouter(prefix="/api/transactions", tags=["transactions"])
 
@@ -24,73 +30,6 @@ class TransactionBulkCreate(BaseModel):
     transactions: list[dict]
 
 
-def normalize_date(date_str: str) -> str:
-    """Normalize various date formats to YYYY-MM-DD."""
-    import re
-    from datetime import datetime
-
-    date_str = date_str.strip().strip('"').strip("'")
-
-    # YYYY-MM-DD
-    if re.match(r"^\d{4}-\d{2}-\d{2}", date_str):
-        return date_str[:10]
-
-    # DD/MM/YYYY  
-    if re.match(r"^\d{2}/\d{2}/\d{4}", date_str):
-        parts = date_str.split("/")
-        return f"{parts[2]}-{parts[1]}-{parts[0]}"
-
-    # DD-MM-YYYY
-    if re.match(r"^\d{2}-\d{2}-\d{4}", date_str):
-        parts = date_str.split("-")
-        return f"{parts[2]}-{parts[1]}-{parts[0]}"
-
-    # Try Python date parsing as fallback
-    try:
-        d = datetime.strptime(date_str, "%Y-%m-%d")
-        return d.strftime("%Y-%m-%d")
-    except ValueError:
-        pass
-
-    try:
-        d = datetime.strptime(date_str, "%m/%d/%Y")
-        return d.strftime("%Y-%m-%d")
-    except ValueError:
-        pass
-
-    return date_str
-
-
-def parse_csv_content(content: str) -> list[dict]:
-    """Parse CSV text into transaction dicts."""
-    reader = csv.DictReader(io.StringIO(content.strip()))
-    
-    # Normalize header names
-    transactions = []
-    for row in reader:
-        # Find columns by common names
-        normalized = {}
-        for key, value in row.items():
-            k = key.strip().lower().replace('"', '').replace("'", "")
-            if k in ("date", "transaction date", "tx date"):
-                normalized["date"] = value.strip().replace('"', '').replace("'", "")
-            elif k in ("description", "desc", "narration", "details", "particulars"):
-                normalized["description"] = value.strip().replace('"', '').replace("'", "")
-            elif k in ("amount", "amt", "value", "debit/credit"):
-                try:
-                    normalized["amount"] = float(value.strip().replace('"', '').replace("'", "").replace(",", ""))
-                except ValueError:
-                    continue
-            elif k in ("payment method", "method", "mode", "paymentmethod", "payment_method"):
-                normalized["payment_method"] = value.strip()
-
-        if "date" in normalized and "description" in normalized and "amount" in normalized:
-            normalized["date"] = normalize_date(normalized["date"])
-            transactions.append(normalized)
-
-    return transactions
-
-
 async def get_or_create_category(client, category_name: str, tx_type: str) -> str | None:
     """Get category ID by name, or create it if it doesn't exist.
     
@@ -102,7 +41,7 @@ async def get_or_create_category(client, category_name: str, tx_type: str) -> st
 
     try:
         # Try to find existing
-        result = client.table("categories").select("id").eq("name", category_name).execute()
+        result = await run(client.table("categories").select("id").eq("name", category_name))
         if result.data:
             return result.data[0]["id"]
     except Exception:
@@ -110,10 +49,10 @@ async def get_or_create_category(client, category_name: str, tx_type: str) -> st
 
     try:
         # Create new – may fail if RLS blocks inserts on categories
-        result = client.table("categories").insert({
+        result = await run(client.table("categories").insert({
             "name": category_name,
             "type": tx_type,
-        }).execute()
+        }))
         return result.data[0]["id"] if result.data else None
     except Exception:
         # RLS blocked the insert – try with the base (anon) client
@@ -121,13 +60,13 @@ async def get_or_create_category(client, category_name: str, tx_type: str) -> st
         try:
             base = get_supabase()
             # Check again with base client
-            result = base.table("categories").select("id").eq("name", category_name).execute()
+            result = await run(base.table("categories").select("id").eq("name", category_name))
             if result.data:
                 return result.data[0]["id"]
-            result = base.table("categories").insert({
+            result = await run(base.table("categories").insert({
                 "name": category_name,
                 "type": tx_type,
-            }).execute()
+            }))
             return result.data[0]["id"] if result.data else None
         except Exception:
             # All attempts failed – skip category assignment
@@ -140,60 +79,123 @@ async def get_or_create_entity(client, entity_name: str, entity_type: str, busin
         return None
 
     try:
-        result = client.table("entities").select("id").eq("name", entity_name).eq("business_id", business_id).execute()
+        result = await run(client.table("entities").select("id").eq("name", entity_name).eq("business_id", business_id))
         if result.data:
             return result.data[0]["id"]
 
-        result = client.table("entities").insert({
+        result = await run(client.table("entities").insert({
             "name": entity_name,
             "entity_type": entity_type,
             "business_id": business_id,
-        }).execute()
+        }))
         return result.data[0]["id"] if result.data else None
     except Exception:
         # RLS or other error – skip entity assignment
         return None
 
 
+@router.get("/classification-cache")
+async def classification_cache_stats(user: dict = Depends(get_current_user)):
+    """Hit/miss counters for the LLM classification cache."""
+    # stats() counts the sqlite table under the cache lock; keep that off the event loop
+    return {"classification_cache": await asyncio.to_thread(classification_cache.stats)}
+
+
+def transaction_filters(
+    date_from: str | None = None,
+    date_to: str | None = None,
+    type: str | None = None,
+    category_id: str | None = None,
+    entity_id: str | None = None,
+    min_amount: float | None = None,
+    max_amount: float | None = None,
+) -> dict:
+    """Listing/export filters from the query string."""
+    if type is not None and type not in ("income", "expense"):
+        raise HTTPException(status_code=400, detail="type must be 'income' or 'expense'")
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "type": type,
+        "category_id": category_id,
+        "entity_id": entity_id,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+    }
+
+
+def _flatten_listed(tx: dict) -> dict:
+    """Flatten the joined data of a listed transaction."""
+    return {
+        "id": tx["id"],
+        "business_id": tx["business_id"],
+        "date": tx["date"],
+        "description": tx["description"],
+        "amount": float(tx["amount"]),
+        "type": tx["type"],
+        "category_id": tx["category_id"],
+        "category_name": tx.get("categories", {}).get("name", "") if tx.get("categories") else "",
+        "entity_id": tx["entity_id"],
+        "entity_name": tx.get("entities", {}).get("name", "") if tx.get("entities") else "",
+        "entity_type": tx.get("entities", {}).get("entity_type", "") if tx.get("entities") else "",
+        "created_at": tx["created_at"],
+    }
+
+
 @router.get("")
 async def list_transactions(
     business_id: str,
-    limit: int = 500,
-    offset: int = 0,
+    limit: int = Query(500, ge=1, le=TRANSACTIONS_PAGE_MAX),
+    cursor: str | None = None,
+    filters: dict = Depends(transaction_filters),
     user: dict = Depends(get_current_user),
 ):
-    """List transactions for a business with category and entity joins."""
+    """List transactions for a business, newest first, one keyset page at a time.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` to get the next
+    page; it is null on the last page.
+    """
     client = get_authenticated_client(user["access_token"])
-    
-    result = (
-        client.table("transactions")
-        .select("*, categories(name), entities(name, entity_type)")
-        .eq("business_id", business_id)
-        .order("date", desc=True)
-        .range(offset, offset + limit - 1)
-        .execute()
-    )
 
-    # Flatten the joined data
-    transactions = []
-    for tx in result.data:
-        flat = {
-            "id": tx["id"],
-            "business_id": tx["business_id"],
-            "date": tx["date"],
-            "description": tx["description"],
-            "amount": float(tx["amount"]),
-            "type": tx["type"],
-            "category_id": tx["category_id"],
-            "category_name": tx.get("categories", {}).get("name", "") if tx.get("categories") else "",
-            "entity_id": tx["entity_id"],
-            "entity_name": tx.get("entities", {}).get("name", "") if tx.get("entities") else "",
-            "entity_type": tx.get("entities", {}).get("entity_type", "") if tx.get("entities") else "",
-            "created_at": tx["created_at"],
-        }
-        transactions.append(flat)
-
-    return {"transactions": transactions, "count": len(transactions)}
+    try:
+        query = transactions_page_query(client, business_id, filters, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = await run(query)
+
+    rows = result.data[:limit]
+    transactions = [_flatten_listed(tx) for tx in rows]
+    next_cursor = encode_cursor(rows[-1]) if len(result.data) > limit else None
+
+    return {"transactions": transactions, "count": len(transactions), "next_cursor": next_cursor}
+
+
+@router.get("/export")
+async def export_transactions(
+    business_id: str,
+    filters: dict = Depends(transaction_filters),
+    user: dict = Depends(get_current_user),
+):
+    """Stream every matching transaction as NDJSON (one JSON object per line).
+
+    Rows are written page by page as they are fetched, so the full list
+    is never held in memory.
+    """
+    client = get_authenticated_client(user["access_token"])
+
+    if not await business_exists(client, business_id, user["id"]):
+        raise HTTPException(status_code=404, detail="Business not found")
+
+    async def lines():
+        async for page in iter_transaction_pages(client, business_id, filters, TRANSACTIONS_EXPORT_PAGE_SIZE):
+            if page:
+                yield "".join(json.dumps(_flatten_listed(tx)) + "\n" for tx in page)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="transactions-{business_id}.ndjson"'},
+    )
 
 
 @router.post("")
@@ -201,21 +203,20 @@ async def create_transaction(body: TransactionCreate, user: dict = Depends(get_c
     """Create a single transaction with AI classification."""
     client = get_authenticated_client(user["access_token"])
 
-    # Verify business belongs to user
-    biz = client.table("businesses").select("id").eq("id", body.business_id).eq("user_id", user["id"]).execute()
-    if not biz.data:
+    # Verify business belongs to user while loading user corrections
+    owned, matcher = await asyncio.gather(
+        business_exists(client, body.business_id, user["id"]),
+        correction_matcher(client, body.business_id),
+    )
+    if not owned:
         raise HTTPException(status_code=404, detail="Business not found")
 
     # Check user corrections first
-    corrections = client.table("user_corrections").select("*").eq("business_id", body.business_id).execute()
-    correction_match = None
-    for c in corrections.data:
-        if c.get("description_pattern") and c["description_pattern"].lower() in body.description.lower():
-            correction_match = c
-            break
+    correction_match = matcher.match(body.description)
 
     # AI Classification
     tx_type = "expense" if body.amount < 0 else "income"
+    category_name = ""
     
     if correction_match:
         category_id = correction_match.get("category_id")
@@ -247,249 +248,107 @@ async def create_transaction(body: TransactionCreate, user: dict = Depends(get_c
         "category_id": category_id,
         "entity_id": entity_id,
     }
-    result = client.table("transactions").insert(tx_data).execute()
+    # Score against the category's history before the row joins it
+    stats = await anomalies.business_stats(client, body.business_id)
+    stats.preview([tx_data])
+    result = await run(client.table("transactions").insert(tx_data))
 
     if not result.data:
         raise HTTPException(status_code=400, detail="Failed to create transaction")
+    # Only a stored row joins the category's sketch
+    scored = stats.fold(result.data)
+
+    aggregate_store.apply_inserts(
+        body.business_id,
+        result.data,
+        category_names={category_id: category_name} if category_id else None,
+        entity_names={entity_id: entity_name} if entity_id else None,
+    )
+    await recurring.record_inserts(
+        client, body.business_id, result.data,
+        category_names={category_id: category_name} if category_id else None,
+    )
+    await anomalies.save(client, body.business_id, stats, scored)
 
     return {"transaction": result.data[0], "entity_name": entity_name}
 
 
-@router.post("/upload-csv")
+@router.post("/upload-csv", status_code=202)
 async def upload_csv(
     business_id: str,
     file: UploadFile = File(...),
     user: dict = Depends(get_current_user),
 ):
-    """Upload and process a CSV file of transactions."""
+    """Queue a CSV file of transactions for background import."""
     client = get_authenticated_client(user["access_token"])
 
     # Verify business
-    biz = client.table("businesses").select("id").eq("id", business_id).eq("user_id", user["id"]).execute()
-    if not biz.data:
+    if not await business_exists(client, business_id, user["id"]):
         raise HTTPException(status_code=404, detail="Business not found")
 
-    content = await file.read()
-    text = content.decode("utf-8")
-    
-    raw_txs = parse_csv_content(text)
-    if not raw_txs:
-        raise HTTPException(status_code=400, detail="No valid transactions found in CSV")
-
-    # Load user corrections
-    corrections = client.table("user_corrections").select("*").eq("business_id", business_id).execute()
-    correction_map = {}
-    for c in corrections.data:
-        if c.get("description_pattern"):
-            correction_map[c["description_pattern"].lower()] = c
-
-    # Separate transactions needing AI vs corrections
-    needs_ai = []
-    corrected = []
-    for tx in raw_txs:
-        desc_lower = tx["description"].lower()
-        matched = None
-        for pattern, correction in correction_map.items():
-            if pattern in desc_lower:
-                matched = correction
-                break
-        if matched:
-            corrected.append({**tx, "_correction": matched})
-        else:
-            needs_ai.append(tx)
-
-    # Batch AI classification
-    ai_results = []
-    batch_size = 30
-    for i in range(0, len(needs_ai), batch_size):
-        batch = needs_ai[i:i + batch_size]
-        batch_results = await classify_transactions_batch(batch)
-        ai_results.extend(batch_results)
-
-    # Insert all transactions
-    inserted = []
-    
-    # Process AI-classified transactions
-    for i, tx in enumerate(needs_ai):
-        cls = ai_results[i] if i < len(ai_results) else {}
-        tx_type = "expense" if tx["amount"] < 0 else "income"
-        
-        category_name = cls.get("category", "Miscellaneous" if tx_type == "expense" else "Other Income")
-        entity_name = cls.get("entity_name", "")
-        entity_type = cls.get("entity_type", "supplier" if tx_type == "expense" else "customer")
-        
-        category_id = await get_or_create_category(client, category_name, tx_type)
-        entity_id = await get_or_create_entity(client, entity_name, entity_type, business_id) if entity_name else None
-
-        tx_record = {
-            "business_id": business_id,
-            "date": tx["date"],
-            "description": tx["description"],
-            "amount": tx["amount"],
-            "type": tx_type,
-            "category_id": category_id,
-            "entity_id": entity_id,
-        }
-        inserted.append(tx_record)
-
-    # Process corrected transactions
-    for tx_data in corrected:
-        correction = tx_data.pop("_correction")
-        tx_type = "expense" if tx_data["amount"] < 0 else "income"
-        entity_name = correction.get("entity_name", "")
-        entity_type = "supplier" if tx_type == "expense" else "customer"
-        entity_id = await get_or_create_entity(client, entity_name, entity_type, business_id) if entity_name else None
-
-        tx_record = {
-            "business_id": business_id,
-            "date": tx_data["date"],
-            "description": tx_data["description"],
-            "amount": tx_data["amount"],
-            "type": tx_type,
-            "category_id": correction.get("category_id"),
-            "entity_id": entity_id,
-        }
-        inserted.append(tx_record)
-
-    # Bulk insert
-    if inserted:
-        result = client.table("transactions").insert(inserted).execute()
-        return {
-            "message": f"Successfully processed {len(result.data)} transactions",
-            "count": len(result.data),
-            "transactions": result.data,
-        }
-
-    return {"message": "No transactions to insert", "count": 0, "transactions": []}
+    # The upload is gone once we respond, so copy it to disk for the worker
+    path = await import_jobs.spool_upload(file)
+    job = import_jobs.submit(user["id"], business_id, client, path, source=file.filename or "upload.csv")
+    return {"message": "Import queued", **job.to_dict()}
 
 
-@router.post("/process-csv-text")
+@router.post("/process-csv-text", status_code=202)
 async def process_csv_text(
     body: dict,
     user: dict = Depends(get_current_user),
 ):
-    """Process CSV text content (sent as JSON body) and insert transactions."""
-    import traceback as _tb
-
+    """Queue CSV text content (sent as JSON body) for background import."""
     business_id = body.get("business_id")
     csv_text = body.get("csv_text", "")
     
     if not business_id or not csv_text:
         raise HTTPException(status_code=400, detail="business_id and csv_text required")
 
-    try:
-        client = get_authenticated_client(user["access_token"])
+    client = get_authenticated_client(user["access_token"])
 
-        # Verify business
-        biz = client.table("businesses").select("id").eq("id", business_id).eq("user_id", user["id"]).execute()
-        if not biz.data:
-            raise HTTPException(status_code=404, detail="Business not found")
+    # Verify business
+    if not await business_exists(client, business_id, user["id"]):
+        raise HTTPException(status_code=404, detail="Business not found")
 
-        raw_txs = parse_csv_content(csv_text)
-        if not raw_txs:
-            raise HTTPException(status_code=400, detail="No valid transactions found in CSV")
+    path = await import_jobs.spool_text(csv_text)
+    job = import_jobs.submit(user["id"], business_id, client, path, source="csv_text")
+    return {"message": "Import queued", **job.to_dict()}
 
-        # Load user corrections (gracefully handle if table doesn't exist)
-        correction_map = {}
-        try:
-            corrections = client.table("user_corrections").select("*").eq("business_id", business_id).execute()
-            for c in corrections.data:
-                if c.get("description_pattern"):
-                    correction_map[c["description_pattern"].lower()] = c
-        except Exception as corr_err:
-            print(f"[WARN] Could not load user_corrections: {corr_err}")
-
-        needs_ai = []
-        corrected = []
-        for tx in raw_txs:
-            desc_lower = tx["description"].lower()
-            matched = None
-            for pattern, correction in correction_map.items():
-                if pattern in desc_lower:
-                    matched = correction
-                    break
-            if matched:
-                corrected.append({**tx, "_correction": matched})
-            else:
-                needs_ai.append(tx)
-
-        # Batch AI classification (with fallback on failure)
-        ai_results = []
-        batch_size = 30
-        for i in range(0, len(needs_ai), batch_size):
-            batch = needs_ai[i:i + batch_size]
-            try:
-                batch_results = await classify_transactions_batch(batch)
-                ai_results.extend(batch_results)
-            except Exception as ai_err:
-                print(f"[WARN] AI classification failed for batch: {ai_err}")
-                # Fallback: basic classification without AI
-                for tx in batch:
-                    is_expense = tx["amount"] < 0
-                    ai_results.append({
-                        "category": "Miscellaneous" if is_expense else "Other Income",
-                        "entity_name": "",
-                        "entity_type": "supplier" if is_expense else "customer",
-                        "tags": [],
-                    })
-
-        inserted = []
-        
-        for i, tx in enumerate(needs_ai):
-            cls = ai_results[i] if i < len(ai_results) else {}
-            tx_type = "expense" if tx["amount"] < 0 else "income"
-            
-            category_name = cls.get("category", "Miscellaneous" if tx_type == "expense" else "Other Income")
-            entity_name = cls.get("entity_name", "")
-            entity_type = cls.get("entity_type", "supplier" if tx_type == "expense" else "customer")
-            
-            category_id = await get_or_create_category(client, category_name, tx_type)
-            entity_id = await get_or_create_entity(client, entity_name, entity_type, business_id) if entity_name else None
-
-            tx_record = {
-                "business_id": business_id,
-                "date": tx["date"],
-                "description": tx["description"],
-                "amount": tx["amount"],
-                "type": tx_type,
-                "category_id": category_id,
-                "entity_id": entity_id,
-            }
-            inserted.append(tx_record)
-
-        for tx_data in corrected:
-            correction = tx_data.pop("_correction")
-            tx_type = "expense" if tx_data["amount"] < 0 else "income"
-            entity_name = correction.get("entity_name", "")
-            entity_type = "supplier" if tx_type == "expense" else "customer"
-            entity_id = await get_or_create_entity(client, entity_name, entity_type, business_id) if entity_name else None
-
-            tx_record = {
-                "business_id": business_id,
-                "date": tx_data["date"],
-                "description": tx_data["description"],
-                "amount": tx_data["amount"],
-                "type": tx_type,
-                "category_id": correction.get("category_id"),
-                "entity_id": entity_id,
-            }
-            inserted.append(tx_record)
 
-        if inserted:
-            result = client.table("transactions").insert(inserted).execute()
-            return {
-                "message": f"Successfully processed {len(result.data)} transactions",
-                "count": len(result.data),
-                "transactions": result.data,
-            }
+@router.get("/jobs/{job_id}")
+async def get_import_job(
+    job_id: str,
+    include_ids: bool = False,
+    ids_offset: int = 0,
+    ids_limit: int = 1000,
+    user: dict = Depends(get_current_user),
+):
+    """Progress of a background CSV import: rows parsed/classified/inserted, errors, timings.
 
-        return {"message": "No transactions to insert", "count": 0, "transactions": []}
+    With ``include_ids`` a page of the inserted transaction ids is returned
+    too (rows are never echoed back in full).
+    """
+    job = import_jobs.get(job_id, user["id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    result = job.to_dict()
+    if include_ids:
+        result["ids"] = job.ids(ids_offset, ids_limit)
+    return result
+
+
+@router.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_import_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Restart a failed import from its last committed checkpoint."""
+    job = import_jobs.get(job_id, user["id"])
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if not job.resumable:
+        raise HTTPException(status_code=409, detail=f"Import job is {job.status} and cannot be resumed")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        _tb.print_exc()
-        raise HTTPException(status_code=500, detail=f"CSV processing failed: {str(e)}")
+    client = get_authenticated_client(user["access_token"])
+    import_jobs.resume(job, client)
+    return {"message": "Import resumed", **job.to_dict()}
 
 
 @router.delete("/{transaction_id}")
@@ -499,5 +358,8 @@ async def delete_transaction(
 ):
     """Delete a transaction."""
     client = get_authenticated_client(user["access_token"])
-    result = client.table("transactions").delete().eq("id", transaction_id).execute()
+    result = await run(client.table("transactions").delete().eq("id", transaction_id))
+    for row in result.data:
+        aggregate_store.apply_deletes(row["business_id"], [row])
+        await recurring.record_deletes(client, row["business_id"], [row])
     return {"message": "Transaction deleted", "deleted": len(result.data)}
@@ -1,6 +1,7 @@
 """Application configuration loaded from environment variables."""
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,3 +17,112 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "https://fincopilot-three.vercel.app")
 SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET", "")
 # The JWT issuer for Supabase is the project URL
 JWT_ISSUER = f"{SUPABASE_URL}/auth/v1"
+
+# Number of businesses whose running analytics aggregates are kept in memory
+AGGREGATE_STORE_MAX_BUSINESSES = int(os.getenv("AGGREGATE_STORE_MAX_BUSINESSES", "256"))
+
+# Local JWT verification
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "authenticated")
+# Fall back to Supabase's /auth/v1/user when local verification fails
+AUTH_REMOTE_FALLBACK = os.getenv("AUTH_REMOTE_FALLBACK", "false").lower() in ("1", "true", "yes")
+# Verified tokens kept in memory, and how long a remotely verified token stays cached (seconds)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
+AUTH_REMOTE_CACHE_TTL = int(os.getenv("AUTH_REMOTE_CACHE_TTL", "300"))
+
+# Shared HTTP connection pool (PostgREST and Supabase Auth)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_POOL_KEEPALIVE = int(os.getenv("HTTP_POOL_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+# Threads used to run blocking PostgREST queries off the event loop
+DB_MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "16"))
+
+# LLM classification cache: in-process LRU + on-disk SQLite tier
+CLASSIFY_CACHE_PATH = os.getenv(
+    "CLASSIFY_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "fincopilot_classifications.sqlite3"),
+)
+CLASSIFY_CACHE_MEMORY_SIZE = int(os.getenv("CLASSIFY_CACHE_MEMORY_SIZE", "5000"))
+CLASSIFY_CACHE_MAX_ROWS = int(os.getenv("CLASSIFY_CACHE_MAX_ROWS", "100000"))
+CLASSIFY_CACHE_TTL_DAYS = float(os.getenv("CLASSIFY_CACHE_TTL_DAYS", "30"))
+
+# LLM classification dispatch for CSV imports
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "30"))
+CLASSIFY_CONCURRENCY = int(os.getenv("CLASSIFY_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+
+# Seconds a compiled user_corrections matcher is trusted before re-checking the table
+CORRECTIONS_CACHE_TTL = float(os.getenv("CORRECTIONS_CACHE_TTL", "60"))
+
+# Streaming CSV imports: bytes read per chunk, rows classified/inserted per window
+CSV_CHUNK_SIZE = int(os.getenv("CSV_CHUNK_SIZE", str(64 * 1024)))
+CSV_WINDOW_SIZE = int(os.getenv("CSV_WINDOW_SIZE", "500"))
+
+# Background CSV import jobs: concurrent workers, finished jobs kept for polling, upload spool dir
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+IMPORT_JOB_HISTORY = int(os.getenv("IMPORT_JOB_HISTORY", "200"))
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", tempfile.gettempdir())
+# Rows per PostgREST insert request during CSV imports
+IMPORT_INSERT_CHUNK_SIZE = int(os.getenv("IMPORT_INSERT_CHUNK_SIZE", "250"))
+
+# Transaction listing: largest page a client may request, rows fetched per NDJSON export query
+TRANSACTIONS_PAGE_MAX = int(os.getenv("TRANSACTIONS_PAGE_MAX", "1000"))
+TRANSACTIONS_EXPORT_PAGE_SIZE = int(os.getenv("TRANSACTIONS_EXPORT_PAGE_SIZE", "1000"))
+
+# Where cold analytics aggregates are computed: python (rows + NumPy), postgres (analytics_aggregates RPC) or sqlite
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "python")
+
+# Analytics response cache: entries kept, seconds a superseded payload may still be served while it refreshes
+ANALYTICS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "512"))
+ANALYTICS_STALE_SECONDS = float(os.getenv("ANALYTICS_STALE_SECONDS", "30"))
+
+# Analytics responses: compress bodies at least this large (gzip, or brotli when installed), and at these levels
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+# Financial snapshots (per user/business, per data version) kept in memory
+SNAPSHOT_MAX_ENTRIES = int(os.getenv("SNAPSHOT_MAX_ENTRIES", "256"))
+
+# Cashflow forecasting: days of history fitted, default interval confidence, longest horizon accepted
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "365"))
+FORECAST_CONFIDENCE = float(os.getenv("FORECAST_CONFIDENCE", "0.8"))
+FORECAST_MAX_HORIZON = int(os.getenv("FORECAST_MAX_HORIZON", "365"))
+
+# Duplicate detection: days apart two rows may be, minimum trigram similarity of their descriptions
+DUPLICATE_DATE_WINDOW_DAYS = int(os.getenv("DUPLICATE_DATE_WINDOW_DAYS", "3"))
+DUPLICATE_SIMILARITY = float(os.getenv("DUPLICATE_SIMILARITY", "0.7"))
+# Most earlier rows of the same block each row is compared with (bounds dense price points)
+DUPLICATE_MAX_COMPARISONS = int(os.getenv("DUPLICATE_MAX_COMPARISONS", "32"))
+
+# Businesses whose recurring-pattern index is kept in memory
+RECURRING_MAX_BUSINESSES = int(os.getenv("RECURRING_MAX_BUSINESSES", "1000"))
+
+# Anomaly scoring: robust z-score and multiple of the category median a row must reach, rows a category needs first
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+ANOMALY_MIN_MULTIPLIER = float(os.getenv("ANOMALY_MIN_MULTIPLIER", "2.0"))
+ANOMALY_MIN_COUNT = int(os.getenv("ANOMALY_MIN_COUNT", "5"))
+# Businesses whose category sketches are kept in memory
+ANOMALY_MAX_BUSINESSES = int(os.getenv("ANOMALY_MAX_BUSINESSES", "1000"))
+
+# Generated insights/summaries: identical LLM requests kept in memory and reused for this long
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+
+# LLM calls: per-call timeout, seconds /api/analytics/insights may spend on its generations, and
+# hedging (a duplicate request once a call outlives this latency percentile of its kind; 0 disables)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_INSIGHTS_BUDGET = float(os.getenv("LLM_INSIGHTS_BUDGET", "25"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+
+# Chat sessions: sessions kept and idle seconds before one expires, estimated tokens of verbatim
+# history before older turns are compacted into a summary, and the summary's own cap
+CHAT_SESSION_MAX_ENTRIES = int(os.getenv("CHAT_SESSION_MAX_ENTRIES", "1000"))
+CHAT_SESSION_TTL_SECONDS = float(os.getenv("CHAT_SESSION_TTL_SECONDS", "3600"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
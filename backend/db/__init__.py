@@ -1,9 +1,39 @@
-"""Supabase client initialization."""
+"""Supabase client initialization.
 
+All PostgREST traffic goes through one process-wide, keep-alive HTTP/2
+connection pool. Per-request clients are thin views over that pool which
+stamp the caller's JWT on each request, so RLS still sees the right user
+without building a new HTTP session per request.
+"""
+
+import httpx
+from postgrest._sync.request_builder import SyncRequestBuilder, SyncRPCFilterRequestBuilder
 from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_ANON_KEY
+from config import (
+    SUPABASE_URL,
+    SUPABASE_ANON_KEY,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+)
 
 _client: Client | None = None
+_postgrest_session: httpx.Client | None = None
+_http_client: httpx.AsyncClient | None = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
 
 
 def get_supabase() -> Client:
@@ -14,24 +44,91 @@ def get_supabase() -> Client:
     return _client
 
 
-def get_supabase_with_token(access_token: str) -> Client:
-    """Create a Supabase client authenticated with the user's JWT.
-    
-    This ensures RLS policies are applied correctly since
-    the client operates as the authenticated user.
+def get_postgrest_session() -> httpx.Client:
+    """Get or create the shared PostgREST connection pool."""
+    global _postgrest_session
+    if _postgrest_session is None:
+        _postgrest_session = httpx.Client(
+            base_url=f"{SUPABASE_URL}/rest/v1",
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+                "Accept-Profile": "public",
+                "Content-Profile": "public",
+                "apikey": SUPABASE_ANON_KEY,
+                "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
+            },
+            limits=_limits(),
+            timeout=_timeout(),
+            follow_redirects=True,
+            http2=True,
+        )
+    return _postgrest_session
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared async HTTP client used for Supabase Auth calls."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(limits=_limits(), timeout=_timeout(), http2=True)
+    return _http_client
+
+
+async def close_clients() -> None:
+    """Close the shared connection pools (called on application shutdown)."""
+    global _postgrest_session, _http_client
+    if _postgrest_session is not None:
+        _postgrest_session.close()
+        _postgrest_session = None
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class _TokenSession:
+    """View over the shared session that sends one user's JWT with every request."""
+
+    def __init__(self, session: httpx.Client, access_token: str):
+        self._session = session
+        self._authorization = f"Bearer {access_token}"
+
+    def request(self, method: str, url, *, headers=None, **kwargs) -> httpx.Response:
+        headers = httpx.Headers(headers)
+        headers["Authorization"] = self._authorization
+        return self._session.request(method, url, headers=headers, **kwargs)
+
+
+class AuthenticatedClient:
+    """PostgREST client acting as one user, backed by the shared connection pool.
+
+    Exposes the ``table``/``from_``/``rpc`` query builders of the Supabase
+    client, which is all the API routers use.
     """
-    client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    client.auth.set_session(access_token, "")
-    return client
 
+    def __init__(self, access_token: str):
+        self._session = _TokenSession(get_postgrest_session(), access_token)
+
+    def from_(self, table: str) -> SyncRequestBuilder:
+        return SyncRequestBuilder(self._session, f"/{table}")
+
+    def table(self, table: str) -> SyncRequestBuilder:
+        return self.from_(table)
+
+    def rpc(self, func: str, params: dict) -> SyncRPCFilterRequestBuilder:
+        return SyncRPCFilterRequestBuilder(
+            self._session, f"/rpc/{func}", "POST", httpx.Headers(), httpx.QueryParams(), json=params
+        )
+
+
+def get_supabase_with_token(access_token: str) -> AuthenticatedClient:
+    """Alias of ``get_authenticated_client`` kept for existing callers."""
+    return get_authenticated_client(access_token)
+
+
+def get_authenticated_client(access_token: str) -> AuthenticatedClient:
+    """Return a client with the user's access token in headers.
 
-def get_authenticated_client(access_token: str) -> Client:
-    """Create a Supabase client with the user's access token in headers.
-    
-    This is needed for RLS policies to work - the Supabase client
-    will include the JWT in all requests, and Postgres will evaluate
-    auth.uid() based on this token.
+    This is needed for RLS policies to work - every request carries the
+    JWT, and Postgres will evaluate auth.uid() based on this token.
     """
-    client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    client.postgrest.auth(access_token)
-    return client
+    return AuthenticatedClient(access_token)
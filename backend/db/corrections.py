@@ -0,0 +1,57 @@
+"""User corrections - per-business pattern matchers cached between requests.
+
+Each business's ``user_corrections`` rows are compiled into one
+Aho-Corasick ``PatternMatcher``. The matcher is reused until the table
+changes: after CORRECTIONS_CACHE_TTL seconds a one-row probe (row count
+plus the most recently updated row and its ``updated_at``) is compared
+against the cached fingerprint, and the table is only reloaded and
+recompiled when it differs. Inserts and deletes change the count or the
+newest row; in-place edits bump ``updated_at`` through a trigger (see
+database/databaseschema.md).
+"""
+
+import time
+from config import CORRECTIONS_CACHE_TTL
+from db.queries import run
+from services.pattern_matcher import PatternMatcher
+
+# business_id -> (fingerprint, checked_at, matcher)
+_matchers: dict[str, tuple[tuple, float, PatternMatcher]] = {}
+
+
+async def correction_matcher(client, business_id: str) -> PatternMatcher:
+    """Matcher whose payloads are the ``user_corrections`` rows of the business."""
+    now = time.time()
+    cached = _matchers.get(business_id)
+    if cached is not None and now - cached[1] < CORRECTIONS_CACHE_TTL:
+        return cached[2]
+
+    probe = await run(
+        client.table("user_corrections")
+        .select("id, updated_at", count="exact")
+        .eq("business_id", business_id)
+        .order("updated_at", desc=True)
+        .limit(1)
+    )
+    newest = probe.data[0] if probe.data else {}
+    fingerprint = (probe.count, newest.get("id"), newest.get("updated_at"))
+    if cached is not None and cached[0] == fingerprint:
+        _matchers[business_id] = (fingerprint, now, cached[2])
+        return cached[2]
+
+    rows = await run(
+        client.table("user_corrections")
+        .select("*")
+        .eq("business_id", business_id)
+        .order("created_at", desc=False)
+    )
+    matcher = PatternMatcher([
+        (c["description_pattern"], c) for c in rows.data if c.get("description_pattern")
+    ])
+    _matchers[business_id] = (fingerprint, now, matcher)
+    return matcher
+
+
+def invalidate(business_id: str) -> None:
+    """Force the next lookup to reload the business's corrections."""
+    _matchers.pop(business_id, None)
@@ -0,0 +1,148 @@
+"""Async data access - runs PostgREST queries without blocking the event loop.
+
+supabase-py/postgrest query builders are synchronous. Every ``execute()``
+is handed to a bounded thread pool so the uvicorn worker keeps serving
+other requests while a query is in flight, and ``run_all`` lets a handler
+issue independent queries concurrently.
+"""
+
+import asyncio
+import base64
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date as _date
+from typing import AsyncIterator
+from config import DB_MAX_WORKERS
+
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="db")
+
+
+async def run(query):
+    """Execute a query builder on the DB thread pool and return its response."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, query.execute)
+
+
+async def run_all(*queries) -> list:
+    """Execute independent query builders concurrently, preserving order."""
+    return list(await asyncio.gather(*(run(q) for q in queries)))
+
+
+def shutdown() -> None:
+    """Stop the DB thread pool (called on application shutdown)."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ---- Common queries -------------------------------------------------------
+
+def business_query(client, business_id: str, user_id: str):
+    """Ownership check: the business row, if it belongs to the user."""
+    return client.table("businesses").select("id").eq("id", business_id).eq("user_id", user_id)
+
+
+def transactions_query(client, business_id: str):
+    """All transactions for a business with joined category/entity data."""
+    return (
+        client.table("transactions")
+        .select("*, categories(name), entities(name, entity_type)")
+        .eq("business_id", business_id)
+        .order("date", desc=False)
+    )
+
+
+def flatten_transaction(tx: dict) -> dict:
+    """Flatten a transaction row with its joined category/entity names."""
+    return {
+        "id": tx["id"],
+        "date": tx["date"],
+        "description": tx["description"],
+        "amount": float(tx["amount"]),
+        "type": tx["type"],
+        "category_name": tx.get("categories", {}).get("name", "") if tx.get("categories") else "",
+        "entity_name": tx.get("entities", {}).get("name", "") if tx.get("entities") else "",
+        "entity_type": tx.get("entities", {}).get("entity_type", "") if tx.get("entities") else "",
+        "category_id": tx.get("category_id"),
+        "entity_id": tx.get("entity_id"),
+        "payment_method": tx.get("payment_method", ""),
+        "created_at": tx.get("created_at"),
+        "is_anomaly": tx.get("is_anomaly"),
+        "anomaly_score": float(tx["anomaly_score"]) if tx.get("anomaly_score") is not None else None,
+    }
+
+
+# ---- Keyset pagination ---------------------------------------------------
+
+def encode_cursor(row: dict) -> str:
+    """Opaque cursor pointing just past ``row`` in (date desc, id desc) order."""
+    raw = json.dumps([row["date"], row["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Inverse of ``encode_cursor``; raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date, tx_id = json.loads(raw)
+        # Both values end up inside a PostgREST or=(...) filter, so only
+        # accept exactly what encode_cursor produces
+        _date.fromisoformat(date)
+        tx_id = str(uuid.UUID(tx_id))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    return date, tx_id
+
+
+def transactions_page_query(client, business_id: str, filters: dict, cursor: str | None, limit: int):
+    """One page of a business's transactions, newest first, after ``cursor``.
+
+    ``filters`` may hold date_from/date_to (inclusive), type, category_id,
+    entity_id and min_amount/max_amount (signed, so expenses are negative).
+    Fetches ``limit + 1`` rows so the caller can tell whether more follow.
+    """
+    query = (
+        client.table("transactions")
+        .select("*, categories(name), entities(name, entity_type)")
+        .eq("business_id", business_id)
+    )
+    if filters.get("date_from"):
+        query = query.gte("date", filters["date_from"])
+    if filters.get("date_to"):
+        query = query.lte("date", filters["date_to"])
+    for column in ("type", "category_id", "entity_id"):
+        if filters.get(column):
+            query = query.eq(column, filters[column])
+    if filters.get("min_amount") is not None:
+        query = query.gte("amount", filters["min_amount"])
+    if filters.get("max_amount") is not None:
+        query = query.lte("amount", filters["max_amount"])
+    if cursor:
+        date, tx_id = decode_cursor(cursor)
+        query = query.or_(f"date.lt.{date},and(date.eq.{date},id.lt.{tx_id})")
+    return query.order("date", desc=True).order("id", desc=True).limit(limit + 1)
+
+
+async def iter_transaction_pages(
+    client, business_id: str, filters: dict, page_size: int
+) -> AsyncIterator[list[dict]]:
+    """Yield raw transaction pages in keyset order until the filter is exhausted."""
+    cursor = None
+    while True:
+        result = await run(transactions_page_query(client, business_id, filters, cursor, page_size))
+        rows = result.data
+        yield rows[:page_size]
+        if len(rows) <= page_size:
+            return
+        cursor = encode_cursor(rows[page_size - 1])
+
+
+async def business_exists(client, business_id: str, user_id: str) -> bool:
+    """Whether the business exists and belongs to the user."""
+    result = await run(business_query(client, business_id, user_id))
+    return bool(result.data)
+
+
+async def fetch_transactions(client, business_id: str) -> list[dict]:
+    """Fetch all transactions for a business, flattened."""
+    result = await run(transactions_query(client, business_id))
+    return [flatten_transaction(tx) for tx in result.data]
@@ -0,0 +1,115 @@
+"""Bulk category/entity resolution for CSV imports.
+
+Replaces per-row get-or-create lookups with a fixed number of round
+trips per import: one query to load all categories, one to load the
+business's entities, and one bulk insert each for whatever names are
+still missing. The resulting id maps are then reused for every row.
+A failed load leaves its map empty: missing categories are then looked
+up by name before being created, and entities are not assigned.
+"""
+
+import asyncio
+from db import get_supabase
+from db.queries import run
+
+
+class CatalogResolver:
+    """Name -> id maps for categories and one business's entities."""
+
+    def __init__(self, client, business_id: str):
+        self.client = client
+        self.business_id = business_id
+        self.category_ids: dict[str, str] = {}
+        self.entity_ids: dict[str, str] = {}
+        # Whether each map holds the whole table (see ``load``)
+        self.categories_loaded = False
+        self.entities_loaded = False
+
+    async def load(self) -> "CatalogResolver":
+        """Load every category and every entity of the business."""
+        self.categories_loaded, self.entities_loaded = await asyncio.gather(
+            self._load(self.category_ids, self.client.table("categories").select("id, name"), "categories"),
+            self._load(
+                self.entity_ids,
+                self.client.table("entities").select("id, name").eq("business_id", self.business_id),
+                "entities",
+            ),
+        )
+        return self
+
+    async def _load(self, ids: dict[str, str], query, table: str) -> bool:
+        try:
+            result = await run(query)
+        except Exception as e:
+            # RLS, timeout... – start empty and let ``ensure`` fall back
+            print(f"[WARN] Could not load {table}: {e}")
+            return False
+        self._remember(ids, result.data)
+        return True
+
+    async def ensure(self, categories: dict[str, str], entities: dict[str, str]) -> None:
+        """Create all missing names in one bulk insert per table.
+
+        ``categories`` maps category name -> transaction type and
+        ``entities`` maps entity name -> entity type.
+        """
+        missing_categories = [
+            {"name": name, "type": tx_type}
+            for name, tx_type in categories.items()
+            if name and name not in self.category_ids
+        ]
+        missing_entities = [
+            {"name": name, "entity_type": entity_type, "business_id": self.business_id}
+            for name, entity_type in entities.items()
+            if name and name not in self.entity_ids
+        ]
+
+        if missing_categories:
+            await self._create_categories(missing_categories)
+        if missing_entities and not self.entities_loaded:
+            # Inserting blind could duplicate existing entities – rows keep no entity
+            print("[WARN] Entities were not loaded; skipping entity assignment")
+        elif missing_entities:
+            try:
+                result = await run(self.client.table("entities").insert(missing_entities))
+                self._remember(self.entity_ids, result.data)
+            except Exception as e:
+                # RLS or other error – rows keep no entity
+                print(f"[WARN] Could not create entities: {e}")
+
+    async def _create_categories(self, rows: list[dict]) -> None:
+        # Without the full table, names must be looked up before inserting
+        if self.categories_loaded:
+            try:
+                result = await run(self.client.table("categories").insert(rows))
+                self._remember(self.category_ids, result.data)
+                return
+            except Exception:
+                pass
+
+        # RLS blocked the insert (or the load failed) – try with the base (anon) client
+        try:
+            base = get_supabase()
+            existing = await run(
+                base.table("categories").select("id, name").in_("name", [r["name"] for r in rows])
+            )
+            self._remember(self.category_ids, existing.data)
+            still_missing = [r for r in rows if r["name"] not in self.category_ids]
+            if still_missing:
+                result = await run(base.table("categories").insert(still_missing))
+                self._remember(self.category_ids, result.data)
+        except Exception as e:
+            # All attempts failed – skip category assignment
+            print(f"[WARN] Could not create categories: {e}")
+
+    def category_id(self, name: str) -> str | None:
+        return self.category_ids.get(name) if name else None
+
+    def entity_id(self, name: str) -> str | None:
+        return self.entity_ids.get(name) if name else None
+
+    @staticmethod
+    def _remember(ids: dict[str, str], rows: list[dict]) -> None:
+        # First row wins, matching the old ``.eq("name", ...)[0]`` lookups
+        for row in rows or []:
+            ids.setdefault(row["name"], row["id"])
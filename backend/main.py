@@ -5,6 +5,9 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from config import FRONTEND_URL
+from db import close_clients
+from db import queries
+from services import import_jobs
 from api.auth import router as auth_router
 from api.businesses import router as business_router
 from api.transactions import router as transaction_router
@@ -53,6 +56,18 @@ app.include_router(analytics_router)
 app.include_router(chat_router)
 
 
+@app.on_event("startup")
+async def startup():
+    import_jobs.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await import_jobs.stop()
+    await close_clients()
+    queries.shutdown()
+
+
 @app.get("/")
 async def root():
     return {"message": "AI Financial Co-Pilot API", "status": "running"}
@@ -1,44 +1,133 @@
 """Auth middleware for FastAPI - verifies Supabase JWT tokens."""
 
+import time
+from collections import OrderedDict
 from fastapi import Request, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import httpx
-from config import SUPABASE_URL, SUPABASE_ANON_KEY
+from jose import jwt, JWTError, ExpiredSignatureError
+from db import get_http_client
+from config import (
+    SUPABASE_URL,
+    SUPABASE_ANON_KEY,
+    SUPABASE_JWT_SECRET,
+    JWT_ISSUER,
+    JWT_AUDIENCE,
+    AUTH_REMOTE_FALLBACK,
+    AUTH_TOKEN_CACHE_SIZE,
+    AUTH_REMOTE_CACHE_TTL,
+)
 
 security = HTTPBearer()
 
+# token -> (expires_at, user), least recently used first
+_verified_tokens: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+
+
+def _cache_get(token: str) -> dict | None:
+    entry = _verified_tokens.get(token)
+    if entry is None:
+        return None
+    expires_at, user = entry
+    if expires_at <= time.time():
+        del _verified_tokens[token]
+        return None
+    _verified_tokens.move_to_end(token)
+    return user
+
+
+def _cache_put(token: str, user: dict, expires_at: float) -> None:
+    _verified_tokens[token] = (expires_at, user)
+    _verified_tokens.move_to_end(token)
+    while len(_verified_tokens) > AUTH_TOKEN_CACHE_SIZE:
+        _verified_tokens.popitem(last=False)
+
+
+def _user_from_claims(claims: dict, token: str) -> dict:
+    metadata = claims.get("user_metadata") or {}
+    return {
+        "id": claims["sub"],
+        "email": claims.get("email", ""),
+        "full_name": metadata.get("full_name", ""),
+        "avatar_url": metadata.get("avatar_url", ""),
+        "access_token": token,
+    }
+
+
+def _verify_local(token: str) -> dict:
+    """Verify signature, expiry, audience and issuer with the project JWT secret."""
+    claims = jwt.decode(
+        token,
+        SUPABASE_JWT_SECRET,
+        algorithms=["HS256"],
+        audience=JWT_AUDIENCE,
+        issuer=JWT_ISSUER,
+    )
+    user = _user_from_claims(claims, token)
+    _cache_put(token, user, float(claims["exp"]))
+    return user
+
+
+async def _verify_remote(token: str) -> dict:
+    """Verify the token against Supabase's /auth/v1/user endpoint."""
+    response = await get_http_client().get(
+        f"{SUPABASE_URL}/auth/v1/user",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "apikey": SUPABASE_ANON_KEY,
+        },
+    )
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    user_data = response.json()
+    user = {
+        "id": user_data["id"],
+        "email": user_data.get("email", ""),
+        "full_name": user_data.get("user_metadata", {}).get("full_name", ""),
+        "avatar_url": user_data.get("user_metadata", {}).get("avatar_url", ""),
+        "access_token": token,
+    }
+
+    # Remote answers are cached briefly, and never past the token's own expiry
+    expires_at = time.time() + AUTH_REMOTE_CACHE_TTL
+    try:
+        expires_at = min(expires_at, float(jwt.get_unverified_claims(token)["exp"]))
+    except (JWTError, KeyError, TypeError, ValueError):
+        pass
+    _cache_put(token, user, expires_at)
+    return user
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> dict:
     """Verify the Supabase JWT and return user info.
-    
-    Uses Supabase's own /auth/v1/user endpoint to verify the token,
-    which is the most reliable approach (no need for JWT secret).
+
+    Tokens are verified locally with SUPABASE_JWT_SECRET (signature, expiry,
+    audience and issuer) and the verified user is cached until the token
+    expires. Supabase's /auth/v1/user endpoint is only consulted when no
+    secret is configured, or when AUTH_REMOTE_FALLBACK is enabled and local
+    verification fails for a reason other than expiry.
     """
     token = credentials.credentials
 
+    cached = _cache_get(token)
+    if cached is not None:
+        return cached
+
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{SUPABASE_URL}/auth/v1/user",
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "apikey": SUPABASE_ANON_KEY,
-                },
-            )
-
-        if response.status_code != 200:
-            raise HTTPException(status_code=401, detail="Invalid or expired token")
-
-        user_data = response.json()
-        return {
-            "id": user_data["id"],
-            "email": user_data.get("email", ""),
-            "full_name": user_data.get("user_metadata", {}).get("full_name", ""),
-            "avatar_url": user_data.get("user_metadata", {}).get("avatar_url", ""),
-            "access_token": token,
-        }
+        if SUPABASE_JWT_SECRET:
+            try:
+                return _verify_local(token)
+            except ExpiredSignatureError:
+                raise HTTPException(status_code=401, detail="Invalid or expired token")
+            except JWTError:
+                if not AUTH_REMOTE_FALLBACK:
+                    raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+        return await _verify_remote(token)
 
     except httpx.RequestError:
         raise HTTPException(status_code=503, detail="Auth service unavailable")
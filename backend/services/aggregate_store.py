@@ -0,0 +1,252 @@
+"""Aggregate store - running per-business financial aggregates kept up to date on writes.
+
+Analytics reads come from here in O(buckets) instead of re-aggregating the
+full transaction history. Write endpoints feed inserted and deleted rows in
+as deltas; anything that cannot be applied exactly (for instance a category
+id whose name is unknown) simply drops the business so the next read
+rebuilds it, either from rows the caller already fetched or through the
+configured aggregation backend (see services/aggregation.py).
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from config import AGGREGATE_STORE_MAX_BUSINESSES
+from services.aggregation import frame_aggregates, get_backend, materialize
+from services.analytics_service import compute_summary
+from services import data_version
+
+
+class BusinessAggregate:
+    """Running totals, counts and buckets for one business."""
+
+    def __init__(self):
+        self.transaction_count = 0
+        self.income_count = 0
+        self.expense_count = 0
+        self.total_income = 0.0
+        self.total_expenses = 0.0
+        # date -> row count, so min/max survive deletes
+        self.days: dict[str, int] = {}
+        # month -> [income, expenses, income_count, expense_count]
+        self.monthly: dict[str, list] = {}
+        # name -> [total, count]
+        self.categories: dict[str, list] = {}
+        self.customers: dict[str, list] = {}
+        self.suppliers: dict[str, list] = {}
+        # id -> name, used to resolve names on raw inserted/deleted rows
+        self.category_names: dict[str, str] = {}
+        self.entity_names: dict[str, str] = {}
+
+    @classmethod
+    def from_aggregates(cls, aggregates: dict) -> "BusinessAggregate":
+        """Build the aggregate from an aggregation backend's output."""
+        agg = cls()
+        totals = aggregates["totals"]
+        agg.transaction_count = totals["transaction_count"]
+        agg.income_count = totals["income_count"]
+        agg.expense_count = totals["expense_count"]
+        agg.total_income = totals["total_income"]
+        agg.total_expenses = totals["total_expenses"]
+        agg.days = dict(aggregates["days"])
+        agg.monthly = {k: list(v) for k, v in aggregates["monthly"].items()}
+        agg.categories = {k: list(v) for k, v in aggregates["categories"].items()}
+        agg.customers = {k: list(v) for k, v in aggregates["customers"].items()}
+        agg.suppliers = {k: list(v) for k, v in aggregates["suppliers"].items()}
+        agg.category_names = dict(aggregates["category_names"])
+        agg.entity_names = dict(aggregates["entity_names"])
+        return agg
+
+    @classmethod
+    def from_transactions(cls, transactions: list[dict]) -> "BusinessAggregate":
+        """Build the aggregate from flattened transactions with vectorized group-bys."""
+        return cls.from_aggregates(frame_aggregates(transactions))
+
+    def apply(self, tx: dict, sign: int = 1) -> None:
+        """Add (``sign=1``) or remove (``sign=-1``) one flattened transaction."""
+        amount = float(tx["amount"])
+        tx_type = tx.get("type")
+        self.transaction_count += sign
+
+        if tx_type == "income":
+            self.income_count += sign
+            self.total_income += sign * amount
+        elif tx_type == "expense":
+            self.expense_count += sign
+            self.total_expenses += sign * abs(amount)
+
+        try:
+            day = datetime.strptime(str(tx["date"]), "%Y-%m-%d")
+        except (ValueError, KeyError):
+            day = None
+        if day is not None:
+            _bump(self.days, day.strftime("%Y-%m-%d"), sign)
+        if day is not None and "type" in tx:
+            bucket = self.monthly.setdefault(day.strftime("%Y-%m"), [0.0, 0.0, 0, 0])
+            if tx_type == "income":
+                bucket[0] += sign * amount
+                bucket[2] += sign
+            else:
+                bucket[1] += sign * abs(amount)
+                bucket[3] += sign
+            if bucket[2] <= 0 and bucket[3] <= 0:
+                del self.monthly[day.strftime("%Y-%m")]
+
+        entity = tx.get("entity_name", "")
+        if tx_type == "income":
+            if entity:
+                _add(self.customers, entity, sign * amount, sign)
+        elif tx_type == "expense":
+            category = tx.get("category_name") or tx.get("category", "Miscellaneous")
+            _add(self.categories, category, sign * abs(amount), sign)
+            if entity:
+                _add(self.suppliers, entity, sign * abs(amount), sign)
+
+    def resolve(self, row: dict) -> dict | None:
+        """Attach category/entity names to a raw ``transactions`` row.
+
+        Returns None when a referenced id has no known name.
+        """
+        category_id = row.get("category_id")
+        entity_id = row.get("entity_id")
+        if category_id and category_id not in self.category_names:
+            return None
+        if entity_id and entity_id not in self.entity_names:
+            return None
+        return {
+            **row,
+            "category_name": self.category_names.get(category_id, "") if category_id else "",
+            "entity_name": self.entity_names.get(entity_id, "") if entity_id else "",
+        }
+
+    def summary(self) -> dict:
+        """Materialize the ``compute_summary`` dict from the buckets."""
+        if self.transaction_count <= 0:
+            return compute_summary([])
+        return materialize({
+            "totals": {
+                "transaction_count": self.transaction_count,
+                "income_count": self.income_count,
+                "expense_count": self.expense_count,
+                "total_income": self.total_income,
+                "total_expenses": self.total_expenses,
+            },
+            "days": self.days,
+            "monthly": self.monthly,
+            "categories": self.categories,
+            "customers": self.customers,
+            "suppliers": self.suppliers,
+        })
+
+
+# business_id -> BusinessAggregate, least recently used first
+_store: OrderedDict[str, BusinessAggregate] = OrderedDict()
+
+
+def generation(business_id: str) -> int:
+    """Write generation to capture before fetching rows for ``build``/``keep``.
+
+    This is the business's data-version counter, so a load that raced
+    with any write is simply not kept.
+    """
+    return data_version.counter(business_id)
+
+
+def summary(business_id: str) -> dict | None:
+    """Return the cached summary, or None if the business is not loaded."""
+    agg = _store.get(business_id)
+    if agg is None:
+        return None
+    _store.move_to_end(business_id)
+    return agg.summary()
+
+
+async def fetch(
+    client,
+    business_id: str,
+    transactions: list[dict] | None = None,
+    backend: str | None = None,
+) -> BusinessAggregate:
+    """Compute a fresh aggregate with an aggregation backend (not stored).
+
+    ``transactions`` are passed through for backends that aggregate rows
+    the caller already fetched; the ``postgres`` backend ignores them.
+    """
+    aggregates = await get_backend(backend).aggregates(client, business_id, transactions)
+    return BusinessAggregate.from_aggregates(aggregates)
+
+
+async def build(
+    client,
+    business_id: str,
+    generation_seen: int,
+    transactions: list[dict] | None = None,
+    backend: str | None = None,
+) -> dict:
+    """``fetch`` then ``keep``; for callers that already verified ownership."""
+    agg = await fetch(client, business_id, transactions, backend)
+    return keep(business_id, agg, generation_seen)
+
+
+def keep(business_id: str, agg: BusinessAggregate, generation_seen: int) -> dict:
+    """Store ``agg`` and return its summary.
+
+    The aggregate is only kept if no write landed since ``generation_seen``,
+    otherwise the rows it was built from may already be out of date.
+    """
+    if generation(business_id) == generation_seen:
+        _store[business_id] = agg
+        _store.move_to_end(business_id)
+        while len(_store) > AGGREGATE_STORE_MAX_BUSINESSES:
+            _store.popitem(last=False)
+    return agg.summary()
+
+
+def apply_inserts(
+    business_id: str,
+    rows: list[dict],
+    category_names: dict[str, str] | None = None,
+    entity_names: dict[str, str] | None = None,
+) -> None:
+    """Add freshly inserted ``transactions`` rows to the running aggregates."""
+    _apply(business_id, rows, 1, category_names or {}, entity_names or {})
+
+
+def apply_deletes(business_id: str, rows: list[dict]) -> None:
+    """Remove deleted ``transactions`` rows from the running aggregates."""
+    _apply(business_id, rows, -1, {}, {})
+
+
+def invalidate(business_id: str) -> None:
+    """Drop a business so the next read rebuilds it."""
+    data_version.bump(business_id)
+    _store.pop(business_id, None)
+
+
+def _apply(business_id, rows, sign, category_names, entity_names) -> None:
+    data_version.bump(business_id)
+    agg = _store.get(business_id)
+    if agg is None or not rows:
+        return
+
+    agg.category_names.update({k: v for k, v in category_names.items() if k and v})
+    agg.entity_names.update({k: v for k, v in entity_names.items() if k and v})
+    resolved = [agg.resolve(row) for row in rows]
+    if any(tx is None for tx in resolved):
+        invalidate(business_id)
+        return
+    for tx in resolved:
+        agg.apply(tx, sign)
+
+
+def _bump(counter: dict, key, sign: int) -> None:
+    counter[key] = counter.get(key, 0) + sign
+    if counter[key] <= 0:
+        del counter[key]
+
+
+def _add(buckets: dict, key, amount: float, sign: int) -> None:
+    bucket = buckets.setdefault(key, [0.0, 0])
+    bucket[0] += amount
+    bucket[1] += sign
+    if bucket[1] <= 0:
+        del buckets[key]
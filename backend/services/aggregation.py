@@ -0,0 +1,324 @@
+"""Aggregation backends - where per-business financial aggregates are computed.
+
+Every backend produces the same ``aggregates`` dict (totals, rows per day,
+monthly buckets, category/customer/supplier buckets and id -> name maps),
+which ``materialize`` turns into the ``compute_summary`` shape:
+
+- ``python``   aggregates flattened rows with ``TransactionFrame`` (default)
+- ``postgres`` calls the ``analytics_aggregates`` database function, so only
+  the aggregate rows cross the wire (SQL in database/databaseschema.md)
+- ``sqlite``   runs the same group-bys over the rows in an in-memory SQLite
+  database, for checking the SQL path offline
+
+ANALYTICS_BACKEND picks the backend used to build the aggregate store.
+"""
+
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+from config import ANALYTICS_BACKEND
+from db.queries import fetch_transactions, run
+from services.transaction_frame import TransactionFrame
+
+
+def empty_aggregates() -> dict:
+    return {
+        "totals": {
+            "transaction_count": 0,
+            "income_count": 0,
+            "expense_count": 0,
+            "total_income": 0,
+            "total_expenses": 0,
+        },
+        # date -> row count
+        "days": {},
+        # month -> [income, expenses, income_count, expense_count]
+        "monthly": {},
+        # name -> [total, count], largest first
+        "categories": {},
+        "customers": {},
+        "suppliers": {},
+        # id -> name
+        "category_names": {},
+        "entity_names": {},
+    }
+
+
+def _name_maps(aggregates: dict, transactions: list[dict]) -> None:
+    for tx in transactions:
+        if tx.get("category_id") and tx.get("category_name"):
+            aggregates["category_names"][tx["category_id"]] = tx["category_name"]
+        if tx.get("entity_id") and tx.get("entity_name"):
+            aggregates["entity_names"][tx["entity_id"]] = tx["entity_name"]
+
+
+# ---- python ----------------------------------------------------------------
+
+def frame_aggregates(transactions: list[dict]) -> dict:
+    """Aggregate flattened transactions with vectorized group-bys."""
+    aggregates = empty_aggregates()
+    _name_maps(aggregates, transactions)
+    if not transactions:
+        return aggregates
+
+    frame = TransactionFrame(transactions)
+    aggregates["totals"] = {
+        "transaction_count": frame.size,
+        "income_count": int(frame.is_income.sum()),
+        "expense_count": int(frame.is_expense.sum()),
+        "total_income": frame.total(frame.is_income, frame.amount),
+        "total_expenses": frame.total(frame.is_expense, frame.abs_amount),
+    }
+    aggregates["days"] = frame.day_counts()
+    aggregates["monthly"] = {
+        month: [inc, exp, n_inc, n_exp]
+        for month, inc, exp, n_inc, n_exp in frame.monthly_buckets()
+    }
+    aggregates["categories"] = _buckets(*frame.group(frame.category, frame.is_expense, frame.abs_amount))
+    aggregates["customers"] = _buckets(*frame.group(
+        frame.entity, frame.is_income & frame.has_entity, frame.amount))
+    aggregates["suppliers"] = _buckets(*frame.group(
+        frame.entity, frame.is_expense & frame.has_entity, frame.abs_amount))
+    return aggregates
+
+
+def _buckets(names: list, totals: list, counts: list) -> dict[str, list]:
+    return {name: [total, count] for name, total, count in zip(names, totals, counts)}
+
+
+# ---- sqlite ----------------------------------------------------------------
+
+_SQLITE_SCHEMA = """
+create table tx (
+    day text,
+    has_type integer not null,
+    type text,
+    amount real not null,
+    category text not null,
+    entity text not null
+)
+"""
+
+# Same group-bys as analytics_aggregates(); ties keep first-appearance order
+_SQLITE_QUERIES = {
+    "totals": """
+        select count(*),
+               count(case when type = 'income' then 1 end),
+               count(case when type = 'expense' then 1 end),
+               total(case when type = 'income' then amount end),
+               total(case when type = 'expense' then abs(amount) end)
+        from tx
+    """,
+    "days": "select day, count(*) from tx where day is not null group by day order by day",
+    "monthly": """
+        select substr(day, 1, 7) as month,
+               total(case when type = 'income' then amount end),
+               total(case when type is not 'income' then abs(amount) end),
+               count(case when type = 'income' then 1 end),
+               count(case when type is not 'income' then 1 end)
+        from tx where day is not null and has_type
+        group by month order by month
+    """,
+    "categories": """
+        select category, total(abs(amount)) as t, count(*) from tx
+        where type = 'expense'
+        group by category order by t desc, min(rowid)
+    """,
+    "customers": """
+        select entity, total(amount) as t, count(*) from tx
+        where type = 'income' and entity <> ''
+        group by entity order by t desc, min(rowid)
+    """,
+    "suppliers": """
+        select entity, total(abs(amount)) as t, count(*) from tx
+        where type = 'expense' and entity <> ''
+        group by entity order by t desc, min(rowid)
+    """,
+}
+
+
+def _valid_day(value) -> str | None:
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def sqlite_aggregates(transactions: list[dict]) -> dict:
+    """Aggregate flattened transactions with SQL in an in-memory SQLite database."""
+    aggregates = empty_aggregates()
+    _name_maps(aggregates, transactions)
+    if not transactions:
+        return aggregates
+
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute(_SQLITE_SCHEMA)
+        conn.executemany(
+            "insert into tx values (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    _valid_day(t.get("date")),
+                    "type" in t,
+                    t.get("type"),
+                    float(t["amount"]),
+                    t.get("category_name") or t.get("category", "Miscellaneous"),
+                    t.get("entity_name", "") or "",
+                )
+                for t in transactions
+            ],
+        )
+        q = {name: conn.execute(sql).fetchall() for name, sql in _SQLITE_QUERIES.items()}
+    finally:
+        conn.close()
+
+    count, n_income, n_expense, income, expenses = q["totals"][0]
+    return _from_rows(
+        aggregates,
+        [count, n_income, n_expense, income if n_income else 0, expenses if n_expense else 0],
+        q["days"], q["monthly"], q["categories"], q["customers"], q["suppliers"],
+    )
+
+
+def _from_rows(aggregates: dict, totals, days, monthly, categories, customers, suppliers) -> dict:
+    """Fill ``aggregates`` from positional SQL result rows."""
+    count, n_income, n_expense, income, expenses = totals
+    aggregates["totals"] = {
+        "transaction_count": int(count),
+        "income_count": int(n_income),
+        "expense_count": int(n_expense),
+        "total_income": income,
+        "total_expenses": expenses,
+    }
+    aggregates["days"] = {day: int(n) for day, n in days}
+    aggregates["monthly"] = {
+        month: [inc if n_inc else 0, exp if n_exp else 0, int(n_inc), int(n_exp)]
+        for month, inc, exp, n_inc, n_exp in monthly
+    }
+    for key, rows in (("categories", categories), ("customers", customers), ("suppliers", suppliers)):
+        aggregates[key] = {name: [total, int(n)] for name, total, n in rows}
+    return aggregates
+
+
+# ---- backends --------------------------------------------------------------
+
+class AggregationBackend(ABC):
+    """Computes the ``aggregates`` dict for one business."""
+
+    name = ""
+    # Whether the backend aggregates flattened rows (and so benefits from rows the caller already has)
+    uses_rows = True
+
+    @abstractmethod
+    async def aggregates(self, client, business_id: str, transactions: list[dict] | None = None) -> dict:
+        """``transactions`` are already-fetched flattened rows, if the caller has them."""
+
+
+class PythonBackend(AggregationBackend):
+    name = "python"
+
+    async def aggregates(self, client, business_id, transactions=None):
+        if transactions is None:
+            transactions = await fetch_transactions(client, business_id)
+        return frame_aggregates(transactions)
+
+
+class SQLiteBackend(AggregationBackend):
+    name = "sqlite"
+
+    async def aggregates(self, client, business_id, transactions=None):
+        if transactions is None:
+            transactions = await fetch_transactions(client, business_id)
+        return sqlite_aggregates(transactions)
+
+
+class PostgresBackend(AggregationBackend):
+    """Pushes the group-bys into Postgres via the ``analytics_aggregates`` RPC."""
+
+    name = "postgres"
+    uses_rows = False
+
+    async def aggregates(self, client, business_id, transactions=None):
+        result = await run(client.rpc("analytics_aggregates", {"p_business_id": business_id}))
+        data = result.data or {}
+        aggregates = empty_aggregates()
+        t = data.get("totals") or {}
+        _from_rows(
+            aggregates,
+            [t.get("transaction_count", 0), t.get("income_count", 0), t.get("expense_count", 0),
+             t.get("total_income", 0), t.get("total_expenses", 0)],
+            data.get("days") or [], data.get("monthly") or [],
+            data.get("categories") or [], data.get("customers") or [], data.get("suppliers") or [],
+        )
+        aggregates["category_names"] = data.get("category_names") or {}
+        aggregates["entity_names"] = data.get("entity_names") or {}
+        return aggregates
+
+
+_BACKENDS: dict[str, AggregationBackend] = {
+    backend.name: backend for backend in (PythonBackend(), SQLiteBackend(), PostgresBackend())
+}
+
+
+def get_backend(name: str | None = None) -> AggregationBackend:
+    """Look up a backend by name (default ANALYTICS_BACKEND)."""
+    name = name or ANALYTICS_BACKEND
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown analytics backend '{name}' (expected one of {', '.join(_BACKENDS)})")
+    return _BACKENDS[name]
+
+
+# ---- summary ---------------------------------------------------------------
+
+def materialize(aggregates: dict) -> dict:
+    """Build the ``compute_summary`` dict from non-empty aggregates."""
+    totals = aggregates["totals"]
+    total_income = totals["total_income"]
+    total_expenses = totals["total_expenses"]
+    net_profit = total_income - total_expenses
+
+    days = aggregates["days"]
+    min_date = datetime.strptime(min(days), "%Y-%m-%d") if days else None
+    max_date = datetime.strptime(max(days), "%Y-%m-%d") if days else None
+    day_span = max(1, (max_date - min_date).days + 1) if min_date and max_date else 1
+
+    avg_daily_income = total_income / day_span
+    avg_daily_expense = total_expenses / day_span
+
+    return {
+        "total_income": total_income,
+        "total_expenses": total_expenses,
+        "net_profit": net_profit,
+        "transaction_count": totals["transaction_count"],
+        "income_count": totals["income_count"],
+        "expense_count": totals["expense_count"],
+        "avg_daily_income": avg_daily_income,
+        "avg_daily_expense": avg_daily_expense,
+        "net_daily_change": avg_daily_income - avg_daily_expense,
+        "profit_margin": (net_profit / total_income * 100) if total_income > 0 else 0,
+        "expense_ratio": (total_expenses / total_income * 100) if total_income > 0 else 0,
+        "date_range": {
+            "min": min_date.isoformat() if min_date else None,
+            "max": max_date.isoformat() if max_date else None,
+            "day_span": day_span,
+        },
+        "monthly_trends": [
+            {"month": k, "income": v[0] if v[2] else 0, "expenses": v[1] if v[3] else 0}
+            for k, v in sorted(aggregates["monthly"].items())
+        ],
+        "category_breakdown": [
+            {"name": k, "total": v[0],
+             "percentage": (v[0] / total_expenses * 100) if total_expenses > 0 else 0}
+            for k, v in sorted(aggregates["categories"].items(), key=lambda x: -x[1][0])
+        ],
+        "customers": _entity_list(aggregates["customers"], total_income),
+        "suppliers": _entity_list(aggregates["suppliers"], total_expenses),
+    }
+
+
+def _entity_list(buckets: dict, grand_total: float) -> list[dict]:
+    return [
+        {"name": k, "total": v[0], "count": v[1],
+         "percentage": (v[0] / grand_total * 100) if grand_total > 0 else 0}
+        for k, v in sorted(buckets.items(), key=lambda x: -x[1][0])
+    ]
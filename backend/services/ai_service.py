@@ -1,16 +1,66 @@
 """AI Service - Handles all LLM interactions via Groq API."""
 
+import asyncio
 import json
+import random
+import time
+from typing import AsyncIterator
+import openai
 from openai import AsyncOpenAI
-from config import GROQ_API_KEY, LLM_MODEL
+from config import (
+    GROQ_API_KEY,
+    LLM_MODEL,
+    CLASSIFY_BATCH_SIZE,
+    CLASSIFY_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_TIMEOUT,
+)
+from services import classification_cache, llm_cache, llm_orchestrator
 
 # Groq uses OpenAI-compatible API
 groq_client = AsyncOpenAI(
     api_key=GROQ_API_KEY,
     base_url="https://api.groq.com/openai/v1",
-    timeout=30.0,
+    timeout=LLM_TIMEOUT,
 )
 
+# Classification retries are handled here (honoring Retry-After), so the
+# client's own retry loop is switched off for those calls
+_classify_client = groq_client.with_options(max_retries=0)
+
+# Caps concurrent classification calls from this worker across all imports
+_classify_slots: asyncio.Semaphore | None = None
+
+
+def _retry_delay(error: Exception, attempt: int) -> float | None:
+    """Seconds to wait before retrying ``error``, or None if it is not retryable."""
+    if isinstance(error, openai.RateLimitError):
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            if retry_after is not None:
+                return min(float(retry_after), LLM_BACKOFF_MAX) + random.uniform(0, LLM_BACKOFF_BASE)
+        except ValueError:
+            pass
+    elif not isinstance(error, (openai.APIConnectionError, openai.InternalServerError, asyncio.TimeoutError)):
+        return None
+    # Full jitter exponential backoff
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+async def _with_retries(fn, *args):
+    """Await ``fn(*args)``, retrying rate limits and transient API errors."""
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        try:
+            return await fn(*args)
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None or attempt == LLM_MAX_RETRIES:
+                raise
+            print(f"[WARN] LLM call failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
 
 async def classify_transaction(description: str, amount: float) -> dict:
     """Use AI to classify a transaction into category, entity, type, and tags."""
@@ -42,15 +92,15 @@ Tags can include: Recurring, One-time, Large Expense, High Priority, Operational
 IMPORTANT: Return ONLY the JSON object, no other text."""
 
     try:
-        response = await groq_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
+        response = await llm_orchestrator.complete(groq_client, "classify_one", {
+            "model": LLM_MODEL,
+            "messages": [
                 {"role": "system", "content": "You are a precise financial classification AI. Always respond with valid JSON only."},
                 {"role": "user", "content": prompt},
             ],
-            temperature=0.1,
-            max_tokens=200,
-        )
+            "temperature": 0.1,
+            "max_tokens": 200,
+        })
         
         content = response.choices[0].message.content.strip()
         # Clean up potential markdown wrapping
@@ -80,15 +130,24 @@ IMPORTANT: Return ONLY the JSON object, no other text."""
         }
 
 
-async def classify_transactions_batch(transactions: list[dict]) -> list[dict]:
-    """Classify multiple transactions in a single LLM call for efficiency."""
-    if not transactions:
-        return []
+def _fallback_classification(tx: dict) -> dict:
+    return {
+        "category": "Miscellaneous" if float(tx["amount"]) < 0 else "Other Income",
+        "entity_name": "",
+        "entity_type": "",
+        "tags": [],
+    }
+
 
-    # Build batch prompt
+async def _classify_batch_llm(transactions: list[dict]) -> list[dict | None]:
+    """Classify transactions in a single LLM call.
+
+    Returns one classification per transaction, or None where the model
+    returned fewer rows than requested. Raises on API or parse errors.
+    """
     tx_list = "\n".join([
         f"{i+1}. Description: \"{tx['description']}\", Amount: {tx['amount']}"
-        for i, tx in enumerate(transactions[:50])  # Limit to 50 per batch
+        for i, tx in enumerate(transactions)
     ])
 
     prompt = f"""You are a financial classification AI. Classify each transaction below.
@@ -110,63 +169,127 @@ Return a JSON array with one object per transaction, in the same order:
 
 IMPORTANT: Return ONLY the JSON array, no other text."""
 
-    try:
-        response = await groq_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a precise financial classification AI. Always respond with valid JSON only."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.1,
-            max_tokens=4000,
-        )
+    # Not hedged: imports already keep CLASSIFY_CONCURRENCY calls in flight
+    response = await llm_orchestrator.complete(_classify_client, "classify_batch", {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a precise financial classification AI. Always respond with valid JSON only."},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.1,
+        "max_tokens": 4000,
+    }, hedge=False)
+
+    content = response.choices[0].message.content.strip()
+    if content.startswith("```"):
+        content = content.split("\n", 1)[1] if "\n" in content else content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+        content = content.strip()
+
+    results = json.loads(content)
+
+    classified = []
+    for i, tx in enumerate(transactions):
+        is_expense = float(tx["amount"]) < 0
+        if i < len(results):
+            r = results[i]
+            classified.append({
+                "category": r.get("category", "Miscellaneous" if is_expense else "Other Income"),
+                "entity_name": r.get("entity_name", ""),
+                "entity_type": r.get("entity_type", "supplier" if is_expense else "customer"),
+                "tags": r.get("tags", []),
+            })
+        else:
+            classified.append(None)
+    return classified
 
-        content = response.choices[0].message.content.strip()
-        if content.startswith("```"):
-            content = content.split("\n", 1)[1] if "\n" in content else content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
 
-        results = json.loads(content)
-        
-        # Ensure we have results for each transaction
-        classified = []
-        for i, tx in enumerate(transactions[:50]):
-            is_expense = float(tx["amount"]) < 0
-            if i < len(results):
-                r = results[i]
-                classified.append({
-                    "category": r.get("category", "Miscellaneous" if is_expense else "Other Income"),
-                    "entity_name": r.get("entity_name", ""),
-                    "entity_type": r.get("entity_type", "supplier" if is_expense else "customer"),
-                    "tags": r.get("tags", []),
-                })
-            else:
-                classified.append({
-                    "category": "Miscellaneous" if is_expense else "Other Income",
-                    "entity_name": "",
-                    "entity_type": "",
-                    "tags": [],
-                })
+async def classify_transactions_batch(transactions: list[dict]) -> list[dict]:
+    """Classify multiple transactions in a single LLM call for efficiency.
+
+    Previously seen (description, sign, model) combinations are answered
+    from the classification cache; only the remaining unique descriptions
+    are sent to the LLM.
+    """
+    if not transactions:
+        return []
+
+    transactions = transactions[:50]  # Limit to 50 per batch
+    # The cache is sqlite behind a lock; keep its reads and writes off the event loop
+    classified = await asyncio.to_thread(classification_cache.get_many, transactions)
+
+    # Send each distinct uncached description to the model once
+    pending: dict[str, list[int]] = {}
+    for i, tx in enumerate(transactions):
+        if classified[i] is None:
+            pending.setdefault(classification_cache.cache_key(tx["description"], tx["amount"]), []).append(i)
+    if not pending:
         return classified
 
+    to_classify = [transactions[indexes[0]] for indexes in pending.values()]
+    try:
+        results = await _with_retries(_classify_batch_llm, to_classify)
     except Exception as e:
         print(f"Batch classification error: {e}")
-        # Fallback
-        return [
-            {
-                "category": "Miscellaneous" if float(tx["amount"]) < 0 else "Other Income",
-                "entity_name": "",
-                "entity_type": "",
-                "tags": [],
-            }
-            for tx in transactions[:50]
-        ]
+        results = [None] * len(to_classify)
+
+    fresh_txs, fresh_results = [], []
+    for tx, result, indexes in zip(to_classify, results, pending.values()):
+        if result is not None:
+            fresh_txs.append(tx)
+            fresh_results.append(result)
+        for i in indexes:
+            classified[i] = dict(result) if result is not None else _fallback_classification(transactions[i])
+
+    # Only genuine model answers are cached, never fallbacks
+    await asyncio.to_thread(classification_cache.put_many, fresh_txs, fresh_results)
+    return classified
+
+
+async def classify_transactions_concurrent(transactions: list[dict]) -> tuple[list[dict], dict]:
+    """Classify any number of transactions in concurrent batches.
+
+    Batches of CLASSIFY_BATCH_SIZE are dispatched at once, at most
+    CLASSIFY_CONCURRENCY in flight per worker, and results come back in
+    the original row order. Also returns throughput stats for the import
+    response.
+    """
+    global _classify_slots
+    if _classify_slots is None:
+        _classify_slots = asyncio.Semaphore(CLASSIFY_CONCURRENCY)
+
+    started = time.perf_counter()
+    batches = [
+        transactions[i:i + CLASSIFY_BATCH_SIZE]
+        for i in range(0, len(transactions), CLASSIFY_BATCH_SIZE)
+    ]
+
+    async def run(batch: list[dict]) -> list[dict]:
+        async with _classify_slots:
+            try:
+                return await classify_transactions_batch(batch)
+            except Exception as e:
+                print(f"[WARN] AI classification failed for batch: {e}")
+                return [_fallback_classification(tx) for tx in batch]
+
+    results = await asyncio.gather(*(run(batch) for batch in batches))
+    classified = [cls for batch_results in results for cls in batch_results]
+
+    seconds = time.perf_counter() - started
+    return classified, {
+        "rows": len(transactions),
+        "batches": len(batches),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(len(transactions) / seconds, 1) if seconds > 0 else None,
+    }
 
 
 async def generate_insights_ai(financial_data: dict) -> list[dict]:
-    """Generate AI-powered business insights from financial data."""
+    """Generate AI-powered business insights from financial data.
+
+    Answers are reused for identical requests (see services/llm_cache.py).
+    """
     prompt = f"""You are an AI financial advisor for small businesses. Analyze this financial data and generate actionable insights.
 
 Financial Summary:
@@ -196,36 +319,48 @@ Return a JSON array:
 
 IMPORTANT: Return ONLY the JSON array."""
 
-    try:
-        response = await groq_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": "You are an expert financial advisor AI. Respond with valid JSON only."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-            max_tokens=2000,
-        )
-
+    request = {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are an expert financial advisor AI. Respond with valid JSON only."},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.3,
+        "max_tokens": 2000,
+    }
+
+    async def generate():
+        response = await llm_orchestrator.complete(groq_client, "insights", request)
         content = response.choices[0].message.content.strip()
         if content.startswith("```"):
             content = content.split("\n", 1)[1] if "\n" in content else content[3:]
             if content.endswith("```"):
                 content = content[:-3]
             content = content.strip()
-
         return json.loads(content)
+
+    try:
+        return await llm_cache.cached(request, generate)
     except Exception as e:
         print(f"Insight generation error: {e}")
         return []
 
 
-async def chat_response(
+CHAT_UNAVAILABLE = "I'm having trouble connecting right now. Please try again in a moment."
+
+
+def _chat_request(
     query: str,
     financial_context: dict,
-    chat_history: list[dict] | None = None,
-) -> str:
-    """Generate a conversational AI response about user's finances."""
+    chat_history: list[dict] | None,
+    summary: str | None = None,
+    max_history: int | None = 6,
+) -> dict:
+    """Completion arguments for a chat turn (shared by the plain and streamed replies).
+
+    ``summary`` describes turns older than ``chat_history``; a session
+    passes its already-bounded history with ``max_history=None``.
+    """
     context_str = json.dumps(financial_context, default=str)
     
     system_prompt = f"""You are an AI Financial Co-Pilot — a friendly, intelligent business advisor. 
@@ -245,30 +380,100 @@ Rules:
 - Use bold (**text**) for key numbers"""
 
     messages = [{"role": "system", "content": system_prompt}]
-    
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+
     # Add chat history for context
     if chat_history:
-        for msg in chat_history[-6:]:  # Last 6 messages for context
+        recent = chat_history[-max_history:] if max_history else chat_history
+        for msg in recent:
             role = "assistant" if msg.get("role") == "ai" else "user"
             messages.append({"role": role, "content": msg["text"]})
     
     messages.append({"role": "user", "content": query})
+    return {
+        "model": LLM_MODEL,
+        "messages": messages,
+        "temperature": 0.4,
+        "max_tokens": 500,
+    }
 
+
+async def chat_response(
+    query: str,
+    financial_context: dict,
+    chat_history: list[dict] | None = None,
+    summary: str | None = None,
+    max_history: int | None = 6,
+) -> str:
+    """Generate a conversational AI response about user's finances."""
     try:
-        response = await groq_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=messages,
-            temperature=0.4,
-            max_tokens=500,
+        response = await llm_orchestrator.complete(
+            groq_client, "chat", _chat_request(query, financial_context, chat_history, summary, max_history)
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Chat error: {e}")
-        return "I'm having trouble connecting right now. Please try again in a moment."
+        return CHAT_UNAVAILABLE
+
+
+async def chat_response_stream(
+    query: str,
+    financial_context: dict,
+    chat_history: list[dict] | None = None,
+    summary: str | None = None,
+    max_history: int | None = 6,
+) -> AsyncIterator[str]:
+    """``chat_response``, yielded as text fragments while the model writes them.
+
+    If the call fails before anything was sent, the fallback message is
+    yielded instead; a failure mid-answer is raised to the caller.
+    """
+    sent = False
+    try:
+        async for delta in llm_orchestrator.stream(
+            groq_client, "chat_stream", _chat_request(query, financial_context, chat_history, summary, max_history)
+        ):
+            sent = True
+            yield delta
+    except Exception as e:
+        print(f"Chat stream error: {e}")
+        if sent:
+            raise
+        yield CHAT_UNAVAILABLE
+
+
+async def summarize_conversation(summary: str, turns: list[dict], max_tokens: int) -> str:
+    """Fold older chat turns into the running conversation summary. Raises on API errors."""
+    transcript = "\n".join(
+        f"{'Assistant' if t['role'] == 'ai' else 'User'}: {t['text']}" for t in turns
+    )
+    prompt = f"""Update the summary of a conversation between a small business owner and their financial advisor.
+Keep the facts, numbers, decisions and open questions; drop greetings and repetition.
+Stay under {int(max_tokens * 0.75)} words.
+
+Current summary:
+{summary or "(none)"}
+
+New messages:
+{transcript}
+
+Just write the updated summary text, nothing else."""
+
+    response = await llm_orchestrator.complete(groq_client, "chat_compaction", {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You write compact, factual conversation summaries."},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.1,
+        "max_tokens": max_tokens,
+    })
+    return response.choices[0].message.content.strip()
 
 
 async def generate_executive_summary(financial_data: dict) -> str:
-    """Generate a 2-4 sentence executive summary of the business."""
+    """Generate a 2-4 sentence executive summary of the business (cached like insights)."""
     prompt = f"""Based on this financial data, write a 2-3 sentence executive summary for a small business owner.
 Use plain language, no jargon. Be specific with numbers.
 
@@ -276,17 +481,22 @@ Data: {json.dumps(financial_data, default=str)}
 
 Just write the summary text, nothing else."""
 
-    try:
-        response = await groq_client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=[
-                {"role": "system", "content": "You are a concise financial advisor. Write plain-language summaries."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.3,
-            max_tokens=200,
-        )
+    request = {
+        "model": LLM_MODEL,
+        "messages": [
+            {"role": "system", "content": "You are a concise financial advisor. Write plain-language summaries."},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.3,
+        "max_tokens": 200,
+    }
+
+    async def generate():
+        response = await llm_orchestrator.complete(groq_client, "executive_summary", request)
         return response.choices[0].message.content.strip()
+
+    try:
+        return await llm_cache.cached(request, generate)
     except Exception as e:
         print(f"Executive summary error: {e}")
         return "Upload transactions to see your AI-generated business summary."
@@ -1,119 +1,30 @@
 """Analytics service - computes financial metrics from transaction data."""
 
-from datetime import datetime, timedelta
-from collections import defaultdict
-
-
-def compute_summary(transactions: list[dict]) -> dict:
-    """Compute comprehensive financial summary from transactions."""
+from services import anomalies
+from services.duplicates import find_duplicate_groups
+from services.recurring import detect_patterns
+from services.forecasting import DEFAULT_HORIZONS, forecast, validate_horizons
+from services.transaction_frame import TransactionFrame
+
+
+def compute_summary(transactions: list[dict], backend: str = "python") -> dict:
+    """Compute comprehensive financial summary from transactions.
+
+    With the default ``python`` backend the heavy lifting happens in a
+    columnar ``TransactionFrame`` that parses each row once and aggregates
+    with vectorized group-bys. ``sqlite`` runs the same aggregates as SQL in
+    an embedded database; to aggregate inside Postgres instead of over
+    fetched rows, use ``aggregate_store.build(..., backend="postgres")``.
+    """
     if not transactions:
         return _empty_summary()
 
-    income_txs = [t for t in transactions if t.get("type") == "income"]
-    expense_txs = [t for t in transactions if t.get("type") == "expense"]
-
-    total_income = sum(float(t["amount"]) for t in income_txs)
-    total_expenses = sum(abs(float(t["amount"])) for t in expense_txs)
-    net_profit = total_income - total_expenses
-
-    # Date range
-    dates = []
-    for t in transactions:
-        try:
-            dates.append(datetime.strptime(str(t["date"]), "%Y-%m-%d"))
-        except (ValueError, KeyError):
-            pass
-
-    min_date = min(dates) if dates else None
-    max_date = max(dates) if dates else None
-    day_span = max(1, (max_date - min_date).days + 1) if min_date and max_date else 1
-
-    avg_daily_income = total_income / day_span
-    avg_daily_expense = total_expenses / day_span
-    net_daily_change = avg_daily_income - avg_daily_expense
-
-    # Monthly breakdown
-    monthly = defaultdict(lambda: {"income": 0, "expenses": 0})
-    for tx in transactions:
-        try:
-            d = datetime.strptime(str(tx["date"]), "%Y-%m-%d")
-            key = d.strftime("%Y-%m")
-            if tx["type"] == "income":
-                monthly[key]["income"] += float(tx["amount"])
-            else:
-                monthly[key]["expenses"] += abs(float(tx["amount"]))
-        except (ValueError, KeyError):
-            pass
-
-    monthly_sorted = [
-        {"month": k, "income": v["income"], "expenses": v["expenses"]}
-        for k, v in sorted(monthly.items())
-    ]
-
-    # Category breakdown
-    category_breakdown = defaultdict(float)
-    for tx in expense_txs:
-        cat = tx.get("category_name") or tx.get("category", "Miscellaneous")
-        category_breakdown[cat] += abs(float(tx["amount"]))
-
-    cat_list = [
-        {"name": k, "total": v, "percentage": (v / total_expenses * 100) if total_expenses > 0 else 0}
-        for k, v in sorted(category_breakdown.items(), key=lambda x: -x[1])
-    ]
-
-    # Customer analysis
-    customers = defaultdict(lambda: {"total": 0, "count": 0})
-    for tx in income_txs:
-        entity = tx.get("entity_name", "")
-        if entity:
-            customers[entity]["total"] += float(tx["amount"])
-            customers[entity]["count"] += 1
-
-    customer_list = [
-        {"name": k, "total": v["total"], "count": v["count"],
-         "percentage": (v["total"] / total_income * 100) if total_income > 0 else 0}
-        for k, v in sorted(customers.items(), key=lambda x: -x[1]["total"])
-    ]
-
-    # Supplier analysis
-    suppliers = defaultdict(lambda: {"total": 0, "count": 0})
-    for tx in expense_txs:
-        entity = tx.get("entity_name", "")
-        if entity:
-            suppliers[entity]["total"] += abs(float(tx["amount"]))
-            suppliers[entity]["count"] += 1
-
-    supplier_list = [
-        {"name": k, "total": v["total"], "count": v["count"],
-         "percentage": (v["total"] / total_expenses * 100) if total_expenses > 0 else 0}
-        for k, v in sorted(suppliers.items(), key=lambda x: -x[1]["total"])
-    ]
-
-    profit_margin = (net_profit / total_income * 100) if total_income > 0 else 0
-    expense_ratio = (total_expenses / total_income * 100) if total_income > 0 else 0
-
-    return {
-        "total_income": total_income,
-        "total_expenses": total_expenses,
-        "net_profit": net_profit,
-        "transaction_count": len(transactions),
-        "income_count": len(income_txs),
-        "expense_count": len(expense_txs),
-        "avg_daily_income": avg_daily_income,
-        "avg_daily_expense": avg_daily_expense,
-        "net_daily_change": net_daily_change,
-        "profit_margin": profit_margin,
-        "expense_ratio": expense_ratio,
-        "date_range": {
-            "min": min_date.isoformat() if min_date else None,
-            "max": max_date.isoformat() if max_date else None,
-            "day_span": day_span,
-        },
-        "monthly_trends": monthly_sorted,
-        "category_breakdown": cat_list,
-        "customers": customer_list,
-        "suppliers": supplier_list,
-    }
+    if backend == "python":
+        return TransactionFrame(transactions).summary()
+    if backend == "sqlite":
+        from services.aggregation import materialize, sqlite_aggregates
+        return materialize(sqlite_aggregates(transactions))
+    raise ValueError(f"compute_summary cannot aggregate rows with the '{backend}' backend")
 
 
 def compute_health_score(summary: dict) -> dict:
@@ -198,8 +109,20 @@ def compute_health_score(summary: dict) -> dict:
     }
 
 
-def compute_forecast(summary: dict) -> list[dict]:
-    """Compute cashflow forecasts for 7, 30, and 90 days."""
+def compute_forecast(
+    summary: dict,
+    transactions: list[dict] | None = None,
+    horizons: tuple[int, ...] = DEFAULT_HORIZONS,
+) -> list[dict]:
+    """Compute cashflow forecasts for 7, 30, and 90 days (or ``horizons``).
+
+    With ``transactions`` the seasonal model in services/forecasting.py is
+    used and each horizon also carries confidence intervals; with only a
+    summary the lifetime daily averages are projected.
+    """
+    if transactions is not None:
+        return forecast(transactions, horizons)
+
     avg_income = summary.get("avg_daily_income", 0)
     avg_expense = summary.get("avg_daily_expense", 0)
     net_daily = summary.get("net_daily_change", 0)
@@ -211,67 +134,46 @@ def compute_forecast(summary: dict) -> list[dict]:
             "projected_expenses": round(avg_expense * d, 2),
             "net_change": round(net_daily * d, 2),
         }
-        for d in [7, 30, 90]
+        for d in validate_horizons(horizons)
     ]
 
 
 def detect_recurring(transactions: list[dict]) -> list[dict]:
-    """Detect recurring transaction patterns."""
-    groups = defaultdict(list)
-    for tx in transactions:
-        key = tx.get("description", "").lower().strip()
-        if key:
-            groups[key].append(tx)
+    """Detect recurring expense patterns, classified weekly/monthly/irregular.
 
-    recurring = []
-    for desc, group in groups.items():
-        if len(group) >= 2:
-            amounts = [abs(float(t["amount"])) for t in group]
-            avg_amount = sum(amounts) / len(amounts)
-            all_similar = all(abs(a - avg_amount) / max(avg_amount, 0.01) < 0.1 for a in amounts)
-            if all_similar:
-                recurring.append({
-                    "description": group[0].get("description", ""),
-                    "count": len(group),
-                    "avg_amount": round(avg_amount, 2),
-                    "category": group[0].get("category_name", group[0].get("category", "")),
-                    "type": group[0].get("type", ""),
-                })
-
-    return recurring
+    Stateless; the dashboard reads persisted patterns through
+    ``recurring.patterns`` instead (see services/recurring.py).
+    """
+    return detect_patterns(transactions)
 
 
 def detect_anomalies(transactions: list[dict]) -> list[dict]:
-    """Detect unusual transactions (>2.5x average)."""
-    anomalies = []
-    for tx_type in ["income", "expense"]:
-        txs = [t for t in transactions if t.get("type") == tx_type]
-        if len(txs) < 3:
-            continue
-        amounts = [abs(float(t["amount"])) for t in txs]
-        avg = sum(amounts) / len(amounts)
-        for tx in txs:
-            mult = abs(float(tx["amount"])) / max(avg, 0.01)
-            if mult > 2.5:
-                anomalies.append({
-                    **tx,
-                    "multiplier": round(mult, 1),
-                })
-
-    return sorted(anomalies, key=lambda x: -x.get("multiplier", 0))[:5]
-
-
-def detect_duplicates(transactions: list[dict]) -> list[dict]:
-    """Detect potential duplicate transactions."""
-    seen = {}
-    duplicates = []
-    for tx in transactions:
-        key = f"{tx.get('date')}|{tx.get('amount')}|{tx.get('description', '').lower().strip()}"
-        if key in seen:
-            duplicates.append(tx)
-        else:
-            seen[key] = True
-    return duplicates
+    """Transactions unusual for their type and category, most unusual first.
+
+    Rows carry the ``is_anomaly`` flag stored when they were inserted
+    (see services/anomalies.py). Rows read without the anomaly columns are
+    scored in date order on the fly.
+    """
+    if any(t.get("is_anomaly") is not None for t in transactions):
+        return anomalies.flagged(transactions)
+    return anomalies.flagged(anomalies.detect(transactions))
+
+
+def detect_duplicates(transactions: list[dict], groups: list[dict] | None = None) -> list[dict]:
+    """Detect potential duplicate transactions.
+
+    Every member of a near-duplicate group (see services/duplicates.py)
+    except its first row is reported; pass ``groups`` when already computed.
+    """
+    if groups is None:
+        groups = find_duplicate_groups(transactions)
+    first = {id(g["transactions"][0]) for g in groups}
+    return [
+        tx
+        for g in groups
+        for tx in g["transactions"]
+        if id(tx) not in first
+    ]
 
 
 def _empty_summary() -> dict:
@@ -0,0 +1,297 @@
+"""Anomaly scoring - per-category streaming robust statistics, applied at insert time.
+
+Every (type, category) of a business keeps P² sketches of the 25th, 50th
+and 75th percentiles of ``log(1 + |amount|)``. These are five markers
+each, updated in O(1) per row without keeping the rows. A new row is
+scored against its category before being added. Its robust z-score is
+the distance from the median in units of IQR / 1.349. The row is flagged
+when that score reaches ANOMALY_Z_THRESHOLD and the amount is at least
+ANOMALY_MIN_MULTIPLIER times the category median. The flag and the
+multiplier are stored on the row (``is_anomaly``, ``anomaly_score``), so
+reads filter on flags instead of rescanning history.
+
+Sketches are persisted in ``category_stats``. A business without stored
+sketches is scored once from its existing rows in date order (in a worker
+thread), and only the rows that come out flagged are written back, one
+update per distinct score and chunk of ids. Deletes are not
+subtracted; the sketches describe what the business has seen.
+"""
+
+import asyncio
+import math
+import traceback
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from config import (
+    ANOMALY_MIN_COUNT,
+    ANOMALY_MIN_MULTIPLIER,
+    ANOMALY_Z_THRESHOLD,
+    ANOMALY_MAX_BUSINESSES,
+)
+from db.queries import run, run_all, fetch_transactions
+from services.singleflight import SingleFlight
+from services import data_version
+
+# Robust sigma floor in log space (~10%), so tight categories don't flag noise
+_MIN_SIGMA = 0.1
+
+# Row ids per backfill update (ids travel in the query string)
+_UPDATE_CHUNK = 200
+
+
+class P2Quantile:
+    """Jain & Chlamtac's P² estimator of one quantile in constant memory."""
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        # Raw sorted values until five are seen, then marker heights
+        self.q: list[float] = []
+        self.n = [0, 1, 2, 3, 4]
+        self.np = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        if self.count <= 5:
+            self.q.append(x)
+            self.q.sort()
+            return
+
+        q, n = self.q, self.n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def value(self) -> float | None:
+        if not self.q:
+            return None
+        if self.count <= 5:
+            return self.q[round(self.p * (len(self.q) - 1))]
+        return self.q[2]
+
+    def to_dict(self) -> dict:
+        return {"p": self.p, "count": self.count, "q": self.q, "n": self.n, "np": self.np}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "P2Quantile":
+        est = cls(data["p"])
+        est.count = data["count"]
+        est.q = list(data["q"])
+        est.n = list(data["n"])
+        est.np = list(data["np"])
+        return est
+
+
+class CategoryStats:
+    """Streaming quartiles of log amounts for one (type, category)."""
+
+    def __init__(self, quartiles: tuple[P2Quantile, P2Quantile, P2Quantile] | None = None):
+        self.quartiles = quartiles or (P2Quantile(0.25), P2Quantile(0.5), P2Quantile(0.75))
+
+    @property
+    def count(self) -> int:
+        return self.quartiles[1].count
+
+    def add(self, amount: float) -> None:
+        x = math.log1p(abs(amount))
+        for est in self.quartiles:
+            est.add(x)
+
+    def score(self, amount: float) -> tuple[float | None, bool]:
+        """``(multiplier of the median, flagged)`` for an amount, before adding it."""
+        if self.count < ANOMALY_MIN_COUNT:
+            return None, False
+        low, median, high = (est.value() for est in self.quartiles)
+        sigma = max((high - low) / 1.349, _MIN_SIGMA)
+        z = (math.log1p(abs(amount)) - median) / sigma
+        multiplier = abs(amount) / max(math.expm1(median), 0.01)
+        return round(multiplier, 1), z >= ANOMALY_Z_THRESHOLD and multiplier >= ANOMALY_MIN_MULTIPLIER
+
+    def to_dict(self) -> dict:
+        return {"quartiles": [est.to_dict() for est in self.quartiles]}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CategoryStats":
+        return cls(tuple(P2Quantile.from_dict(d) for d in data["quartiles"]))
+
+
+def category_key(row: dict) -> tuple[str, str]:
+    return (row.get("type") or "", row.get("category_id") or "")
+
+
+class BusinessStats:
+    """All category sketches of one business."""
+
+    def __init__(self, categories: dict[tuple[str, str], CategoryStats] | None = None):
+        self.categories = categories or {}
+
+    def score(self, rows: list[dict]) -> set[tuple[str, str]]:
+        """Score rows in order, setting ``anomaly_score``/``is_anomaly``, then fold them in.
+
+        Returns the category keys whose sketches changed.
+        """
+        changed = set()
+        for row in rows:
+            key = category_key(row)
+            stats = self.categories.setdefault(key, CategoryStats())
+            amount = float(row["amount"])
+            row["anomaly_score"], row["is_anomaly"] = stats.score(amount)
+            stats.add(amount)
+            changed.add(key)
+        return changed
+
+    def preview(self, rows: list[dict]) -> None:
+        """Set ``anomaly_score``/``is_anomaly`` as ``score`` would, leaving the sketches untouched.
+
+        Rows are scored against copies of their categories, so later rows
+        still see earlier ones. Writers preview rows before inserting them
+        and ``fold`` them in once the insert succeeded.
+        """
+        keys = {category_key(row) for row in rows}
+        BusinessStats({
+            key: CategoryStats.from_dict(stats.to_dict())
+            for key, stats in self.categories.items() if key in keys
+        }).score(rows)
+
+    def fold(self, rows: list[dict]) -> set[tuple[str, str]]:
+        """Add stored rows to the sketches; returns the category keys that changed."""
+        changed = set()
+        for row in rows:
+            key = category_key(row)
+            self.categories.setdefault(key, CategoryStats()).add(float(row["amount"]))
+            changed.add(key)
+        return changed
+
+
+def detect(transactions: list[dict]) -> list[dict]:
+    """Copies of the rows scored in date order against fresh sketches (nothing stored)."""
+    scored = [dict(tx) for tx in sorted(transactions, key=lambda t: str(t.get("date")))]
+    BusinessStats().score(scored)
+    return scored
+
+
+def flagged(transactions: list[dict], limit: int = 5) -> list[dict]:
+    """Rows flagged at insert time, most unusual first, with ``multiplier``."""
+    rows = [{**tx, "multiplier": tx.get("anomaly_score") or 0} for tx in transactions if tx.get("is_anomaly")]
+    return sorted(rows, key=lambda x: -x["multiplier"])[:limit]
+
+
+# ---- persistence -----------------------------------------------------------
+
+# business_id -> stats, least recently used first
+_businesses: OrderedDict[str, BusinessStats] = OrderedDict()
+_loads = SingleFlight()
+
+
+async def business_stats(client, business_id: str) -> BusinessStats:
+    """Sketches for a business whose ownership was already checked.
+
+    Loaded from ``category_stats``; a business without stored sketches is
+    scored from its existing rows once (see ``backfill``). Writers
+    ``preview`` rows with the returned object before inserting them, then
+    ``fold`` the stored rows in and ``save`` it.
+    """
+    stats = _businesses.get(business_id)
+    if stats is not None:
+        _businesses.move_to_end(business_id)
+        return stats
+
+    async def load():
+        result = await run(client.table("category_stats").select("*").eq("business_id", business_id))
+        if result.data:
+            stats = BusinessStats({
+                (row["type"], row["category_key"]): CategoryStats.from_dict(row["sketch"])
+                for row in result.data
+            })
+        else:
+            stats = await backfill(client, business_id)
+        _businesses[business_id] = stats
+        while len(_businesses) > ANOMALY_MAX_BUSINESSES:
+            _businesses.popitem(last=False)
+        return stats
+
+    return await _loads.do(business_id, load)
+
+
+async def backfill(client, business_id: str) -> BusinessStats:
+    """Build sketches from existing rows, flag the outliers and store both."""
+    transactions = await fetch_transactions(client, business_id)
+    stats = BusinessStats()
+
+    def score_history():
+        rows = [dict(tx) for tx in sorted(transactions, key=lambda t: str(t.get("date")))]
+        return rows, stats.score(rows)
+
+    # Scoring the whole history is CPU-bound; keep the event loop free
+    rows, changed = await asyncio.to_thread(score_history)
+    outliers = [row for row in rows if row["is_anomaly"]]
+    # Scores are rounded to 0.1, so outliers share few distinct values
+    ids_by_score = defaultdict(list)
+    for row in outliers:
+        ids_by_score[row["anomaly_score"]].append(row["id"])
+    try:
+        await run_all(*(
+            client.table("transactions")
+            .update({"is_anomaly": True, "anomaly_score": score})
+            .in_("id", ids[i:i + _UPDATE_CHUNK])
+            for score, ids in ids_by_score.items()
+            for i in range(0, len(ids), _UPDATE_CHUNK)
+        ))
+    except Exception:
+        traceback.print_exc()
+    if outliers:
+        # Rows read before the flags were written are out of date
+        data_version.bump(business_id)
+    await save(client, business_id, stats, changed)
+    return stats
+
+
+async def save(client, business_id: str, stats: BusinessStats, keys: set[tuple[str, str]]) -> None:
+    """Upsert the sketches for ``keys`` (as returned by ``BusinessStats.fold``)."""
+    if not keys:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    records = [
+        {
+            "business_id": business_id,
+            "type": key[0],
+            "category_key": key[1],
+            "count": stats.categories[key].count,
+            "sketch": stats.categories[key].to_dict(),
+            "updated_at": now,
+        }
+        for key in keys
+    ]
+    try:
+        await run(
+            client.table("category_stats").upsert(records, on_conflict="business_id,type,category_key")
+        )
+    except Exception:
+        # Sketches stay in memory; the stored ones lag until their next write
+        print(f"[WARN] Could not store category stats for {business_id}")
+        traceback.print_exc()
+
@@ -0,0 +1,195 @@
+"""Chat sessions - server-side conversation state for /api/chat.
+
+A session belongs to one user and one business. It holds:
+
+- the ``financial_context`` the model answers from, tagged with the
+  business's data version, so follow-up questions skip the ownership
+  check and the summary/health computation until a write lands;
+- the recent turns, verbatim;
+- a running summary of the older turns.
+
+History is measured in estimated tokens (about four characters per
+token). When the turns exceed CHAT_HISTORY_TOKEN_BUDGET, the oldest ones
+are folded into the summary until the rest fit in half the budget. The
+summary itself is capped at CHAT_SUMMARY_MAX_TOKENS. A prompt therefore
+stays bounded however long the conversation runs. Compaction runs in the
+background after a reply, and the next turn waits for it.
+
+Sessions live in this process, least recently used first, and expire
+after CHAT_SESSION_TTL_SECONDS of inactivity. A client whose session is
+gone starts a new one from the newest turns of the history it still has.
+"""
+
+import asyncio
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from config import (
+    CHAT_SESSION_MAX_ENTRIES,
+    CHAT_SESSION_TTL_SECONDS,
+    CHAT_HISTORY_TOKEN_BUDGET,
+    CHAT_SUMMARY_MAX_TOKENS,
+)
+from services import data_version
+
+# Per-message overhead of the chat format, in tokens
+_MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (English averages about four characters per token)."""
+    return len(text or "") // 4 + _MESSAGE_OVERHEAD
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """The end of ``text`` that fits ``max_tokens`` (the newest part of a summary)."""
+    limit = max(0, (max_tokens - _MESSAGE_OVERHEAD) * 4)
+    return text if len(text) <= limit else "…" + text[len(text) - limit:]
+
+
+class ChatSession:
+    """One conversation about one business."""
+
+    def __init__(self, user_id: str, business_id: str, history: list[dict] | None = None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.business_id = business_id
+        self.turns: list[dict] = [
+            {"role": "ai" if m.get("role") == "ai" else "user", "text": str(m.get("text", ""))}
+            for m in (history or []) if m.get("text")
+        ]
+        self.summary = ""
+        self.last_used = time.monotonic()
+        self._context: dict | None = None
+        self._context_version: str | None = None
+        self._compaction: asyncio.Task | None = None
+        self._stats = {"context_hits": 0, "context_builds": 0, "compactions": 0}
+        # Client-supplied history only keeps what fits after compaction
+        del self.turns[:self._split()]
+
+    async def context(self, build: Callable[[], Awaitable[dict]]) -> dict:
+        """The financial context for the current data version, built (and access-checked) on change."""
+        version = data_version.current(self.business_id)
+        if self._context is not None and self._context_version == version:
+            self._stats["context_hits"] += 1
+            return self._context
+        self._stats["context_builds"] += 1
+        self._context = await build()
+        self._context_version = version
+        return self._context
+
+    async def prompt_history(self) -> tuple[list[dict], str]:
+        """``(turns, summary)`` to send with the next message."""
+        if self._compaction is not None:
+            await asyncio.shield(self._compaction)
+        return list(self.turns), self.summary
+
+    def record(self, message: str, reply: str, summarize) -> None:
+        """Append a finished exchange and compact in the background if over budget.
+
+        ``summarize(summary, turns, max_tokens)`` is an async callable
+        returning the new running summary.
+        """
+        self.turns.append({"role": "user", "text": message})
+        self.turns.append({"role": "ai", "text": reply})
+        self.last_used = time.monotonic()
+        if sum(estimate_tokens(t["text"]) for t in self.turns) > CHAT_HISTORY_TOKEN_BUDGET:
+            if self._compaction is None or self._compaction.done():
+                self._compaction = asyncio.create_task(self._compact(summarize))
+
+    def _split(self) -> int:
+        """Index of the first turn kept verbatim: the newest turns within half the budget."""
+        kept, start = 0, len(self.turns)
+        while start > 0:
+            cost = estimate_tokens(self.turns[start - 1]["text"])
+            # Always keep the last exchange, even if it alone is over
+            if kept + cost > CHAT_HISTORY_TOKEN_BUDGET // 2 and len(self.turns) - start >= 2:
+                break
+            kept += cost
+            start -= 1
+        return start
+
+    async def _compact(self, summarize) -> None:
+        start = self._split()
+        if start == 0:
+            return
+        older = self.turns[:start]
+        try:
+            summary = await summarize(self.summary, older, CHAT_SUMMARY_MAX_TOKENS)
+        except Exception:
+            traceback.print_exc()
+            summary = fallback_summary(self.summary, older)
+        self.summary = clip_tokens(summary, CHAT_SUMMARY_MAX_TOKENS)
+        # Turns recorded while summarizing sit after ``older``; keep them
+        del self.turns[:start]
+        self._stats["compactions"] += 1
+
+    def describe(self) -> dict:
+        return {
+            "session_id": self.id,
+            "turns": len(self.turns),
+            "history_tokens": sum(estimate_tokens(t["text"]) for t in self.turns),
+            "summary_tokens": estimate_tokens(self.summary) if self.summary else 0,
+            **self._stats,
+        }
+
+
+def fallback_summary(summary: str, turns: list[dict]) -> str:
+    """Extractive summary used when the model can't summarize: the start of each turn."""
+    lines = [summary] if summary else []
+    for turn in turns:
+        who = "Assistant" if turn["role"] == "ai" else "User"
+        text = " ".join(turn["text"].split())
+        lines.append(f"{who}: {text[:160]}{'…' if len(text) > 160 else ''}")
+    return "\n".join(lines)
+
+
+# session id -> session, least recently used first
+_sessions: OrderedDict[str, ChatSession] = OrderedDict()
+_stats = {"created": 0, "resumed": 0, "expired": 0}
+
+
+def get_or_create(session_id: str | None, user_id: str, business_id: str, history: list[dict] | None) -> ChatSession:
+    """The user's session for the business, or a new one seeded with ``history``."""
+    now = time.monotonic()
+    session = _sessions.get(session_id) if session_id else None
+    if session is not None and now - session.last_used > CHAT_SESSION_TTL_SECONDS:
+        _stats["expired"] += 1
+        del _sessions[session_id]
+        session = None
+    if session is not None and session.user_id == user_id and session.business_id == business_id:
+        _stats["resumed"] += 1
+        session.last_used = now
+        _sessions.move_to_end(session_id)
+        return session
+
+    _stats["created"] += 1
+    session = ChatSession(user_id, business_id, history)
+    _sessions[session.id] = session
+    while len(_sessions) > CHAT_SESSION_MAX_ENTRIES:
+        _sessions.popitem(last=False)
+    return session
+
+
+def lookup(session_id: str, user_id: str) -> ChatSession | None:
+    """One of the user's live sessions, without touching its recency."""
+    session = _sessions.get(session_id)
+    if session is None or session.user_id != user_id:
+        return None
+    if time.monotonic() - session.last_used > CHAT_SESSION_TTL_SECONDS:
+        return None
+    return session
+
+
+def end(session_id: str, user_id: str) -> bool:
+    """Drop one of the user's sessions; returns whether it existed."""
+    if lookup(session_id, user_id) is None:
+        return False
+    del _sessions[session_id]
+    return True
+
+
+def stats() -> dict:
+    return {**_stats, "entries": len(_sessions)}
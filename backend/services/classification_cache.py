@@ -0,0 +1,166 @@
+"""Classification cache - remembers LLM transaction classifications.
+
+Bank exports repeat the same descriptions month after month, so results
+are cached under (normalized description, amount sign, LLM model) in two
+tiers: an in-process LRU and an on-disk SQLite table with a TTL and a
+row cap. Hits skip the LLM entirely.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import (
+    LLM_MODEL,
+    CLASSIFY_CACHE_PATH,
+    CLASSIFY_CACHE_MEMORY_SIZE,
+    CLASSIFY_CACHE_MAX_ROWS,
+    CLASSIFY_CACHE_TTL_DAYS,
+)
+
+_memory: OrderedDict[str, dict] = OrderedDict()
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def normalize_description(description: str) -> str:
+    """Lowercase and collapse whitespace so trivially different exports share a key."""
+    return re.sub(r"\s+", " ", str(description or "").lower()).strip(" \t\"'.,;:-")
+
+
+def cache_key(description: str, amount: float) -> str:
+    sign = "-" if float(amount) < 0 else "+"
+    raw = f"{LLM_MODEL}|{sign}|{normalize_description(description)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        directory = os.path.dirname(CLASSIFY_CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _conn = sqlite3.connect(CLASSIFY_CACHE_PATH, check_same_thread=False)
+        _conn.execute(
+            """create table if not exists classifications (
+                key text primary key,
+                value text not null,
+                created_at real not null,
+                last_used real not null
+            )"""
+        )
+        _conn.execute("create index if not exists idx_classifications_last_used on classifications(last_used)")
+        _conn.commit()
+    return _conn
+
+
+def _remember(key: str, value: dict) -> None:
+    _memory[key] = value
+    _memory.move_to_end(key)
+    while len(_memory) > CLASSIFY_CACHE_MEMORY_SIZE:
+        _memory.popitem(last=False)
+
+
+def get_many(transactions: list[dict]) -> list[dict | None]:
+    """Look up each transaction; returns the cached classification or None."""
+    keys = [cache_key(tx["description"], tx["amount"]) for tx in transactions]
+    found: dict[str, dict] = {}
+    with _lock:
+        for key in keys:
+            if key in _memory:
+                _memory.move_to_end(key)
+                found[key] = _memory[key]
+
+        missing = {k for k in keys if k not in found}
+        if missing:
+            now = time.time()
+            expired_before = now - CLASSIFY_CACHE_TTL_DAYS * 86400
+            conn = _db()
+            pending = list(missing)
+            for i in range(0, len(pending), 500):
+                chunk = pending[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"select key, value from classifications "
+                    f"where key in ({placeholders}) and created_at >= ?",
+                    (*chunk, expired_before),
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+                    _remember(key, found[key])
+                if rows:
+                    conn.executemany(
+                        "update classifications set last_used = ? where key = ?",
+                        [(now, key) for key, _ in rows],
+                    )
+            conn.commit()
+
+        results = []
+        for key in keys:
+            if key in found:
+                _stats["memory_hits" if key not in missing else "disk_hits"] += 1
+                results.append(dict(found[key]))
+            else:
+                _stats["misses"] += 1
+                results.append(None)
+    return results
+
+
+def put_many(transactions: list[dict], classifications: list[dict]) -> None:
+    """Store fresh LLM classifications in both tiers."""
+    if not transactions:
+        return
+    now = time.time()
+    rows = {}
+    for tx, cls in zip(transactions, classifications):
+        rows[cache_key(tx["description"], tx["amount"])] = cls
+
+    with _lock:
+        for key, cls in rows.items():
+            _remember(key, cls)
+        conn = _db()
+        conn.executemany(
+            "insert or replace into classifications (key, value, created_at, last_used) values (?, ?, ?, ?)",
+            [(key, json.dumps(cls), now, now) for key, cls in rows.items()],
+        )
+        _stats["stores"] += len(rows)
+        _evict(conn, now)
+        conn.commit()
+
+
+def _evict(conn: sqlite3.Connection, now: float) -> None:
+    """Drop expired rows, then the least recently used rows above the cap."""
+    expired = conn.execute(
+        "delete from classifications where created_at < ?",
+        (now - CLASSIFY_CACHE_TTL_DAYS * 86400,),
+    ).rowcount
+    (count,) = conn.execute("select count(*) from classifications").fetchone()
+    overflow = count - CLASSIFY_CACHE_MAX_ROWS
+    if overflow > 0:
+        conn.execute(
+            "delete from classifications where key in "
+            "(select key from classifications order by last_used asc limit ?)",
+            (overflow,),
+        )
+    _stats["evictions"] += max(expired, 0) + max(overflow, 0)
+
+
+def stats() -> dict:
+    """Hit/miss counters since process start, plus current tier sizes."""
+    with _lock:
+        hits = _stats["memory_hits"] + _stats["disk_hits"]
+        lookups = hits + _stats["misses"]
+        (disk_size,) = _db().execute("select count(*) from classifications").fetchone()
+        return {
+            **_stats,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_size": len(_memory),
+            "disk_size": disk_size,
+            "model": LLM_MODEL,
+        }
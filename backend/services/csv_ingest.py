@@ -0,0 +1,167 @@
+"""CSV ingestion - parses bank statement exports into transaction dicts.
+
+``parse_csv_content`` handles text that is already in memory. For uploads,
+``iter_upload_text`` reads the file in fixed-size byte chunks and decodes
+them incrementally (multi-byte characters may straddle chunk boundaries),
+and ``iter_csv_windows`` turns that text into windows of at most
+CSV_WINDOW_SIZE parsed rows, so memory use depends on the window size
+rather than the file size.
+"""
+
+import codecs
+import csv
+import io
+import re
+from datetime import datetime
+from typing import AsyncIterator, Iterable
+from config import CSV_CHUNK_SIZE, CSV_WINDOW_SIZE
+
+
+def normalize_date(date_str: str) -> str:
+    """Normalize various date formats to YYYY-MM-DD."""
+    date_str = date_str.strip().strip('"').strip("'")
+
+    # YYYY-MM-DD
+    if re.match(r"^\d{4}-\d{2}-\d{2}", date_str):
+        return date_str[:10]
+
+    # DD/MM/YYYY
+    if re.match(r"^\d{2}/\d{2}/\d{4}", date_str):
+        parts = date_str.split("/")
+        return f"{parts[2]}-{parts[1]}-{parts[0]}"
+
+    # DD-MM-YYYY
+    if re.match(r"^\d{2}-\d{2}-\d{4}", date_str):
+        parts = date_str.split("-")
+        return f"{parts[2]}-{parts[1]}-{parts[0]}"
+
+    # Try Python date parsing as fallback
+    try:
+        d = datetime.strptime(date_str, "%Y-%m-%d")
+        return d.strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+
+    try:
+        d = datetime.strptime(date_str, "%m/%d/%Y")
+        return d.strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+
+    return date_str
+
+
+def normalize_row(row: dict) -> dict | None:
+    """Map one CSV row onto date/description/amount/payment_method, or None if incomplete."""
+    # Find columns by common names
+    normalized = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        k = key.strip().lower().replace('"', '').replace("'", "")
+        if k in ("date", "transaction date", "tx date"):
+            normalized["date"] = value.strip().replace('"', '').replace("'", "")
+        elif k in ("description", "desc", "narration", "details", "particulars"):
+            normalized["description"] = value.strip().replace('"', '').replace("'", "")
+        elif k in ("amount", "amt", "value", "debit/credit"):
+            try:
+                normalized["amount"] = float(value.strip().replace('"', '').replace("'", "").replace(",", ""))
+            except ValueError:
+                continue
+        elif k in ("payment method", "method", "mode", "paymentmethod", "payment_method"):
+            normalized["payment_method"] = value.strip()
+
+    if "date" in normalized and "description" in normalized and "amount" in normalized:
+        normalized["date"] = normalize_date(normalized["date"])
+        return normalized
+    return None
+
+
+def parse_csv_content(content: str) -> list[dict]:
+    """Parse CSV text into transaction dicts."""
+    reader = csv.DictReader(io.StringIO(content.strip()))
+    transactions = []
+    for row in reader:
+        normalized = normalize_row(row)
+        if normalized is not None:
+            transactions.append(normalized)
+    return transactions
+
+
+async def iter_upload_text(file, chunk_size: int = CSV_CHUNK_SIZE) -> AsyncIterator[str]:
+    """Read an ``UploadFile`` chunk by chunk and decode it as UTF-8 (BOM tolerated)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def iter_text(text: str) -> AsyncIterator[str]:
+    """Adapter so in-memory CSV text can go through ``iter_csv_windows``."""
+    if text:
+        yield text
+
+
+async def iter_csv_windows(
+    chunks: AsyncIterator[str],
+    window_size: int = CSV_WINDOW_SIZE,
+) -> AsyncIterator[list[dict]]:
+    """Parse decoded text chunks into windows of normalized transaction rows.
+
+    Lines are buffered until their double quotes balance, so quoted fields
+    containing newlines are parsed as one record. Only the current partial
+    line, record and window are held in memory.
+    """
+    header: list[str] | None = None
+    partial = ""
+    record: list[str] = []
+    quotes = 0
+    window: list[dict] = []
+
+    def emit(text: str) -> None:
+        nonlocal header
+        fields = next(csv.reader([text]), [])
+        if not any(f.strip() for f in fields):
+            return
+        if header is None:
+            header = fields
+            return
+        normalized = normalize_row(dict(zip(header, fields)))
+        if normalized is not None:
+            window.append(normalized)
+
+    def feed(lines: Iterable[str]) -> None:
+        nonlocal record, quotes
+        for line in lines:
+            record.append(line)
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                emit("\n".join(record))
+                record = []
+                quotes = 0
+
+    async for text in chunks:
+        lines = (partial + text).split("\n")
+        partial = lines.pop()
+        feed(lines)
+        while len(window) >= window_size:
+            yield window[:window_size]
+            del window[:window_size]
+
+    # Last line without a trailing newline, then any record left open by an
+    # unbalanced quote (the csv module makes what it can of it)
+    if partial:
+        feed([partial])
+    if record:
+        emit("\n".join(record))
+
+    while window:
+        yield window[:window_size]
+        del window[:window_size]
@@ -0,0 +1,30 @@
+"""Data versions - a per-business counter that advances on every write.
+
+Every write path that changes what the analytics endpoints return
+(transaction inserts/deletes, imports, insight rewrites) bumps the
+business's counter. Versions are prefixed with a per-process epoch so a
+restarted worker never hands out a version (and ETag) that an earlier
+process already used for different data.
+"""
+
+import uuid
+
+_EPOCH = uuid.uuid4().hex[:8]
+# business_id -> number of writes seen by this process
+_counters: dict[str, int] = {}
+
+
+def counter(business_id: str) -> int:
+    """Number of writes seen for the business."""
+    return _counters.get(business_id, 0)
+
+
+def bump(business_id: str) -> int:
+    """Record a write; returns the new counter."""
+    _counters[business_id] = counter(business_id) + 1
+    return _counters[business_id]
+
+
+def current(business_id: str) -> str:
+    """Opaque version string for the business's current data."""
+    return f"{_EPOCH}.{counter(business_id)}"
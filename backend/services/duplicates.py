@@ -0,0 +1,183 @@
+"""Duplicate detection - near-duplicate transaction groups via blocking and trigram similarity.
+
+Re-imported bank rows rarely match exactly: the date may shift by a day
+and references get extra digits. Candidates are therefore blocked by
+type, exact amount and the first word of the normalized description.
+Within a block, rows sharing a day and normalized text are exact
+duplicates and are linked without comparing them. The remaining rows
+are sorted by date, and each is compared only with rows from the
+previous DUPLICATE_DATE_WINDOW_DAYS, nearest first and at most
+DUPLICATE_MAX_COMPARISONS of them. The work is therefore a sort plus
+O(n) comparisons even when one price point repeats thousands of times.
+Descriptions are compared by Jaccard similarity of character trigrams
+after reference numbers are collapsed. Pairs scoring at least
+DUPLICATE_SIMILARITY are merged into groups with union-find. A group
+spanning more than the window is a recurring charge rather than a
+re-import, so only its same-day rows are kept.
+"""
+
+import re
+from collections import defaultdict
+from datetime import date
+from config import DUPLICATE_DATE_WINDOW_DAYS, DUPLICATE_SIMILARITY, DUPLICATE_MAX_COMPARISONS
+
+# Long digit runs are references/card numbers; short ones may be part of a name
+_DIGITS = re.compile(r"\d{4,}")
+_NON_WORD = re.compile(r"[^a-z0-9#]+")
+
+
+def normalize_description(text: str) -> str:
+    """Lowercase, collapse long digit runs to ``#`` and punctuation to single spaces."""
+    text = _DIGITS.sub("#", (text or "").lower())
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def trigrams(text: str) -> frozenset[str]:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two trigram sets."""
+    if not a and not b:
+        return 1.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def _day(value) -> int | None:
+    try:
+        return date.fromisoformat(str(value)).toordinal()
+    except ValueError:
+        return None
+
+
+def find_duplicate_groups(
+    transactions: list[dict],
+    date_window: int = DUPLICATE_DATE_WINDOW_DAYS,
+    threshold: float = DUPLICATE_SIMILARITY,
+    max_comparisons: int = DUPLICATE_MAX_COMPARISONS,
+) -> list[dict]:
+    """Cluster near-duplicate transactions.
+
+    Returns groups, largest and most similar first, as dicts with
+    ``transactions`` (input order), ``score`` (mean similarity of the
+    matched pairs), ``exact`` (every member has the same date and
+    normalized description), ``amount``, ``day_span`` and ``size``.
+    """
+    texts: dict[int, str] = {}
+    day_of: dict[int, int] = {}
+    blocks: dict[tuple, list[tuple[int, str, int]]] = defaultdict(list)
+    for i, tx in enumerate(transactions):
+        day = _day(tx.get("date"))
+        try:
+            amount = round(float(tx["amount"]), 2)
+        except (KeyError, TypeError, ValueError):
+            continue
+        if day is None:
+            continue
+        day_of[i] = day
+        texts[i] = normalize_description(tx.get("description", ""))
+        # Re-imports keep the merchant's leading word; blocking on it keeps
+        # busy price points (a 4.50 coffee) from forming one huge block
+        first = texts[i].split(" ", 1)[0]
+        blocks[(tx.get("type"), amount, first)].append((day, texts[i], i))
+
+    grams: dict[str, frozenset] = {}
+    # Busy merchants repeat the same few descriptions; score each text pair once
+    scores: dict[tuple[str, str], float] = {}
+
+    def pair_score(a: int, b: int) -> float:
+        ta, tb = texts[a], texts[b]
+        if ta == tb:
+            return 1.0
+        key = (ta, tb) if ta < tb else (tb, ta)
+        score = scores.get(key)
+        if score is None:
+            for text in key:
+                if text not in grams:
+                    grams[text] = trigrams(text)
+            score = scores[key] = similarity(grams[ta], grams[tb])
+        return score
+
+    parent: dict[int, int] = {}
+
+    def find(i: int) -> int:
+        root = i
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while parent.get(i, i) != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(a: int, b: int) -> None:
+        ra, rb = find(a), find(b)
+        parent.setdefault(ra, ra)
+        parent.setdefault(rb, rb)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+
+    edges: list[tuple[int, int, float]] = []
+    for rows in blocks.values():
+        if len(rows) < 2:
+            continue
+        rows.sort()
+        # Rows sharing a day and normalized text are exact duplicates of
+        # the first such row; only these representatives are compared
+        reps: list[tuple[int, int]] = []
+        for k, (day, text, i) in enumerate(rows):
+            if k and rows[k - 1][:2] == (day, text):
+                edges.append((reps[-1][1], i, 1.0))
+                union(reps[-1][1], i)
+            else:
+                reps.append((day, i))
+
+        start = 0
+        for j, (day, b) in enumerate(reps):
+            while reps[start][0] < day - date_window:
+                start += 1
+            # Nearest rows first, at most DUPLICATE_MAX_COMPARISONS of them
+            for _, a in reps[max(start, j - max_comparisons):j][::-1]:
+                score = pair_score(a, b)
+                if score >= threshold:
+                    edges.append((a, b, score))
+                    union(a, b)
+
+    members: dict[int, list[int]] = defaultdict(list)
+    for i in parent:
+        members[find(i)].append(i)
+    group_edges: dict[int, list[tuple[int, int, float]]] = defaultdict(list)
+    for edge in edges:
+        group_edges[find(edge[0])].append(edge)
+
+    groups = []
+    for root, idx in members.items():
+        days = {i: day_of[i] for i in idx}
+        if max(days.values()) - min(days.values()) <= date_window:
+            groups.append(_group(transactions, idx, days, group_edges[root], texts))
+            continue
+        # A chain longer than the window is a recurring charge, not a
+        # re-import; only rows sharing a day are kept as duplicates
+        by_day: dict[int, list[tuple[int, int, float]]] = defaultdict(list)
+        for edge in group_edges[root]:
+            if days[edge[0]] == days[edge[1]]:
+                by_day[days[edge[0]]].append(edge)
+        for sub_edges in by_day.values():
+            linked = {i for e in sub_edges for i in e[:2]}
+            groups.append(_group(transactions, list(linked), days, sub_edges, texts))
+
+    groups.sort(key=lambda g: (-g["size"], -g["score"], g["day_span"]))
+    return groups
+
+
+def _group(transactions: list[dict], idx: list[int], days: dict, edges: list, texts: dict) -> dict:
+    idx = sorted(idx)
+    spans = [days[i] for i in idx]
+    return {
+        "transactions": [transactions[i] for i in idx],
+        "score": round(sum(e[2] for e in edges) / len(edges), 3),
+        "exact": len(set(spans)) == 1 and len({texts[i] for i in idx}) == 1,
+        "amount": float(transactions[idx[0]]["amount"]),
+        "day_span": max(spans) - min(spans),
+        "size": len(idx),
+    }
@@ -0,0 +1,236 @@
+"""Import jobs - CSV imports run by an in-process worker pool.
+
+The import endpoints spool the CSV to disk, enqueue an ``ImportJob`` and
+return its id straight away. IMPORT_WORKERS worker tasks take jobs off the
+queue and stream them through ``importer.import_windows``, so the work no
+longer depends on the HTTP connection staying open. Jobs are kept in
+memory (the most recent IMPORT_JOB_HISTORY finished ones) for polling and
+do not survive a restart.
+
+A job that fails part-way keeps its spool file and can be resumed: rows
+before its checkpoint are skipped and its row ids are derived from the job
+id, so re-sent rows are ignored by the database.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from config import CSV_CHUNK_SIZE, IMPORT_JOB_HISTORY, IMPORT_SPOOL_DIR, IMPORT_WORKERS
+from db.corrections import correction_matcher
+from services.csv_ingest import iter_csv_windows, iter_upload_text
+from services.importer import import_windows, new_progress, rewind, row_id
+from services.pattern_matcher import PatternMatcher
+
+_jobs: OrderedDict[str, "ImportJob"] = OrderedDict()
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+
+
+class ImportJob:
+    """One queued CSV import and its live progress counters."""
+
+    def __init__(self, user_id: str, business_id: str, client, path: str, source: str):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.business_id = business_id
+        self.client = client
+        self.path = path
+        self.source = source
+        self.status = "queued"
+        self.progress = new_progress()
+        self.errors: list[str] = []
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    @property
+    def resumable(self) -> bool:
+        return self.status == "failed" and self.path is not None
+
+    def ids(self, offset: int = 0, limit: int = 1000) -> list[str]:
+        """Ids of committed rows, in file order."""
+        end = min(offset + limit, self.progress["checkpoint"])
+        return [row_id(self.id, row) for row in range(offset, end)]
+
+    def to_dict(self) -> dict:
+        now = time.time()
+        started = self.started_at or now
+        return {
+            "job_id": self.id,
+            "business_id": self.business_id,
+            "source": self.source,
+            "status": self.status,
+            "parsed": self.progress["parsed"],
+            "classified": self.progress["classified"],
+            "inserted": self.progress["inserted"],
+            "count": self.progress["inserted"],
+            "checkpoint": self.progress["checkpoint"],
+            "classification": self.progress["classification"],
+            "errors": list(self.errors),
+            "resumable": self.resumable,
+            "queued_seconds": round(started - self.created_at, 3),
+            "elapsed_seconds": round((self.finished_at or now) - started, 3) if self.started_at else 0.0,
+        }
+
+
+class _SpooledReader:
+    """Async ``read(n)`` over a spooled file, so it can feed ``iter_upload_text``."""
+
+    def __init__(self, fh):
+        self._fh = fh
+
+    async def read(self, size: int) -> bytes:
+        return await asyncio.to_thread(self._fh.read, size)
+
+
+def _spool_file() -> tuple[int, str]:
+    os.makedirs(IMPORT_SPOOL_DIR, exist_ok=True)
+    return tempfile.mkstemp(prefix="import-", suffix=".csv", dir=IMPORT_SPOOL_DIR)
+
+
+async def spool_upload(file) -> str:
+    """Copy an ``UploadFile`` to a spool file chunk by chunk; returns its path."""
+    fd, path = _spool_file()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(CSV_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await asyncio.to_thread(out.write, chunk)
+    except Exception:
+        _remove(path)
+        raise
+    return path
+
+
+async def spool_text(text: str) -> str:
+    """Write CSV text to a spool file; returns its path."""
+    fd, path = _spool_file()
+    try:
+        with os.fdopen(fd, "wb") as out:
+            await asyncio.to_thread(out.write, text.encode("utf-8"))
+    except Exception:
+        _remove(path)
+        raise
+    return path
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def start() -> None:
+    """Start the worker pool (idempotent; also called lazily by ``submit``)."""
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    _workers[:] = [w for w in _workers if not w.done()]
+    while len(_workers) < IMPORT_WORKERS:
+        _workers.append(asyncio.create_task(_worker()))
+
+
+async def stop() -> None:
+    """Cancel the workers (called on application shutdown)."""
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+
+def submit(user_id: str, business_id: str, client, path: str, source: str) -> ImportJob:
+    """Queue an import of the spooled CSV at ``path``."""
+    start()
+    job = ImportJob(user_id, business_id, client, path, source)
+    _jobs[job.id] = job
+    _trim()
+    _queue.put_nowait(job)
+    return job
+
+
+def resume(job: ImportJob, client) -> ImportJob:
+    """Re-queue a failed job from its checkpoint with a fresh client."""
+    start()
+    rewind(job.progress)
+    job.client = client
+    job.status = "queued"
+    job.started_at = None
+    job.finished_at = None
+    job.created_at = time.time()
+    _queue.put_nowait(job)
+    return job
+
+
+def get(job_id: str, user_id: str) -> ImportJob | None:
+    """The job, if it exists and was submitted by the user."""
+    job = _jobs.get(job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+
+def _trim() -> None:
+    """Forget the oldest finished jobs beyond IMPORT_JOB_HISTORY."""
+    finished = [job_id for job_id, job in _jobs.items() if job.done]
+    for job_id in finished[:max(len(finished) - IMPORT_JOB_HISTORY, 0)]:
+        job = _jobs.pop(job_id)
+        if job.path:
+            _remove(job.path)
+
+
+async def _worker() -> None:
+    while True:
+        job = await _queue.get()
+        try:
+            await _run(job)
+        finally:
+            _queue.task_done()
+
+
+async def _run(job: ImportJob) -> None:
+    job.status = "running"
+    job.started_at = time.time()
+    keep_spool = False
+    try:
+        # Load user corrections (gracefully handle if table doesn't exist)
+        try:
+            matcher = await correction_matcher(job.client, job.business_id)
+        except Exception as corr_err:
+            print(f"[WARN] Could not load user_corrections: {corr_err}")
+            matcher = PatternMatcher([])
+
+        with open(job.path, "rb") as fh:
+            windows = iter_csv_windows(iter_upload_text(_SpooledReader(fh)))
+            await import_windows(job.client, job.business_id, job.id, windows, matcher, job.progress)
+
+        if job.progress["parsed"] or job.progress["checkpoint"]:
+            job.status = "succeeded"
+        else:
+            job.errors.append("No valid transactions found in CSV")
+            job.status = "failed"
+    except asyncio.CancelledError:
+        job.errors.append("Import cancelled by server shutdown")
+        job.status = "failed"
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        job.errors.append(f"CSV processing failed after row {job.progress['checkpoint']}: {e}")
+        job.status = "failed"
+        keep_spool = True
+    finally:
+        job.finished_at = time.time()
+        job.client = None
+        if not keep_spool:
+            _remove(job.path)
+            job.path = None
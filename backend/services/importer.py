@@ -0,0 +1,247 @@
+"""CSV import pipeline - classifies, resolves and inserts parsed rows window by window.
+
+Each window from ``csv_ingest.iter_csv_windows`` goes through user
+corrections, concurrent LLM classification, bulk category/entity
+resolution and chunked inserts before the next window is read, so only
+one window of rows is alive at a time. The ``CatalogResolver`` is loaded
+once per import and keeps growing as new names are created.
+
+Every row gets an id derived from the import's id seed and its position
+in the file, and chunks are written with ``on conflict do nothing`` and
+``return=minimal``. Re-sending a chunk is therefore harmless, which is what
+lets a failed import resume from its last checkpoint (the first row of the
+first window that was not fully committed).
+"""
+
+import uuid
+from typing import AsyncIterator
+from postgrest.types import ReturnMethod
+from config import IMPORT_INSERT_CHUNK_SIZE
+from db.queries import run
+from db.resolver import CatalogResolver
+from services import aggregate_store, anomalies, recurring
+from services.ai_service import classify_transactions_concurrent
+from services.pattern_matcher import PatternMatcher
+
+_ROW_ID_NAMESPACE = uuid.UUID("0d8f3c1e-6a52-4f0b-9a57-3c1f7e2b8d40")
+
+
+def row_id(id_seed: str, row: int) -> str:
+    """Stable transaction id for the ``row``-th parsed row of an import."""
+    return str(uuid.uuid5(_ROW_ID_NAMESPACE, f"{id_seed}:{row}"))
+
+
+def split_corrections(raw_txs: list[dict], matcher: PatternMatcher) -> tuple[list[dict], list[dict]]:
+    """Split parsed rows into those needing AI and those matched by a user correction."""
+    needs_ai = []
+    corrected = []
+    for tx in raw_txs:
+        matched = matcher.match(tx["description"])
+        if matched:
+            corrected.append({**tx, "_correction": matched})
+        else:
+            needs_ai.append(tx)
+    return needs_ai, corrected
+
+
+async def build_records(
+    resolver: CatalogResolver,
+    id_seed: str,
+    needs_ai: list[dict],
+    ai_results: list[dict],
+    corrected: list[dict],
+) -> tuple[list[dict], dict[str, str], dict[str, str]]:
+    """Turn classified and corrected CSV rows into ``transactions`` records.
+
+    All category/entity names are resolved through the import's
+    ``CatalogResolver`` (a handful of queries per window instead of several
+    per row). Rows carry their file position as ``_row``, which becomes the
+    record id. Also returns the id -> name maps the aggregate store needs.
+    """
+    business_id = resolver.business_id
+
+    ai_rows = []
+    wanted_categories: dict[str, str] = {}
+    wanted_entities: dict[str, str] = {}
+    for i, tx in enumerate(needs_ai):
+        cls = ai_results[i] if i < len(ai_results) else {}
+        tx_type = "expense" if tx["amount"] < 0 else "income"
+        default_entity_type = "supplier" if tx_type == "expense" else "customer"
+
+        category_name = cls.get("category", "Miscellaneous" if tx_type == "expense" else "Other Income")
+        entity_name = cls.get("entity_name", "")
+        entity_type = cls.get("entity_type") or default_entity_type
+        if entity_type not in ("customer", "supplier"):
+            entity_type = default_entity_type
+
+        if category_name:
+            wanted_categories.setdefault(category_name, tx_type)
+        if entity_name:
+            wanted_entities.setdefault(entity_name, entity_type)
+        ai_rows.append((tx, tx_type, category_name, entity_name))
+
+    corrected_rows = []
+    for tx_data in corrected:
+        correction = tx_data.pop("_correction")
+        tx_type = "expense" if tx_data["amount"] < 0 else "income"
+        entity_name = correction.get("entity_name", "")
+        if entity_name:
+            wanted_entities.setdefault(entity_name, "supplier" if tx_type == "expense" else "customer")
+        corrected_rows.append((tx_data, tx_type, correction, entity_name))
+
+    await resolver.ensure(wanted_categories, wanted_entities)
+
+    inserted = []
+    category_names: dict[str, str] = {}
+    entity_names: dict[str, str] = {}
+
+    # Process AI-classified transactions
+    for tx, tx_type, category_name, entity_name in ai_rows:
+        category_id = resolver.category_id(category_name)
+        entity_id = resolver.entity_id(entity_name)
+        if category_id:
+            category_names[category_id] = category_name
+        if entity_id:
+            entity_names[entity_id] = entity_name
+
+        inserted.append({
+            "id": row_id(id_seed, tx["_row"]),
+            "business_id": business_id,
+            "date": tx["date"],
+            "description": tx["description"],
+            "amount": tx["amount"],
+            "type": tx_type,
+            "category_id": category_id,
+            "entity_id": entity_id,
+        })
+
+    # Process corrected transactions
+    for tx_data, tx_type, correction, entity_name in corrected_rows:
+        entity_id = resolver.entity_id(entity_name)
+        if entity_id:
+            entity_names[entity_id] = entity_name
+
+        inserted.append({
+            "id": row_id(id_seed, tx_data["_row"]),
+            "business_id": business_id,
+            "date": tx_data["date"],
+            "description": tx_data["description"],
+            "amount": tx_data["amount"],
+            "type": tx_type,
+            "category_id": correction.get("category_id"),
+            "entity_id": entity_id,
+        })
+
+    return inserted, category_names, entity_names
+
+
+async def import_window(
+    client,
+    resolver: CatalogResolver,
+    id_seed: str,
+    rows: list[dict],
+    matcher: PatternMatcher,
+    progress: dict,
+    replayed: bool = False,
+) -> dict:
+    """Classify, resolve and insert one window in chunks; returns classification stats.
+
+    ``progress`` counters (classified/inserted) are bumped as each stage
+    and chunk finishes so a job poller sees them move within a window.
+    When the window may already be partly in the table (``replayed``), the
+    aggregate store and recurring patterns are invalidated instead of fed
+    deltas that could double count. Rows are scored for anomalies before
+    they are written and join the category sketches chunk by chunk once
+    stored; a replayed window may count twice in the sketches, which are
+    approximate anyway.
+    """
+    needs_ai, corrected = split_corrections(rows, matcher)
+
+    # Batch AI classification, batches dispatched concurrently
+    ai_results, classification = await classify_transactions_concurrent(needs_ai)
+    progress["classified"] += len(rows)
+
+    records, category_names, entity_names = await build_records(
+        resolver, id_seed, needs_ai, ai_results, corrected
+    )
+    stats = await anomalies.business_stats(client, resolver.business_id)
+    stats.preview(records)
+    scored = set()
+    for start in range(0, len(records), IMPORT_INSERT_CHUNK_SIZE):
+        chunk = records[start:start + IMPORT_INSERT_CHUNK_SIZE]
+        await run(
+            client.table("transactions").upsert(
+                chunk, returning=ReturnMethod.minimal, ignore_duplicates=True, on_conflict="id"
+            )
+        )
+        if replayed:
+            aggregate_store.invalidate(resolver.business_id)
+            recurring.invalidate(resolver.business_id)
+        else:
+            aggregate_store.apply_inserts(resolver.business_id, chunk, category_names, entity_names)
+            await recurring.record_inserts(client, resolver.business_id, chunk, category_names)
+        scored |= stats.fold(chunk)
+        progress["inserted"] += len(chunk)
+    await anomalies.save(client, resolver.business_id, stats, scored)
+    return classification
+
+
+def new_progress() -> dict:
+    """Counters updated in place while an import runs.
+
+    ``checkpoint`` is the number of parsed rows known to be committed; a
+    resumed import skips that many rows.
+    """
+    return {
+        "parsed": 0,
+        "classified": 0,
+        "inserted": 0,
+        "checkpoint": 0,
+        "classification": {"rows": 0, "batches": 0, "seconds": 0.0, "rows_per_second": None},
+    }
+
+
+def rewind(progress: dict) -> None:
+    """Reset the row counters to the checkpoint before resuming an import."""
+    for key in ("parsed", "classified", "inserted"):
+        progress[key] = progress["checkpoint"]
+
+
+async def import_windows(
+    client,
+    business_id: str,
+    id_seed: str,
+    windows: AsyncIterator[list[dict]],
+    matcher: PatternMatcher,
+    progress: dict | None = None,
+) -> dict:
+    """Run every window through ``import_window``, starting at ``progress["checkpoint"]``.
+
+    Returns the progress counters: parsed/classified/inserted rows, the
+    checkpoint, and combined classification stats. Inserted rows are not
+    accumulated; their ids follow from ``row_id``.
+    """
+    progress = progress if progress is not None else new_progress()
+    classification = progress["classification"]
+    resolver = await CatalogResolver(client, business_id).load()
+    skip = progress["checkpoint"]
+    replayed = skip > 0
+    position = 0
+
+    async for rows in windows:
+        start = position
+        position += len(rows)
+        if position <= skip:
+            continue
+        rows = [{**tx, "_row": start + i} for i, tx in enumerate(rows) if start + i >= skip]
+        progress["parsed"] += len(rows)
+        stats = await import_window(client, resolver, id_seed, rows, matcher, progress, replayed)
+        progress["checkpoint"] = position
+        replayed = False
+        classification["rows"] += stats["rows"]
+        classification["batches"] += stats["batches"]
+        classification["seconds"] = round(classification["seconds"] + stats["seconds"], 3)
+        if classification["seconds"] > 0:
+            classification["rows_per_second"] = round(classification["rows"] / classification["seconds"], 1)
+
+    return progress
@@ -0,0 +1,71 @@
+"""LLM cache - generated insights and summaries keyed by a hash of the exact request.
+
+The key is the SHA-256 of the canonical JSON of what would be sent to
+the model (model name, messages, sampling parameters). Any change to the
+financial data, the prompt or the model therefore misses, and identical
+requests reuse the earlier answer for LLM_CACHE_TTL_SECONDS. Concurrent
+identical requests (double clicks, several tabs) share one in-flight
+call. Only parsed answers are stored; errors propagate and are not
+cached.
+"""
+
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+from services.singleflight import SingleFlight
+
+# key -> (stored at, value), least recently used first
+_entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+_flight = SingleFlight()
+_stats = {"hits": 0, "misses": 0, "expired": 0}
+
+
+def content_key(value) -> str:
+    """Stable SHA-256 of a JSON-serializable value (dict key order ignored)."""
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _lookup(key: str):
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    stored_at, value = entry
+    if time.monotonic() - stored_at > LLM_CACHE_TTL_SECONDS:
+        _stats["expired"] += 1
+        del _entries[key]
+        return None
+    _entries.move_to_end(key)
+    return value
+
+
+async def cached(request: dict, generate: Callable[[], Awaitable[object]]):
+    """Answer for ``request`` (the chat completion arguments), generating it on a miss.
+
+    Returns a copy, so callers may modify the result.
+    """
+    key = content_key(request)
+    value = _lookup(key)
+    if value is not None:
+        _stats["hits"] += 1
+        return copy.deepcopy(value)
+
+    async def fill():
+        _stats["misses"] += 1
+        value = await generate()
+        _entries[key] = (time.monotonic(), value)
+        _entries.move_to_end(key)
+        while len(_entries) > LLM_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+        return value
+
+    return copy.deepcopy(await _flight.do(key, fill))
+
+
+def stats() -> dict:
+    """Hit/miss counters since process start, entries held and calls coalesced."""
+    return {**_stats, "entries": len(_entries), "single_flight": _flight.stats()}
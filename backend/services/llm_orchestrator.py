@@ -0,0 +1,218 @@
+"""LLM orchestration - deadlines, hedged requests and per-call latency/token stats.
+
+Every chat completion made by ai_service goes through ``complete``. A
+call waits at most LLM_TIMEOUT seconds. Inside a ``budget(seconds)``
+block it also waits no longer than the time left in that block, so
+independent calls started together with ``asyncio.gather`` share one
+deadline.
+
+Once a kind of call has LLM_HEDGE_MIN_SAMPLES recorded latencies, a call
+still running after the LLM_HEDGE_PERCENTILE latency is hedged: an
+identical second request is sent, the first answer wins and the other is
+cancelled. This trims the slow tail at the cost of a few extra requests.
+Set LLM_HEDGE_PERCENTILE to 0 to disable hedging. Streamed completions
+(``stream``) share the deadline and stats but are not hedged.
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import AsyncIterator
+from config import LLM_TIMEOUT, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES
+
+# Latencies kept per kind for percentiles
+_WINDOW = 200
+
+# Monotonic time by which the current request's LLM calls must finish
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("llm_deadline", default=None)
+
+_latencies: dict[str, deque] = defaultdict(lambda: deque(maxlen=_WINDOW))
+_stats: dict[str, dict] = defaultdict(lambda: {
+    "calls": 0,
+    "errors": 0,
+    "timeouts": 0,
+    "hedged": 0,
+    "hedge_wins": 0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0,
+})
+
+
+@contextmanager
+def budget(seconds: float):
+    """Limit LLM calls made inside the block (and tasks it starts) to ``seconds`` in total.
+
+    A nested budget can only shorten the enclosing one.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left in the current budget, or None outside one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def _percentile(values, percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(percentile / 100 * len(ordered)))]
+
+
+def _hedge_delay(kind: str) -> float | None:
+    samples = _latencies[kind]
+    if LLM_HEDGE_PERCENTILE <= 0 or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return _percentile(samples, LLM_HEDGE_PERCENTILE)
+
+
+def _consume(task: asyncio.Task) -> None:
+    # Losing requests may fail after the race is decided; don't log that
+    if not task.cancelled():
+        task.exception()
+
+
+async def _race(client, kind: str, request: dict, hedge: bool):
+    delay = _hedge_delay(kind) if hedge else None
+    if delay is None:
+        return await client.chat.completions.create(**request)
+
+    first = asyncio.ensure_future(client.chat.completions.create(**request))
+    first.add_done_callback(_consume)
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    _stats[kind]["hedged"] += 1
+    second = asyncio.ensure_future(client.chat.completions.create(**request))
+    second.add_done_callback(_consume)
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        _stats[kind]["hedge_wins"] += 1
+                    return task.result()
+        # Both failed: report the original request's error
+        return first.result()
+    finally:
+        for task in (first, second):
+            if not task.done():
+                task.cancel()
+
+
+async def complete(client, kind: str, request: dict, hedge: bool = True):
+    """``client.chat.completions.create(**request)`` under the current deadline.
+
+    ``kind`` names the call site for stats and hedging thresholds. Raises
+    ``asyncio.TimeoutError`` when the deadline passes first.
+    """
+    stats = _stats[kind]
+    stats["calls"] += 1
+    left = remaining()
+    timeout = LLM_TIMEOUT if left is None else min(LLM_TIMEOUT, left)
+    if timeout <= 0:
+        stats["timeouts"] += 1
+        raise asyncio.TimeoutError(f"No time left in the LLM budget for {kind}")
+
+    started = time.perf_counter()
+    try:
+        response = await asyncio.wait_for(_race(client, kind, request, hedge), timeout)
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        raise
+    except Exception:
+        stats["errors"] += 1
+        raise
+
+    _latencies[kind].append(time.perf_counter() - started)
+    _count_usage(stats, _field(response, "usage"))
+    return response
+
+
+async def stream(client, kind: str, request: dict) -> AsyncIterator[str]:
+    """Content deltas of a streamed completion, as the model produces them.
+
+    The whole stream must finish within the same timeout/deadline as
+    ``complete``; latencies recorded for ``kind`` are times to first
+    token. Streams are never hedged. Closing the generator (for instance
+    when the caller is cancelled) closes the upstream response.
+    """
+    stats = _stats[kind]
+    stats["calls"] += 1
+    left = remaining()
+    timeout = LLM_TIMEOUT if left is None else min(LLM_TIMEOUT, left)
+    if timeout <= 0:
+        stats["timeouts"] += 1
+        raise asyncio.TimeoutError(f"No time left in the LLM budget for {kind}")
+
+    started = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    try:
+        response = await asyncio.wait_for(client.chat.completions.create(**request, stream=True), timeout)
+    except asyncio.TimeoutError:
+        stats["timeouts"] += 1
+        raise
+    except Exception:
+        stats["errors"] += 1
+        raise
+
+    first = True
+    chunks = response.__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.monotonic())
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                raise
+            except Exception:
+                stats["errors"] += 1
+                raise
+            # Groq reports usage on the last chunk under x_groq
+            _count_usage(stats, _field(chunk, "usage") or _field(_field(chunk, "x_groq"), "usage"))
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if first:
+                    _latencies[kind].append(time.perf_counter() - started)
+                    first = False
+                yield delta
+    finally:
+        await response.close()
+
+
+def _field(obj, name: str):
+    # Provider extensions arrive as plain dicts, standard fields as models
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def _count_usage(stats: dict, usage) -> None:
+    if usage is None:
+        return
+    stats["prompt_tokens"] += _field(usage, "prompt_tokens") or 0
+    stats["completion_tokens"] += _field(usage, "completion_tokens") or 0
+
+
+def stats() -> dict:
+    """Per-kind call counts, latency percentiles (ms) and token usage since process start."""
+    result = {}
+    for kind, counters in _stats.items():
+        samples = _latencies[kind]
+        result[kind] = {
+            **counters,
+            "p50_ms": round(_percentile(samples, 50) * 1000, 1) if samples else None,
+            "p95_ms": round(_percentile(samples, 95) * 1000, 1) if samples else None,
+            "hedge_after_ms": round(delay * 1000, 1) if (delay := _hedge_delay(kind)) is not None else None,
+        }
+    return result
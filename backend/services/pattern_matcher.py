@@ -0,0 +1,73 @@
+"""Multi-pattern substring matcher (Aho-Corasick) for user correction patterns."""
+
+from collections import deque
+
+
+class PatternMatcher:
+    """Finds which of many patterns occur in a text in a single pass.
+
+    Matching is case-insensitive. When several patterns occur in the same
+    text the longest one wins, and among equally long patterns the one
+    added first wins, so the result never depends on scan order.
+    """
+
+    def __init__(self, patterns: list[tuple[str, object]]):
+        # Trie transitions, failure links, and per-node best match as
+        # (length, -insertion_order, payload) so that max() picks the winner
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._best: list[tuple[int, int, object] | None] = [None]
+        self.size = 0
+
+        for order, (pattern, payload) in enumerate(patterns):
+            pattern = (pattern or "").lower()
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._best.append(None)
+                node = nxt
+            candidate = (len(pattern), -order, payload)
+            if self._best[node] is None or candidate[:2] > self._best[node][:2]:
+                self._best[node] = candidate
+            self.size += 1
+
+        self._link()
+
+    def _link(self) -> None:
+        """Compute failure links breadth-first and fold outputs along them."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            inherited = self._best[self._fail[node]]
+            if inherited is not None and (self._best[node] is None or inherited[:2] > self._best[node][:2]):
+                self._best[node] = inherited
+            for ch, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                queue.append(child)
+
+    def match(self, text: str):
+        """Return the payload of the winning pattern found in ``text``, or None."""
+        if not self.size or not text:
+            return None
+        goto, fail, best_at = self._goto, self._fail, self._best
+        node = 0
+        best = None
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            found = best_at[node]
+            if found is not None and (best is None or found[:2] > best[:2]):
+                best = found
+        return best[2] if best is not None else None
@@ -0,0 +1,148 @@
+"""Payload shaping - section selection, field projection, fast JSON and compression.
+
+Analytics payloads are cached whole; each request then picks the
+sections and fields it displays, is encoded with orjson when available
+(stdlib json otherwise) and, above RESPONSE_COMPRESS_MIN_BYTES, is
+compressed with brotli (when installed) or gzip according to
+Accept-Encoding. Every response reports its uncompressed size and the
+encode/compress time so payload changes can be measured.
+"""
+
+import gzip
+import json
+import time
+from fastapi import HTTPException
+from fastapi.responses import Response
+from config import RESPONSE_COMPRESS_MIN_BYTES, RESPONSE_GZIP_LEVEL, RESPONSE_BROTLI_QUALITY
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional speedup
+    brotli = None
+
+_stats = {"responses": 0, "json_bytes": 0, "sent_bytes": 0, "encode_ms": 0.0, "compress_ms": 0.0}
+
+
+def parse_selection(
+    sections: str | None,
+    fields: str | None,
+    available: tuple[str, ...],
+) -> tuple[list[str] | None, dict[str, list[str]]]:
+    """Validate ``sections=a,b`` and ``fields=section.key,...`` query values.
+
+    Returns the selected sections (None for all) and, per section, the
+    keys to keep.
+    """
+    selected = None
+    if sections:
+        selected = [s.strip() for s in sections.split(",") if s.strip()]
+        unknown = [s for s in selected if s not in available]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown sections: {', '.join(unknown)} (available: {', '.join(available)})",
+            )
+
+    projection: dict[str, list[str]] = {}
+    for item in (fields or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        section, _, key = item.partition(".")
+        if section not in available or not key:
+            raise HTTPException(status_code=400, detail=f"Invalid field '{item}' (expected section.key)")
+        projection.setdefault(section, []).append(key)
+    return selected, projection
+
+
+def project(payload: dict, selected: list[str] | None, projection: dict[str, list[str]]) -> dict:
+    """Keep the selected sections and, within them, the projected keys.
+
+    Projection applies to a dict section directly and to every dict in a
+    list section (e.g. ``transactions.id``).
+    """
+    names = selected if selected is not None else list(payload)
+    out = {}
+    for name in names:
+        value = payload.get(name)
+        keys = projection.get(name)
+        if keys:
+            if isinstance(value, list):
+                value = [{k: item[k] for k in keys if k in item} if isinstance(item, dict) else item for item in value]
+            elif isinstance(value, dict):
+                value = {k: value[k] for k in keys if k in value}
+        out[name] = value
+    return out
+
+
+def encode(payload) -> bytes:
+    """Serialize to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
+
+
+def _pick_encoding(accept_encoding: str) -> str | None:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def render(payload: dict, accept_encoding: str, headers: dict | None = None) -> Response:
+    """Encode (and maybe compress) a payload into a Response with size/timing headers."""
+    started = time.perf_counter()
+    body = encode(payload)
+    encoded = time.perf_counter()
+    raw_size = len(body)
+
+    headers = {**(headers or {}), "Vary": "Accept-Encoding", "X-Payload-Bytes": str(raw_size)}
+    encoding = _pick_encoding(accept_encoding) if raw_size >= RESPONSE_COMPRESS_MIN_BYTES else None
+    if encoding == "br":
+        body = brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+    elif encoding == "gzip":
+        body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    done = time.perf_counter()
+
+    encode_ms = (encoded - started) * 1000
+    compress_ms = (done - encoded) * 1000
+    headers["Server-Timing"] = f"encode;dur={encode_ms:.2f}, compress;dur={compress_ms:.2f}"
+
+    _stats["responses"] += 1
+    _stats["json_bytes"] += raw_size
+    _stats["sent_bytes"] += len(body)
+    _stats["encode_ms"] += encode_ms
+    _stats["compress_ms"] += compress_ms
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def stats() -> dict:
+    """Totals since process start: JSON vs bytes sent, and time spent encoding."""
+    sent = _stats["sent_bytes"]
+    return {
+        **_stats,
+        "encode_ms": round(_stats["encode_ms"], 2),
+        "compress_ms": round(_stats["compress_ms"], 2),
+        "compression_ratio": round(_stats["json_bytes"] / sent, 2) if sent else None,
+        "encoder": "orjson" if orjson is not None else "json",
+        "brotli": brotli is not None,
+    }
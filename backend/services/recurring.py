@@ -0,0 +1,316 @@
+"""Recurring payments - periodicity-aware detection persisted to recurring_patterns.
+
+Expense rows are grouped by normalized description, with reference
+numbers dropped (see services/duplicates.py). A group of at least two
+rows with similar amounts is a pattern. The gaps between its dates
+classify it as weekly, monthly or irregular and give the next due date.
+
+Each business has a ``RecurringIndex`` that keeps its groups in memory.
+The index is built once from the business's expenses and written to
+``recurring_patterns``. After that, inserted and deleted rows update only
+their own groups, and only patterns that changed are upserted or
+removed. Reads come from the index. When this process has no index, they
+come from the table, and the index is rebuilt only if the table is empty
+or a write arrived while no index was loaded.
+"""
+
+import bisect
+import calendar
+import traceback
+from collections import OrderedDict
+from datetime import date, datetime
+from config import RECURRING_MAX_BUSINESSES
+from db.queries import run
+from services.duplicates import normalize_description
+from services.singleflight import SingleFlight
+from services import data_version
+
+_WEEKLY = (6, 8)
+_MONTHLY = (27, 33)
+# Share of gaps that must fit a cadence to classify the series by it
+_CADENCE_SHARE = 0.75
+# Every amount within this fraction of the average
+_AMOUNT_TOLERANCE = 0.1
+
+_FREQUENCY_ORDER = {"monthly": 0, "weekly": 1, "irregular": 2}
+
+
+def pattern_key(description: str) -> str:
+    """Description with case, punctuation and reference numbers normalized away."""
+    return " ".join(t for t in normalize_description(description).split() if "#" not in t)
+
+
+def _ordinal(value) -> int | None:
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d").toordinal()
+    except ValueError:
+        return None
+
+
+def _add_month(day: date) -> date:
+    year, month = (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def classify(days: list[int]) -> dict:
+    """Frequency, mean interval, next due date and confidence for sorted date ordinals."""
+    distinct = sorted(set(days))
+    gaps = [b - a for a, b in zip(distinct, distinct[1:])]
+    last = date.fromordinal(distinct[-1])
+    if not gaps:
+        return {"frequency": "irregular", "interval_days": None, "next_due": None, "confidence": 0.0}
+
+    def share(bounds):
+        return sum(bounds[0] <= g <= bounds[1] for g in gaps) / len(gaps)
+
+    # More gaps, more trust; three or more gaps are fully trusted
+    support = min(1.0, len(gaps) / 3)
+    weekly, monthly = share(_WEEKLY), share(_MONTHLY)
+    if weekly >= _CADENCE_SHARE:
+        frequency, fit, next_due = "weekly", weekly, date.fromordinal(distinct[-1] + 7)
+    elif monthly >= _CADENCE_SHARE:
+        frequency, fit, next_due = "monthly", monthly, _add_month(last)
+    else:
+        median = sorted(gaps)[len(gaps) // 2]
+        frequency, fit, next_due = "irregular", 0.5, date.fromordinal(distinct[-1] + median)
+    return {
+        "frequency": frequency,
+        "interval_days": round(sum(gaps) / len(gaps), 1),
+        "next_due": next_due.isoformat(),
+        "confidence": round(fit * support, 2),
+    }
+
+
+class RecurringIndex:
+    """Expense rows grouped by pattern key, kept sorted by date."""
+
+    def __init__(self):
+        # key -> [(date ordinal, id, amount, description, category_id)]
+        self.groups: dict[str, list[tuple]] = {}
+        self.category_names: dict[str, str] = {}
+
+    @classmethod
+    def from_transactions(cls, transactions: list[dict]) -> "RecurringIndex":
+        index = cls()
+        index.add(transactions)
+        return index
+
+    def add(self, rows: list[dict], category_names: dict[str, str] | None = None) -> set[str]:
+        """Add expense rows (flattened or raw); returns the pattern keys touched."""
+        self.category_names.update({k: v for k, v in (category_names or {}).items() if k and v})
+        changed = set()
+        for row in rows:
+            if row.get("type") != "expense":
+                continue
+            key = pattern_key(row.get("description", ""))
+            day = _ordinal(row.get("date"))
+            if not key or day is None:
+                continue
+            if row.get("category_id") and row.get("category_name"):
+                self.category_names[row["category_id"]] = row["category_name"]
+            entry = (day, str(row.get("id", "")), abs(float(row["amount"])),
+                     row.get("description", ""), row.get("category_id"))
+            bisect.insort(self.groups.setdefault(key, []), entry)
+            changed.add(key)
+        return changed
+
+    def remove(self, rows: list[dict]) -> set[str]:
+        """Remove rows by id; returns the pattern keys touched."""
+        changed = set()
+        for row in rows:
+            key = pattern_key(row.get("description", ""))
+            group = self.groups.get(key)
+            if not group:
+                continue
+            kept = [e for e in group if e[1] != str(row.get("id", ""))]
+            if len(kept) != len(group):
+                changed.add(key)
+                if kept:
+                    self.groups[key] = kept
+                else:
+                    del self.groups[key]
+        return changed
+
+    def pattern(self, key: str) -> dict | None:
+        """The pattern for one group, or None if it is not recurring."""
+        group = self.groups.get(key)
+        if not group or len(group) < 2:
+            return None
+        amounts = [e[2] for e in group]
+        avg_amount = sum(amounts) / len(amounts)
+        if not all(abs(a - avg_amount) / max(avg_amount, 0.01) < _AMOUNT_TOLERANCE for a in amounts):
+            return None
+        latest = group[-1]
+        return {
+            "description": latest[3],
+            "pattern": key,
+            "count": len(group),
+            "avg_amount": round(avg_amount, 2),
+            "category": self.category_names.get(latest[4], "") if latest[4] else "",
+            "category_id": latest[4],
+            "type": "expense",
+            "last_date": date.fromordinal(latest[0]).isoformat(),
+            **classify([e[0] for e in group]),
+        }
+
+    def patterns(self) -> list[dict]:
+        found = [p for p in (self.pattern(k) for k in self.groups) if p is not None]
+        return sort_patterns(found)
+
+
+def sort_patterns(patterns: list[dict]) -> list[dict]:
+    """Periodic patterns first, then by amount."""
+    return sorted(patterns, key=lambda p: (_FREQUENCY_ORDER.get(p["frequency"], 3), -p["avg_amount"]))
+
+
+def detect_patterns(transactions: list[dict]) -> list[dict]:
+    """Recurring expense patterns in a list of transactions (nothing stored)."""
+    return RecurringIndex.from_transactions(transactions).patterns()
+
+
+# ---- persistence -----------------------------------------------------------
+
+# business_id -> index, least recently used first
+_indexes: OrderedDict[str, RecurringIndex] = OrderedDict()
+# Businesses written to while no index was loaded; their stored patterns are stale
+_stale: set[str] = set()
+_rebuilds = SingleFlight()
+
+
+def _record(business_id: str, p: dict) -> dict:
+    return {
+        "business_id": business_id,
+        "description_pattern": p["pattern"],
+        "description": p["description"],
+        "average_amount": p["avg_amount"],
+        "frequency": p["frequency"],
+        "category_id": p["category_id"],
+        "occurrences": p["count"],
+        "interval_days": p["interval_days"],
+        "last_date": p["last_date"],
+        "next_due": p["next_due"],
+        "confidence": p["confidence"],
+    }
+
+
+def _from_record(row: dict) -> dict:
+    category = row.get("categories") or {}
+    return {
+        "description": row.get("description") or row.get("description_pattern", ""),
+        "pattern": row.get("description_pattern", ""),
+        "count": row.get("occurrences") or 0,
+        "avg_amount": float(row.get("average_amount") or 0),
+        "category": category.get("name", "") if isinstance(category, dict) else "",
+        "category_id": row.get("category_id"),
+        "type": "expense",
+        "last_date": row.get("last_date"),
+        "frequency": row.get("frequency") or "irregular",
+        "interval_days": float(row["interval_days"]) if row.get("interval_days") is not None else None,
+        "next_due": row.get("next_due"),
+        "confidence": float(row.get("confidence") or 0),
+    }
+
+
+def _keep(business_id: str, index: RecurringIndex) -> None:
+    _indexes[business_id] = index
+    _indexes.move_to_end(business_id)
+    while len(_indexes) > RECURRING_MAX_BUSINESSES:
+        _indexes.popitem(last=False)
+
+
+async def patterns(client, business_id: str, load_expenses, generation_seen: int) -> list[dict]:
+    """Recurring patterns for a business whose ownership was already checked.
+
+    ``load_expenses`` is an async callable returning the business's
+    flattened expense rows as of ``generation_seen`` (see
+    ``aggregate_store.generation``); it is only awaited when the index has
+    to be (re)built, and a rebuilt index is only kept if no write landed
+    since.
+    """
+    index = _indexes.get(business_id)
+    if index is not None:
+        _indexes.move_to_end(business_id)
+        return index.patterns()
+
+    if business_id not in _stale:
+        result = await run(
+            client.table("recurring_patterns").select("*, categories(name)").eq("business_id", business_id)
+        )
+        if result.data:
+            return sort_patterns([_from_record(row) for row in result.data])
+
+    async def rebuild():
+        index = RecurringIndex.from_transactions(await load_expenses())
+        if data_version.counter(business_id) == generation_seen:
+            await _replace(client, business_id, index)
+            _stale.discard(business_id)
+            _keep(business_id, index)
+        return index
+
+    index = await _rebuilds.do(business_id, rebuild)
+    return index.patterns()
+
+
+async def _replace(client, business_id: str, index: RecurringIndex) -> None:
+    records = [_record(business_id, p) for p in index.patterns()]
+    try:
+        await run(client.table("recurring_patterns").delete().eq("business_id", business_id))
+        if records:
+            await run(client.table("recurring_patterns").insert(records))
+    except Exception:
+        # The in-memory index still answers reads in this process
+        traceback.print_exc()
+
+
+async def _sync(client, business_id: str, index: RecurringIndex, keys: set[str]) -> None:
+    """Upsert the patterns for ``keys`` and delete those no longer recurring."""
+    upserts, removed = [], []
+    for key in keys:
+        p = index.pattern(key)
+        if p is None:
+            removed.append(key)
+        else:
+            upserts.append(_record(business_id, p))
+    try:
+        if upserts:
+            await run(
+                client.table("recurring_patterns").upsert(upserts, on_conflict="business_id,description_pattern")
+            )
+        if removed:
+            await run(
+                client.table("recurring_patterns").delete()
+                .eq("business_id", business_id).in_("description_pattern", removed)
+            )
+    except Exception:
+        print(f"[WARN] Could not update recurring patterns for {business_id}; rebuilding on next read")
+        traceback.print_exc()
+        _indexes.pop(business_id, None)
+        _stale.add(business_id)
+
+
+async def record_inserts(client, business_id: str, rows: list[dict], category_names: dict | None = None) -> None:
+    """Fold inserted rows into the business's patterns."""
+    index = _indexes.get(business_id)
+    if index is None:
+        _stale.add(business_id)
+        return
+    keys = index.add(rows, category_names)
+    if keys:
+        await _sync(client, business_id, index, keys)
+
+
+async def record_deletes(client, business_id: str, rows: list[dict]) -> None:
+    """Remove deleted rows from the business's patterns."""
+    index = _indexes.get(business_id)
+    if index is None:
+        _stale.add(business_id)
+        return
+    keys = index.remove(rows)
+    if keys:
+        await _sync(client, business_id, index, keys)
+
+
+def invalidate(business_id: str) -> None:
+    """Forget the index and stored patterns' freshness; the next read rebuilds."""
+    _indexes.pop(business_id, None)
+    _stale.add(business_id)
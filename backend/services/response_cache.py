@@ -0,0 +1,91 @@
+"""Response cache - analytics payloads keyed by business data version, served stale-while-revalidate.
+
+An entry computed for the current data version is served as is. After a
+write the entry is stale; for up to ANALYTICS_STALE_SECONDS after it was
+computed it is still served immediately while one background task
+recomputes it. Older entries, or callers that refuse stale data, wait for
+a fresh computation.
+"""
+
+import asyncio
+import time
+import traceback
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from config import ANALYTICS_CACHE_MAX_ENTRIES, ANALYTICS_STALE_SECONDS
+from services import data_version
+
+
+class _Entry:
+    __slots__ = ("version", "computed_at", "payload")
+
+    def __init__(self, version: str, payload: dict):
+        self.version = version
+        self.computed_at = time.monotonic()
+        self.payload = payload
+
+
+_entries: OrderedDict[tuple, _Entry] = OrderedDict()
+_refreshing: dict[tuple, asyncio.Task] = {}
+_stats = {"fresh_hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0}
+
+
+async def get(
+    key: tuple,
+    business_id: str,
+    compute: Callable[[], Awaitable[dict]],
+    allow_stale: bool = True,
+) -> tuple[dict, str]:
+    """Return ``(payload, version_of_payload)`` for ``key``.
+
+    ``compute`` builds the payload from scratch; it is called at most once
+    per miss and runs in the background when a stale entry is served.
+    """
+    version = data_version.current(business_id)
+    entry = _entries.get(key)
+
+    if entry is not None and entry.version == version:
+        _entries.move_to_end(key)
+        _stats["fresh_hits"] += 1
+        return entry.payload, entry.version
+
+    if (
+        entry is not None
+        and allow_stale
+        and time.monotonic() - entry.computed_at <= ANALYTICS_STALE_SECONDS
+    ):
+        _stats["stale_hits"] += 1
+        if key not in _refreshing:
+            _refreshing[key] = asyncio.create_task(_refresh(key, business_id, compute))
+        return entry.payload, entry.version
+
+    _stats["misses"] += 1
+    return await _compute(key, business_id, compute)
+
+
+async def _compute(key: tuple, business_id: str, compute) -> tuple[dict, str]:
+    # Capture the version first: a write landing mid-computation leaves the
+    # entry one version behind, so the next request recomputes it
+    version = data_version.current(business_id)
+    payload = await compute()
+    _entries[key] = _Entry(version, payload)
+    _entries.move_to_end(key)
+    while len(_entries) > ANALYTICS_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+    return payload, version
+
+
+async def _refresh(key: tuple, business_id: str, compute) -> None:
+    try:
+        _stats["refreshes"] += 1
+        await _compute(key, business_id, compute)
+    except Exception:
+        # The stale entry keeps being served until it ages out
+        traceback.print_exc()
+    finally:
+        _refreshing.pop(key, None)
+
+
+def stats() -> dict:
+    """Hit/miss counters since process start, plus current size."""
+    return {**_stats, "entries": len(_entries), "refreshing": len(_refreshing)}
@@ -0,0 +1,45 @@
+"""Single-flight - concurrent callers asking for the same key share one in-flight computation.
+
+The first caller for a key starts the computation as a task; callers that
+arrive while it runs await the same task instead of starting their own.
+Nothing is kept once the task finishes, so results are cached by whoever
+uses the group. A caller that is cancelled (for instance a disconnected
+client) does not cancel the shared task for the others.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """A group of keyed in-flight computations."""
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable]):
+        """Return ``await compute()``, joining an in-flight call for ``key`` if there is one."""
+        task = self._calls.get(key)
+        if task is None:
+            self._stats["calls"] += 1
+            task = asyncio.ensure_future(compute())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            self._stats["shared"] += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Computations started vs callers that joined one already running."""
+        return {**self._stats, "in_flight": len(self._calls)}
@@ -0,0 +1,180 @@
+"""Financial snapshots - one lazily computed view of a business per data version.
+
+Dashboard, summary, insights and chat all need some of the same things:
+the flattened transaction history, the summary, health score, forecasts
+and the recurring/anomaly/duplicate scans. A ``FinancialSnapshot`` computes
+each of them on first use, at most once, and concurrent requests for the
+same item join the computation already in flight. Snapshots are keyed by
+(user, business) and belong to one data version; the first access after a
+write starts a new snapshot.
+"""
+
+import asyncio
+from collections import OrderedDict
+from config import SNAPSHOT_MAX_ENTRIES
+from db.queries import run, business_exists, transactions_query, flatten_transaction
+from services.aggregation import get_backend
+from services.analytics_service import (
+    compute_health_score,
+    compute_forecast,
+    detect_anomalies,
+    detect_duplicates,
+)
+from services.duplicates import find_duplicate_groups
+from services.singleflight import SingleFlight
+from services import aggregate_store, anomalies, data_version, recurring
+
+_flight = SingleFlight()
+_stats = {"created": 0, "reused": 0, "computed": 0, "memo_hits": 0}
+
+
+class FinancialSnapshot:
+    """Lazily computed financial data for one business at one data version."""
+
+    def __init__(self, client, business_id: str, user_id: str):
+        self.client = client
+        self.business_id = business_id
+        self.user_id = user_id
+        self.version = data_version.current(business_id)
+        # Captured before anything is fetched, for aggregate_store.keep
+        self.generation = data_version.counter(business_id)
+        self._values: dict[str, object] = {}
+
+    @property
+    def current(self) -> bool:
+        """Whether no write has landed since the snapshot was started."""
+        return self.version == data_version.current(self.business_id)
+
+    async def _memo(self, name: str, compute):
+        if name in self._values:
+            _stats["memo_hits"] += 1
+            return self._values[name]
+
+        async def run_once():
+            _stats["computed"] += 1
+            value = await compute()
+            self._values[name] = value
+            return value
+
+        return await _flight.do((self.user_id, self.business_id, self.version, name), run_once)
+
+    async def owned(self) -> bool:
+        """Whether the business exists and belongs to the snapshot's user."""
+        return await self._memo(
+            "owned", lambda: business_exists(self.client, self.business_id, self.user_id)
+        )
+
+    async def transactions(self) -> list[dict]:
+        """All transactions, flattened, oldest first (date ascending)."""
+        return await self._memo("transactions", self._fetch_transactions)
+
+    async def _fetch_transactions(self) -> list[dict]:
+        result = await run(transactions_query(self.client, self.business_id))
+        return [flatten_transaction(tx) for tx in result.data]
+
+    async def expenses(self) -> list[dict]:
+        async def compute():
+            return [t for t in await self.transactions() if t["type"] == "expense"]
+        return await self._memo("expenses", compute)
+
+    async def summary(self) -> dict:
+        """The ``compute_summary`` dict, from the running aggregates when loaded.
+
+        A cold business is aggregated by the configured backend alongside
+        the ownership check, and the aggregate is only kept once ownership
+        is confirmed.
+        """
+        async def compute():
+            cached = aggregate_store.summary(self.business_id)
+            if cached is not None:
+                return cached
+            owned, agg = await asyncio.gather(self.owned(), self._aggregate())
+            if not owned:
+                return agg.summary()
+            return aggregate_store.keep(self.business_id, agg, self.generation)
+        return await self._memo("summary", compute)
+
+    async def _aggregate(self) -> aggregate_store.BusinessAggregate:
+        transactions = await self.transactions() if get_backend().uses_rows else None
+        return await aggregate_store.fetch(self.client, self.business_id, transactions)
+
+    async def health(self) -> dict:
+        async def compute():
+            return compute_health_score(await self.summary())
+        return await self._memo("health", compute)
+
+    async def forecasts(self) -> list[dict]:
+        async def compute():
+            return compute_forecast(await self.summary(), await self.transactions())
+        return await self._memo("forecasts", compute)
+
+    async def recurring(self) -> list[dict]:
+        """Recurring expense patterns, maintained incrementally in recurring_patterns."""
+        async def compute():
+            if not await self.owned():
+                return []
+            return await recurring.patterns(self.client, self.business_id, self.expenses, self.generation)
+        return await self._memo("recurring", compute)
+
+    async def anomalies(self) -> list[dict]:
+        """Transactions flagged at insert time (see services/anomalies.py)."""
+        async def compute():
+            if not await self.owned():
+                return []
+            # Loading the sketches the first time flags the existing rows
+            await anomalies.business_stats(self.client, self.business_id)
+            transactions = await self.transactions() if self.current else await self._fetch_transactions()
+            return detect_anomalies(transactions)
+        return await self._memo("anomalies", compute)
+
+    async def duplicate_groups(self) -> list[dict]:
+        async def compute():
+            # Grouping is CPU-bound on large histories; keep the event loop free
+            return await asyncio.to_thread(find_duplicate_groups, await self.transactions())
+        return await self._memo("duplicate_groups", compute)
+
+    async def duplicates(self) -> list[dict]:
+        async def compute():
+            return detect_duplicates(await self.transactions(), await self.duplicate_groups())
+        return await self._memo("duplicates", compute)
+
+    async def insights(self) -> list[dict]:
+        """Insights stored by the last ``get_insights`` run."""
+        async def fetch():
+            result = await run(
+                self.client.table("insights").select("*").eq("business_id", self.business_id)
+            )
+            return result.data or []
+        return await self._memo("insights", fetch)
+
+
+# (user_id, business_id) -> snapshot, least recently used first
+_snapshots: OrderedDict[tuple[str, str], FinancialSnapshot] = OrderedDict()
+
+
+def get(client, user_id: str, business_id: str) -> FinancialSnapshot:
+    """Return the current snapshot for the user's business, starting one if needed.
+
+    The snapshot picks up ``client`` so items computed later use the
+    caller's (unexpired) token.
+    """
+    key = (user_id, business_id)
+    snapshot = _snapshots.get(key)
+    if snapshot is not None and snapshot.current:
+        _stats["reused"] += 1
+        snapshot.client = client
+        _snapshots.move_to_end(key)
+        return snapshot
+
+    _stats["created"] += 1
+    snapshot = FinancialSnapshot(client, business_id, user_id)
+    _snapshots[key] = snapshot
+    _snapshots.move_to_end(key)
+    while len(_snapshots) > SNAPSHOT_MAX_ENTRIES:
+        _snapshots.popitem(last=False)
+    return snapshot
+
+
+def stats() -> dict:
+    """Snapshot reuse and per-item computation counters since process start."""
+    return {**_stats, "entries": len(_snapshots), "single_flight": _flight.stats()}
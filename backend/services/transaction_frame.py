@@ -0,0 +1,195 @@
+"""Columnar transaction engine - vectorized aggregation over NumPy/pandas arrays."""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+class TransactionFrame:
+    """Typed column arrays built once from a list of transaction dicts.
+
+    Every aggregate in ``summary()`` is derived from these arrays with
+    vectorized masks and ``np.bincount`` group-bys. ``np.bincount``
+    accumulates weights in input order, so per-group sums come out
+    bit-for-bit identical to the sequential ``+=`` loops they replace.
+    """
+
+    def __init__(self, transactions: list[dict]):
+        self.size = len(transactions)
+        self.type = np.array([t.get("type") for t in transactions], dtype=object)
+        self.has_type = np.array(["type" in t for t in transactions], dtype=bool)
+        self.amount = np.array([float(t["amount"]) for t in transactions], dtype=np.float64)
+        self.abs_amount = np.abs(self.amount)
+        self.is_income = self.type == "income"
+        self.is_expense = self.type == "expense"
+
+        # Parse every date exactly once; unparseable values become NaT
+        raw_dates = pd.Series([str(t.get("date")) for t in transactions], dtype=object)
+        parsed = pd.to_datetime(raw_dates, format="%Y-%m-%d", errors="coerce")
+        self.date = parsed.to_numpy(dtype="datetime64[D]")
+        self.has_date = ~np.isnat(self.date)
+
+        self.category = np.array(
+            [t.get("category_name") or t.get("category", "Miscellaneous") for t in transactions],
+            dtype=object,
+        )
+        self.entity = np.array([t.get("entity_name", "") for t in transactions], dtype=object)
+        self.has_entity = np.array([bool(e) for e in self.entity], dtype=bool)
+
+    # ---- Scalars -------------------------------------------------------
+
+    def total(self, mask: np.ndarray, values: np.ndarray) -> float:
+        """Sum ``values`` under ``mask`` with Python's own ``sum`` semantics."""
+        return sum(values[mask].tolist())
+
+    def date_bounds(self) -> tuple[datetime | None, datetime | None]:
+        """Return the (min, max) parsed dates as datetimes, or (None, None)."""
+        if not self.has_date.any():
+            return None, None
+        valid = self.date[self.has_date]
+        return _to_datetime(valid.min()), _to_datetime(valid.max())
+
+    # ---- Group-bys -----------------------------------------------------
+
+    def monthly_buckets(self) -> list[tuple[str, float, float, int, int]]:
+        """Per-month ``(month, income, expenses, income_count, expense_count)`` rows."""
+        mask = self.has_date & self.has_type
+        if not mask.any():
+            return []
+
+        months = self.date[mask].astype("datetime64[M]")
+        keys, codes = np.unique(months, return_inverse=True)
+        income = self.is_income[mask]
+        amounts = self.amount[mask]
+        abs_amounts = self.abs_amount[mask]
+        k = len(keys)
+
+        income_sum = np.bincount(codes[income], weights=amounts[income], minlength=k)
+        expense_sum = np.bincount(codes[~income], weights=abs_amounts[~income], minlength=k)
+        income_n = np.bincount(codes[income], minlength=k)
+        expense_n = np.bincount(codes[~income], minlength=k)
+        return list(zip(
+            [str(m) for m in keys], income_sum.tolist(), expense_sum.tolist(),
+            income_n.tolist(), expense_n.tolist(),
+        ))
+
+    def monthly(self) -> list[dict]:
+        """Income/expense totals per YYYY-MM, sorted by month."""
+        # Months without rows of one kind keep the integer 0 the dict-based
+        # accumulator started from
+        return [
+            {"month": month, "income": inc if n_inc else 0, "expenses": exp if n_exp else 0}
+            for month, inc, exp, n_inc, n_exp in self.monthly_buckets()
+        ]
+
+    def day_counts(self) -> dict[str, int]:
+        """Number of rows per parsed ``YYYY-MM-DD`` date."""
+        days, counts = np.unique(self.date[self.has_date], return_counts=True)
+        return {str(d): c for d, c in zip(days, counts.tolist())}
+
+    def daily_cashflow(self, max_days: int | None = None) -> tuple[np.datetime64 | None, np.ndarray]:
+        """Dense per-day ``[income, expenses]`` sums ending on the last dated row.
+
+        Returns ``(first_day, array of shape (2, days))``; days without rows
+        are zeros. ``max_days`` keeps only the most recent days.
+        """
+        mask = self.has_date & (self.is_income | self.is_expense)
+        if not mask.any():
+            return None, np.zeros((2, 0))
+        dates = self.date[mask]
+        end = dates.max()
+        start = dates.min()
+        if max_days is not None:
+            start = max(start, end - np.timedelta64(max_days - 1, "D"))
+        keep = dates >= start
+        offsets = (dates[keep] - start).astype(np.int64)
+        days = int((end - start).astype(np.int64)) + 1
+        income = self.is_income[mask][keep]
+        flows = np.vstack([
+            np.bincount(offsets[income], weights=self.amount[mask][keep][income], minlength=days),
+            np.bincount(offsets[~income], weights=self.abs_amount[mask][keep][~income], minlength=days),
+        ])
+        return start, flows
+
+    def categories(self, total_expenses: float) -> list[dict]:
+        """Expense totals per category name, largest first."""
+        names, totals, _ = self.group(self.category, self.is_expense, self.abs_amount)
+        return [
+            {"name": name, "total": total,
+             "percentage": (total / total_expenses * 100) if total_expenses > 0 else 0}
+            for name, total in zip(names, totals)
+        ]
+
+    def entities(self, mask: np.ndarray, values: np.ndarray, grand_total: float) -> list[dict]:
+        """Totals and counts per non-empty entity name under ``mask``, largest first."""
+        names, totals, counts = self.group(self.entity, mask & self.has_entity, values)
+        return [
+            {"name": name, "total": total, "count": count,
+             "percentage": (total / grand_total * 100) if grand_total > 0 else 0}
+            for name, total, count in zip(names, totals, counts)
+        ]
+
+    def group(self, keys: np.ndarray, mask: np.ndarray, values: np.ndarray):
+        """Group ``values`` by ``keys`` under ``mask``.
+
+        Groups are numbered in first-appearance order and then stably sorted
+        by descending total, which reproduces ``sorted(dict.items(), key=-v)``.
+        """
+        if not mask.any():
+            return [], [], []
+        codes, uniques = pd.factorize(keys[mask], use_na_sentinel=False)
+        k = len(uniques)
+        totals = np.bincount(codes, weights=values[mask], minlength=k)
+        counts = np.bincount(codes, minlength=k)
+        order = np.argsort(-totals, kind="stable")
+        return (
+            [uniques[i] for i in order],
+            totals[order].tolist(),
+            counts[order].tolist(),
+        )
+
+    # ---- Summary -------------------------------------------------------
+
+    def summary(self) -> dict:
+        """Build the dict returned by ``analytics_service.compute_summary``."""
+        total_income = self.total(self.is_income, self.amount)
+        total_expenses = self.total(self.is_expense, self.abs_amount)
+        net_profit = total_income - total_expenses
+
+        min_date, max_date = self.date_bounds()
+        day_span = max(1, (max_date - min_date).days + 1) if min_date and max_date else 1
+
+        avg_daily_income = total_income / day_span
+        avg_daily_expense = total_expenses / day_span
+
+        profit_margin = (net_profit / total_income * 100) if total_income > 0 else 0
+        expense_ratio = (total_expenses / total_income * 100) if total_income > 0 else 0
+
+        return {
+            "total_income": total_income,
+            "total_expenses": total_expenses,
+            "net_profit": net_profit,
+            "transaction_count": self.size,
+            "income_count": int(self.is_income.sum()),
+            "expense_count": int(self.is_expense.sum()),
+            "avg_daily_income": avg_daily_income,
+            "avg_daily_expense": avg_daily_expense,
+            "net_daily_change": avg_daily_income - avg_daily_expense,
+            "profit_margin": profit_margin,
+            "expense_ratio": expense_ratio,
+            "date_range": {
+                "min": min_date.isoformat() if min_date else None,
+                "max": max_date.isoformat() if max_date else None,
+                "day_span": day_span,
+            },
+            "monthly_trends": self.monthly(),
+            "category_breakdown": self.categories(total_expenses),
+            "customers": self.entities(self.is_income, self.amount, total_income),
+            "suppliers": self.entities(self.is_expense, self.abs_amount, total_expenses),
+        }
+
+
+def _to_datetime(day: np.datetime64) -> datetime:
+    d = day.astype(object)
+    return datetime(d.year, d.month, d.day)
@@ -229,13 +229,30 @@ class ApiClient {
   }
 
   async uploadCSVText(businessId, csvText) {
-    return this._fetch('/api/transactions/process-csv-text', {
+    const job = await this._fetch('/api/transactions/process-csv-text', {
       method: 'POST',
       body: JSON.stringify({
         business_id: businessId,
         csv_text: csvText,
       }),
     });
+    return this.waitForImportJob(job.job_id);
+  }
+
+  async getImportJob(jobId) {
+    return this._fetch(`/api/transactions/jobs/${jobId}`);
+  }
+
+  // Imports run in the background; poll until the job finishes
+  async waitForImportJob(jobId, intervalMs = 1000) {
+    for (;;) {
+      const job = await this.getImportJob(jobId);
+      if (job.status === 'succeeded') return job;
+      if (job.status === 'failed') {
+        throw new Error((job.errors && job.errors[0]) || 'CSV import failed');
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
   }
 
   async deleteTransaction(transactionId) {
@@ -245,12 +262,25 @@ class ApiClient {
   }
 
   // ── Analytics ──
-  async getDashboard(businessId) {
-    return this._fetch(`/api/analytics/dashboard/${businessId}`);
+  // The browser revalidates with the ETag on its own; `fresh` also refuses a
+  // stale copy from the server's response cache (e.g. right after a write).
+  // `sections` / `fields` (arrays) trim the payload to what a view displays,
+  // e.g. { sections: ['summary', 'health'] } or { fields: ['transactions.id'] }
+  async getDashboard(businessId, { fresh = false, sections = null, fields = null } = {}) {
+    return this._fetch(`/api/analytics/dashboard/${businessId}${this._selection(sections, fields)}`,
+      fresh ? { headers: { 'Cache-Control': 'no-cache' } } : {});
+  }
+
+  async getSummary(businessId, { sections = null, fields = null } = {}) {
+    return this._fetch(`/api/analytics/summary/${businessId}${this._selection(sections, fields)}`);
   }
 
-  async getSummary(businessId) {
-    return this._fetch(`/api/analytics/summary/${businessId}`);
+  _selection(sections, fields) {
+    const params = new URLSearchParams();
+    if (sections && sections.length) params.set('sections', sections.join(','));
+    if (fields && fields.length) params.set('fields', fields.join(','));
+    const query = params.toString();
+    return query ? `?${query}` : '';
   }
 
   async getInsights(businessId) {
@@ -258,16 +288,90 @@ class ApiClient {
   }
 
   // ── Chat ──
-  async sendChat(businessId, message, history = []) {
+  // The server keeps the conversation: pass back the returned session_id and
+  // history is only needed when starting over (no session, or it expired)
+  async sendChat(businessId, message, history = [], sessionId = null) {
     return this._fetch('/api/chat', {
       method: 'POST',
       body: JSON.stringify({
         business_id: businessId,
         message,
         history,
+        session_id: sessionId,
       }),
     });
   }
+
+  // Streams the reply as Server-Sent Events: onToken(text) is called for
+  // every fragment as it arrives; resolves with { response, session_id } like
+  // sendChat. Pass an AbortSignal to stop the stream (the server cancels the
+  // model call).
+  async streamChat(businessId, message, { history = [], sessionId = null, onToken = () => {}, signal } = {}) {
+    const token = this.auth.getAccessToken();
+    if (!token) {
+      throw new Error('Not authenticated');
+    }
+
+    const resp = await fetch(`${API_BASE}/api/chat/stream`, {
+      method: 'POST',
+      signal,
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'text/event-stream',
+        'Authorization': `Bearer ${token}`,
+      },
+      body: JSON.stringify({ business_id: businessId, message, history, session_id: sessionId }),
+    });
+
+    if (!resp.ok) {
+      const errBody = await resp.json().catch(() => ({}));
+      throw new Error(errBody.detail || `API error: ${resp.status}`);
+    }
+    if (!resp.body) {
+      // No streaming support: fall back to the single-response endpoint
+      return this.sendChat(businessId, message, history, sessionId);
+    }
+
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let text = '';
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const event = this._parseEvent(buffer.slice(0, boundary));
+        buffer = buffer.slice(boundary + 2);
+        if (event.name === 'token') {
+          text += event.data.text;
+          onToken(event.data.text);
+        } else if (event.name === 'done') {
+          return event.data;
+        } else if (event.name === 'error') {
+          throw new Error(event.data.detail || 'Chat stream failed');
+        }
+      }
+    }
+    return { response: text.trim(), session_id: sessionId };
+  }
+
+  async endChatSession(sessionId) {
+    return this._fetch(`/api/chat/sessions/${sessionId}`, { method: 'DELETE' });
+  }
+
+  _parseEvent(block) {
+    let name = 'message';
+    const data = [];
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) name = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trimStart());
+    }
+    return { name, data: data.length ? JSON.parse(data.join('\n')) : {} };
+  }
 }
 
 // ─── Initialize ───────────────────────────────────────────────
@@ -13,6 +13,7 @@ const State = {
   activeNav: 'upload',
   filter: { period: 'all' },
   chatHistory: [],
+  chatSessionId: null,
   corrections: {},
   goals: [],
   alerts: [],
@@ -157,6 +158,7 @@ function selectBusinessById(id, name) {
 async function selectBusiness(business) {
   State.businessId = business.id;
   State.businessName = business.name;
+  State.chatSessionId = null;
   window.apiClient.currentBusinessId = business.id;
 
   const nameDisplay = document.getElementById('business-name-display');
@@ -232,12 +234,12 @@ function navigate(page) {
 
 // ─── Data Loading ──────────────────────────────────────────────
 
-async function loadDashboardData() {
+async function loadDashboardData(fresh = false) {
   if (!State.businessId) return;
 
   try {
     showPageLoading(true);
-    const data = await window.apiClient.getDashboard(State.businessId);
+    const data = await window.apiClient.getDashboard(State.businessId, { fresh });
 
     State.dashboardData = data;
     State.processed = data.transactions || [];
@@ -285,7 +287,8 @@ async function loadDashboardData() {
 }
 
 async function refreshAfterDataChange() {
-  await loadDashboardData();
+  // Our own write just landed: skip the server's stale-while-revalidate copy
+  await loadDashboardData(true);
   navigate(State.activeNav);
 }
 
@@ -923,6 +926,7 @@ function renderForecast() {
               <div class="forecast-row"><span style="color:var(--text-muted)">Expected In</span><span style="color:#10b981;font-weight:600">${fmt(f.projected_income||0)}</span></div>
               <div class="forecast-row"><span style="color:var(--text-muted)">Expected Out</span><span style="color:#ef4444;font-weight:600">${fmt(f.projected_expenses||0)}</span></div>
               <div class="forecast-net" style="color:${(f.net_change||0)>=0?'#6366f1':'#ef4444'}">${(f.net_change||0)>=0?'▲':'▼'} ${fmt(f.net_change||0)}</div>
+              ${f.net_range?`<div class="forecast-row"><span style="color:var(--text-muted)">${Math.round(f.confidence*100)}% range</span><span>${f.net_range.map(n=>(n<0?'−':'')+fmt(n)).join(' – ')}</span></div>`:''}
             </div>
           `).join('')}
         </div>
@@ -1168,8 +1172,21 @@ async function sendChat() {
 
   try {
     if (State.businessId) {
-      const result = await window.apiClient.sendChat(State.businessId, text, State.chatHistory.slice(-6));
+      // Show the reply as it streams in, replacing the typing dots
+      let partial = '';
+      const bubble = typing.querySelector('.chat-bubble');
+      const result = await window.apiClient.streamChat(State.businessId, text, {
+        // The server session holds the conversation; history only seeds a new one
+        history: State.chatSessionId ? [] : State.chatHistory.slice(-6),
+        sessionId: State.chatSessionId,
+        onToken: (t) => {
+          partial += t;
+          bubble.innerHTML = renderMarkdown(partial);
+          msgs.scrollTop = msgs.scrollHeight;
+        },
+      });
       typing.remove();
+      State.chatSessionId = result.session_id || null;
       State.chatHistory.push({role:'ai',text:result.response});
     } else {
       const response = E.processChat(text, State.processed, State.summary, State.health);
@@ -1288,6 +1305,7 @@ async function clearAllData() {
   if (!confirm('Clear all local transaction data?')) return;
   State.transactions=[]; State.processed=[]; State.summary=null; State.health=null;
   State.insights=[]; State.aiInsights=[]; State.chatHistory=[];
+  if (State.chatSessionId) { window.apiClient.endChatSession(State.chatSessionId).catch(()=>{}); State.chatSessionId=null; }
   State.recurring=[]; State.anomalies=[]; State.forecasts=[];
   State.executiveSummary='';
   updateSidebarHealth();